@@ -0,0 +1,243 @@
+# analytics.py
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from models import db
+from question_bank import FINAL_MATURITY_CUTOFFS, MATURITY_FLOOR
+
+# ===============================
+# Cohort analytics (PostgreSQL materialized views)
+# ===============================
+# Every aggregate is computed by PostgreSQL into a small materialized view;
+# the admin page only reads those views. Refresh them on demand (admin
+# page), from cron (`flask refresh-analytics`) or, with ANALYTICS_MAX_AGE
+# set, in the background when a page load finds them stale. On SQLite
+# (config.py DB_PROFILE) the views are plain tables rebuilt on refresh.
+
+# The few dialect-specific pieces of the queries below
+DIALECT_SQL = {
+    "postgresql": {
+        "score_max": "(details #>> '{_summary,score_max}')::float",
+        "bucket": "LEAST(width_bucket(score / score_max * 100, 0, 100, 10), 10)",
+        "now": "now()",
+    },
+    "sqlite": {
+        "score_max": "CAST(json_extract(details, '$._summary.score_max') AS REAL)",
+        # width_bucket: scores are never negative, so CAST's truncation is floor()
+        "bucket": "min(CAST(score / score_max * 100 * 10 / 100 AS INTEGER) + 1, 10)",
+        "now": "CURRENT_TIMESTAMP",
+    },
+}
+
+# score_summary.final_maturity_level in SQL; NULL (never assessed) stays NULL
+FINAL_LEVEL_SQL = "CASE " + " ".join(
+    f"WHEN {{total}} > {cutoff:g} THEN {maturity}" for cutoff, maturity in FINAL_MATURITY_CUTOFFS
+) + f" WHEN {{total}} IS NOT NULL THEN {MATURITY_FLOOR} END"
+
+VIEWS = {
+    # Score distribution per level, in 10 percent-of-max buckets (1..10)
+    "mv_level_score_distribution": ("""
+        SELECT level,
+               {bucket} AS bucket,
+               count(*) AS responses
+          FROM (SELECT level, score, {score_max} AS score_max
+                  FROM responses) r
+         WHERE score_max > 0
+         GROUP BY 1, 2
+    """, ["level", "bucket"]),
+
+    # Maturity level histogram per level
+    "mv_maturity_histogram": ("""
+        SELECT level, maturity_level, count(*) AS responses, count(DISTINCT user_id) AS users
+          FROM responses
+         GROUP BY 1, 2
+    """, ["level", "maturity_level"]),
+
+    # Attempt-over-attempt: totals of completed attempts and the change
+    # from the same user's previous completed attempt
+    "mv_attempt_improvement": ("""
+        WITH attempt_totals AS (
+            SELECT user_id, attempt_number, sum(score) AS total, count(DISTINCT level) AS levels
+              FROM responses
+             GROUP BY 1, 2
+        ), completed AS (
+            SELECT user_id, attempt_number, total,
+                   total - lag(total) OVER (PARTITION BY user_id ORDER BY attempt_number) AS delta
+              FROM attempt_totals
+             WHERE levels = 4
+        )
+        SELECT a.attempt_number,
+               count(*) AS started,
+               count(c.user_id) AS completed,
+               avg(c.total) AS avg_total,
+               avg(c.delta) AS avg_improvement,
+               count(*) FILTER (WHERE c.delta > 0) AS improved
+          FROM attempt_totals a
+          LEFT JOIN completed c USING (user_id, attempt_number)
+         GROUP BY 1
+    """, ["attempt_number"]),
+
+    # Users, assessed users and average best scores per onboarding answer
+    "mv_onboarding_breakdown": ("""
+        WITH best AS (
+            SELECT user_id, sum(best_score) AS best_total
+              FROM (SELECT user_id, level, max(score) AS best_score FROM responses GROUP BY 1, 2) b
+             GROUP BY 1
+        ), answers AS (
+            SELECT id AS user_id, 'step1' AS dimension, NULLIF(lower(trim(step1)), '') AS value FROM users
+            UNION ALL
+            SELECT id, 'step2', NULLIF(lower(trim(step2)), '') FROM users
+            UNION ALL
+            SELECT id, 'step3', CASE WHEN step3 IS NULL THEN NULL
+                                     WHEN step3 < 10 THEN '<10'
+                                     WHEN step3 < 50 THEN '10-49'
+                                     WHEN step3 < 250 THEN '50-249'
+                                     ELSE '250+' END FROM users
+            UNION ALL
+            SELECT id, 'step4', NULLIF(lower(trim(step4)), '') FROM users
+            UNION ALL
+            SELECT id, 'step5', NULLIF(lower(trim(step5)), '') FROM users
+        )
+        SELECT a.dimension,
+               COALESCE(a.value, '(not answered)') AS value,
+               count(*) AS users,
+               count(b.user_id) AS assessed,
+               avg(b.best_total) AS avg_best_total,
+               avg(""" + FINAL_LEVEL_SQL.format(total="b.best_total") + """) AS avg_final_level
+          FROM answers a
+          LEFT JOIN best b USING (user_id)
+         GROUP BY 1, 2
+    """, ["dimension", "value"]),
+
+    # Totals and the time of the last refresh
+    "mv_analytics_meta": ("""
+        SELECT 1 AS id, {now} AS refreshed_at,
+               (SELECT count(*) FROM users) AS users,
+               (SELECT count(*) FROM responses) AS responses
+    """, ["id"]),
+}
+
+DIMENSIONS = {
+    "step1": "Organization",
+    "step2": "Industry type",
+    "step3": "Number of employees",
+    "step4": "Main fuel type",
+    "step5": "Primary concern",
+}
+
+
+def view_query(name, dialect="postgresql"):
+    # str.replace, not format: the queries contain literal braces
+    query = VIEWS[name][0]
+    for placeholder, sql in DIALECT_SQL[dialect].items():
+        query = query.replace("{" + placeholder + "}", sql)
+    return query
+
+
+def create_statements():
+    """CREATE statements for every view plus the unique index REFRESH ... CONCURRENTLY needs."""
+    statements = []
+    for name, (query, key) in VIEWS.items():
+        statements.append(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {view_query(name)}")
+        statements.append(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{name} ON {name} ({', '.join(key)})")
+    return statements
+
+
+def views_exist():
+    if db.engine.dialect.name == "sqlite":
+        sql = "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN ({})"
+        found = db.session.execute(
+            text(sql.format(", ".join(f"'{name}'" for name in VIEWS)))
+        ).scalar()
+    else:
+        found = db.session.execute(
+            text("SELECT count(*) FROM pg_matviews WHERE matviewname = ANY(:names)"),
+            {"names": list(VIEWS)}
+        ).scalar()
+    return found == len(VIEWS)
+
+
+def _rebuild_tables(log=None):
+    """SQLite: no materialized views, so each one is a table recreated in one transaction."""
+    with db.engine.begin() as conn:
+        for name in VIEWS:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            conn.execute(text(f"CREATE TABLE {name} AS {view_query(name, 'sqlite')}"))
+            if log:
+                log(f"  refreshed {name}")
+
+
+_refresh_lock = threading.Lock()
+
+
+def refresh_views(log=None):
+    """Create missing views, then refresh all of them without blocking readers."""
+    with _refresh_lock:
+        started = time.monotonic()
+        if db.engine.dialect.name == "sqlite":
+            _rebuild_tables(log)
+            return time.monotonic() - started
+        with db.engine.begin() as conn:
+            for statement in create_statements():
+                conn.execute(text(statement))
+        for name in VIEWS:
+            with db.engine.begin() as conn:
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+            if log:
+                log(f"  refreshed {name}")
+        return time.monotonic() - started
+
+
+def refresh_in_background(app):
+    """Refresh on a worker thread unless a refresh is already running."""
+    if _refresh_lock.locked():
+        return
+
+    def run():
+        with app.app_context():
+            try:
+                refresh_views()
+            except Exception:
+                app.logger.exception("Analytics refresh failed")
+
+    threading.Thread(target=run, daemon=True, name="analytics-refresh").start()
+
+
+def load():
+    """Everything the admin analytics page shows, read from the views."""
+    def rows(sql, **params):
+        return [dict(r._mapping) for r in db.session.execute(text(sql), params)]
+
+    meta = rows("SELECT refreshed_at, users, responses FROM mv_analytics_meta")
+    for r in meta:
+        # SQLite hands the timestamp back as text
+        if isinstance(r["refreshed_at"], str):
+            r["refreshed_at"] = datetime.fromisoformat(r["refreshed_at"])
+    distribution = {}
+    for r in rows("SELECT level, bucket, responses FROM mv_level_score_distribution ORDER BY level, bucket"):
+        distribution.setdefault(r["level"], [0] * 10)[r["bucket"] - 1] = r["responses"]
+
+    maturity = {}
+    for r in rows("SELECT level, maturity_level, responses FROM mv_maturity_histogram ORDER BY 1, 2"):
+        maturity.setdefault(r["level"], {})[r["maturity_level"]] = r["responses"]
+
+    breakdowns = {}
+    for r in rows("""
+        SELECT dimension, value, users, assessed, avg_best_total, avg_final_level
+          FROM (SELECT *, row_number() OVER (PARTITION BY dimension ORDER BY users DESC, value) AS n
+                  FROM mv_onboarding_breakdown) t
+         WHERE n <= :limit
+         ORDER BY dimension, users DESC, value
+    """, limit=15):
+        breakdowns.setdefault(r["dimension"], []).append(r)
+
+    return {
+        "meta": meta[0] if meta else None,
+        "distribution": distribution,
+        "maturity": maturity,
+        "attempts": rows("SELECT * FROM mv_attempt_improvement ORDER BY attempt_number"),
+        "breakdowns": breakdowns,
+    }
@@ -1,14 +1,22 @@
 # app.py
 from flask import Flask, session, redirect, url_for, flash
+import click
+from sqlalchemy import event
 from flask_login import LoginManager
 from dotenv import load_dotenv
-from models import db, User, Admin
+from models import db, Admin
+import user_cache
 import os
 
 # Load environment variables from .env
 load_dotenv()
 
 
+def _sqlite_connect(dbapi_connection, connection_record):
+    # SQLite leaves foreign keys (and so ON DELETE CASCADE) off by default
+    dbapi_connection.execute("PRAGMA foreign_keys = ON")
+
+
 def create_app():
     app = Flask(__name__)
     
@@ -21,14 +29,27 @@ def create_app():
     # Initialize SQLAlchemy
     db.init_app(app)
 
+    # SQLite profile (config.py): an in-memory database starts empty
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        with app.app_context():
+            event.listen(db.engine, "connect", _sqlite_connect)
+            if app.config.get("DB_PROFILE") == "sqlite-memory":
+                db.create_all()
+
+    # Opt-in per-request profiling (see profiling.py)
+    if app.config.get("PROFILING"):
+        import profiling
+        profiling.init_app(app)
+
     # Initialize LoginManager
     login_manager = LoginManager()
     login_manager.login_view = "login"  # default login route
     login_manager.init_app(app)
 
+    # Per-process cache of the logged-in users (see user_cache.py)
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.load_user(user_id)
 
     # ----------------------------------------------------
     # Admin helper decorator
@@ -58,11 +79,210 @@ def create_app():
     # ----------------------------------------------------
     @app.cli.command("initdb")
     def initdb_command():
-        """Initialize the PostgreSQL database"""
+        """Initialize the database (PostgreSQL, or SQLite with DB_PROFILE=sqlite)"""
         with app.app_context():
             db.create_all()
             print("Database tables created successfully.")
 
+    # ----------------------------------------------------
+    # CLI command to migrate an existing database
+    # ----------------------------------------------------
+    @app.cli.command("migrate")
+    @click.option("--list", "list_only", is_flag=True, help="Only show which migrations are applied.")
+    def migrate_command(list_only):
+        """Apply pending schema/data migrations (see migrations.py)"""
+        from migrations import MIGRATIONS, applied_migrations, migrate
+
+        with app.app_context():
+            if list_only:
+                done = applied_migrations(db.engine)
+                for migration_id, description, _ in MIGRATIONS:
+                    print(f"[{'x' if migration_id in done else ' '}] {migration_id}: {description}")
+                return
+            applied = migrate(db.engine)
+            print(f"Applied {len(applied)} migration(s).")
+
+    # ----------------------------------------------------
+    # CLI command to store missing per-user score summaries
+    # ----------------------------------------------------
+    @app.cli.command("backfill-score-summaries")
+    @click.option("--batch-size", default=500, show_default=True, help="Users per transaction.")
+    def backfill_score_summaries_command(batch_size):
+        """Store score summaries for users with responses but none yet (after migrate or import-data)"""
+        from score_summary import backfill
+
+        with app.app_context():
+            stored = backfill(batch_size, log=print)
+        print(f"Stored {stored} score summaries.")
+
+    # ----------------------------------------------------
+    # CLI command to check query plans for sequential scans
+    # ----------------------------------------------------
+    @app.cli.command("check-query-plans")
+    @click.option("--users", default=20000, show_default=True, help="Synthetic users to seed (rolled back).")
+    @click.option("--attempts", default=3, show_default=True, help="Attempts per synthetic user.")
+    @click.option("--output", type=click.Path(), help="Write the captured plans to this JSON file.")
+    def check_query_plans_command(users, attempts, output):
+        """EXPLAIN the routes' queries on a large seeded dataset; fail on Seq Scans"""
+        import json
+        from query_plans import check_query_plans
+
+        with app.app_context():
+            results = check_query_plans(users=users, attempts=attempts)
+
+        failed = 0
+        for name, result in results.items():
+            scans = result["seq_scans"]
+            failed += bool(scans)
+            status = f"SEQ SCAN on {', '.join(scans)}" if scans else "ok"
+            cost = result["plan"].get("Total Cost")
+            print(f"  {name}: {status}" + (f" (cost {cost})" if cost is not None else ""))
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        if failed:
+            raise click.ClickException(f"{failed} query plan(s) use sequential scans.")
+        print("All query plans use indexes.")
+
+    # ----------------------------------------------------
+    # CLI command to refresh the admin analytics views
+    # ----------------------------------------------------
+    @app.cli.command("refresh-analytics")
+    def refresh_analytics_command():
+        """Create/refresh the analytics materialized views (schedule with cron)"""
+        from analytics import refresh_views
+
+        with app.app_context():
+            seconds = refresh_views(log=print)
+        print(f"Analytics views refreshed in {seconds:.1f}s.")
+
+    # ----------------------------------------------------
+    # CLI command to score a batch of offline assessments
+    # ----------------------------------------------------
+    @app.cli.command("score-batch")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Input format (default: from the file extension).")
+    @click.option("--output", type=click.Path(dir_okay=False), help="Write the per-level scores to this CSV file.")
+    @click.option("--create-users", is_flag=True, help="Create users for emails not registered yet.")
+    @click.option("--dry-run", is_flag=True, help="Score only; save nothing.")
+    def score_batch_command(path, fmt, output, create_users, dry_run):
+        """Score a CSV/JSONL of answers (keyed by question id) and save the responses"""
+        from bulk_scoring import BatchError, read_columns, score_batch, write_results
+
+        fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".json")) else "csv")
+        with app.app_context():
+            try:
+                with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                    columns = read_columns(f, fmt)
+                result = score_batch(columns, create_users=create_users, dry_run=dry_run)
+            except BatchError as e:
+                raise click.ClickException(str(e))
+
+        for row, qid, value in result["unknown_answers"][:20]:
+            print(f"  ! record {row + 1}, question {qid}: unknown answer {value!r} (scored 0)")
+        if len(result["unknown_answers"]) > 20:
+            print(f"  ! ... {len(result['unknown_answers']) - 20} more unknown answers")
+        if output:
+            with open(output, "w", encoding="utf-8", newline="") as f:
+                write_results(f, result["results"])
+        rate = result["records"] / result["seconds"] if result["seconds"] else 0
+        verb = "Scored" if dry_run else "Saved"
+        print(f"{verb} {result['responses']} responses from {result['records']} records "
+              f"in {result['seconds']:.2f}s ({rate:.0f} records/s).")
+
+    # ----------------------------------------------------
+    # CLI command to bulk-import users and responses (COPY)
+    # ----------------------------------------------------
+    @app.cli.command("import-data")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["dump", "csv", "jsonl"]),
+                  help="pg_dump SQL file or legacy assessments (default: from the file extension).")
+    @click.option("--batch-size", type=int, default=None, help="Rows per COPY batch.")
+    def import_data_command(path, fmt, batch_size):
+        """Validate and load users/responses from a SQL dump or CSV/JSONL with COPY (re-runnable)"""
+        import bulk_import
+        from bulk_scoring import BatchError
+
+        fmt = fmt or ("dump" if path.endswith(".sql") else "jsonl" if path.endswith((".jsonl", ".json")) else "csv")
+        invalid = []
+        with app.app_context():
+            if db.engine.dialect.name != "postgresql":
+                raise click.ClickException("import-data needs PostgreSQL (COPY).")
+            try:
+                if fmt == "dump":
+                    users, responses = bulk_import.dump_source(path, invalid)
+                else:
+                    users, responses = bulk_import.assessment_source(path, fmt, invalid)
+                stats = bulk_import.import_rows(users, responses, batch_size or bulk_import.BATCH_SIZE)
+            except BatchError as e:
+                raise click.ClickException(str(e))
+
+        for where, reason in invalid[:20]:
+            print(f"  ! {where}: {reason} (skipped)")
+        if len(invalid) > 20:
+            print(f"  ! ... {len(invalid) - 20} more invalid rows")
+        seconds = stats["seconds"] or 1e-9
+        print(f"Users: {stats['users']} read, {stats['users_inserted']} inserted, {stats['users_updated']} updated.")
+        print(f"Responses: {stats['responses']} read, {stats['responses_inserted']} inserted, "
+              f"{stats['responses_updated']} updated, {len(invalid)} invalid row(s) skipped.")
+        print(f"Done in {stats['seconds']:.2f}s ({stats['responses'] / seconds:.0f} responses/s; "
+              f"COPY {stats['copy_seconds']:.2f}s, merge {stats['merge_seconds']:.2f}s).")
+        if stats["responses_inserted"] or stats["responses_updated"]:
+            print("Run `flask backfill-score-summaries` to store the imported users' score summaries.")
+
+    # ----------------------------------------------------
+    # CLI command to export users and responses
+    # ----------------------------------------------------
+    @app.cli.command("export")
+    @click.argument("output", type=click.Path(dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "parquet"]), help="Default: from the file extension.")
+    @click.option("--columns", help="Comma-separated column names (default: user and response columns).")
+    @click.option("--list-columns", is_flag=True, help="Only list the available columns.")
+    def export_command(output, fmt, columns, list_columns):
+        """Stream users joined with responses to a CSV or Parquet file"""
+        import export
+
+        if list_columns:
+            print("\n".join(export.COLUMNS))
+            return
+        fmt = fmt or ("parquet" if output.endswith(".parquet") else "csv")
+        try:
+            columns = export.parse_columns(columns)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if fmt == "parquet" and export.pa is None:
+            raise click.ClickException("Parquet export needs pyarrow (pip install pyarrow).")
+
+        if fmt == "csv":
+            stream, f = export.stream_csv, open(output, "w", encoding="utf-8", newline="")
+        else:
+            stream, f = export.stream_parquet, open(output, "wb")
+        with app.app_context(), f:
+            for chunk in stream(db.engine, columns):
+                f.write(chunk)
+        print(f"Exported {len(columns)} column(s) to {output}.")
+
+    # ----------------------------------------------------
+    # CLI command to pre-generate every cached suggestion
+    # ----------------------------------------------------
+    @app.cli.command("precompute-suggestions")
+    @click.option("--concurrency", default=4, show_default=True, help="Parallel LLM calls.")
+    @click.option("--engine", "engines", multiple=True,
+                  help="Only these engines (repeatable); tips_resources is only generated when named here.")
+    @click.option("--dry-run", is_flag=True, help="Only report what would be generated.")
+    @click.option("--snippets", is_flag=True, help="Also warm the per-answer snippets (SUGGESTION_MODE=compositional).")
+    def precompute_suggestions_command(concurrency, engines, dry_run, snippets):
+        """Generate suggestions for every reachable score (resumable)"""
+        import suggestion_cache
+        from precompute import precompute_suggestions
+
+        if suggestion_cache.CACHE_BACKEND not in ("disk", "postgres"):
+            print("Warning: SUGGESTION_CACHE_BACKEND is not persistent, results are lost on exit.")
+        result = precompute_suggestions(
+            app, concurrency=concurrency, engines=engines, dry_run=dry_run, snippets=snippets
+        )
+        print(f"Generated {result['generated']} suggestions, {result['failed']} failed.")
+
     return app
 
 
@@ -0,0 +1,67 @@
+# attempt_state.py
+from flask import g
+
+from models import db, Response
+
+# ===============================
+# Questionnaire attempt state
+# ===============================
+# Which attempt the user is on, which of its levels are done and which are
+# unlocked, derived from the responses table with one grouped query and
+# memoized for the rest of the request. Always read from the database, never
+# from the session, so it cannot drift from what was actually submitted.
+
+LEVEL_COUNT = 4
+
+
+def attempt_levels_query(user_id):
+    """(attempt_number, level) pairs of the user's last two attempts."""
+    latest = (
+        db.select(db.func.max(Response.attempt_number))
+        .filter_by(user_id=user_id)
+        .scalar_subquery()
+    )
+    return (
+        db.select(Response.attempt_number, Response.level)
+        .filter(Response.user_id == user_id, Response.attempt_number >= latest - 1)
+        .group_by(Response.attempt_number, Response.level)
+    )
+
+
+class AttemptState:
+    def __init__(self, levels_by_attempt):
+        last_attempt = max(levels_by_attempt, default=0)
+        last_complete = len(levels_by_attempt.get(last_attempt, ())) >= LEVEL_COUNT
+
+        self.last_attempt = last_attempt
+        # Attempt the next submission belongs to
+        self.current_attempt = last_attempt + 1 if last_complete or not last_attempt else last_attempt
+        self.completed_levels = set(levels_by_attempt.get(self.current_attempt, ()))
+        # A new attempt may start once the latest one has every level
+        self.can_start_new = last_complete or not last_attempt
+        # The attempt before the current one was finished
+        self.previous_complete = (
+            len(levels_by_attempt.get(self.current_attempt - 1, ())) >= LEVEL_COUNT
+        )
+
+        self.levels_unlocked = [1]
+        for lvl in range(2, LEVEL_COUNT + 1):
+            if (lvl - 1) not in self.completed_levels:
+                break
+            self.levels_unlocked.append(lvl)
+
+
+def get_attempt_state(user_id):
+    """The user's attempt state, queried at most once per request."""
+    cache = g.setdefault("attempt_state", {})
+    if user_id not in cache:
+        levels_by_attempt = {}
+        for attempt_number, level in db.session.execute(attempt_levels_query(user_id)):
+            levels_by_attempt.setdefault(attempt_number or 1, set()).add(level)
+        cache[user_id] = AttemptState(levels_by_attempt)
+    return cache[user_id]
+
+
+def invalidate_attempt_state(user_id):
+    """Forget the memoized state after the user submits a level."""
+    g.get("attempt_state", {}).pop(user_id, None)
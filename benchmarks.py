@@ -0,0 +1,429 @@
+# benchmarks.py
+"""
+Microbenchmarks for the scoring, aggregation and rendering hot paths.
+
+    python benchmarks.py                              # run all, print a table
+    python benchmarks.py --save .benchmarks/HEAD.json
+    python benchmarks.py --compare .benchmarks/HEAD.json --fail-threshold 10
+    python benchmarks.py -k render --attempts 1,100
+
+Runs against an in-memory SQLite database (DB_PROFILE=sqlite-memory) unless
+DB_PROFILE/DATABASE_URL say otherwise, with synthetic users seeded with 1,
+10 and 100 attempts (removed again afterwards). Each benchmark is
+calibrated like pytest-benchmark: enough iterations per round for the
+timer to be exact, as many rounds as fit in --max-time, and min / max /
+mean / stddev / median / IQR / ops per call. --save writes them as JSON
+with the commit they were measured on; --compare prints the change in
+median against such a file. Markdown is converted from the fake LLM's
+reply when LLM_FAKE_URL is set (see fake_llm_server.py), otherwise from
+the local fallback suggestions.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+# Before the app (and config.py) is imported: never benchmark against the
+# production database by accident, and measure the uncached code paths
+os.environ.setdefault("DB_PROFILE", "sqlite-memory")
+os.environ.setdefault("PAGE_CACHE", "false")
+os.environ.setdefault("SUGGESTION_CACHE_BACKEND", "memory")
+
+import markdown
+from flask import render_template
+from flask_login import login_user
+from werkzeug.security import generate_password_hash
+
+from app import app
+from models import db, User, Response, UserScoreSummary
+from question_bank import LEVEL_TABLES, LEVEL_MAX_SCORES, compute_level_maturity_from_percent, score_level
+from score_summary import _apply, backfill, rebuild
+from fallback_engine import fallback_total_suggestion
+from routes import TRANSLATIONS, NAV_TRANSLATIONS
+import engine_registry
+
+MIN_ROUND_TIME = 0.002  # seconds; iterations per round are raised until a round takes this long
+MIN_ROUNDS = 5
+MAX_ROUNDS = 10000
+WARMUP_TIME = 0.05
+BENCH_EMAIL = "bench-{}@benchmarks.invalid"
+
+
+# ===============================
+# Timing and statistics
+# ===============================
+def _time_round(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def measure(func, max_time=1.0, disable_gc=False):
+    """Calibrate, then time func; returns pytest-benchmark style stats (seconds per call)."""
+    deadline = time.perf_counter() + WARMUP_TIME
+    while time.perf_counter() < deadline:
+        func()
+
+    iterations = 1
+    while True:
+        duration = _time_round(func, iterations) * iterations
+        if duration >= MIN_ROUND_TIME:
+            break
+        iterations *= max(2, min(10, math.ceil(MIN_ROUND_TIME / max(duration, 1e-9))))
+    rounds = max(MIN_ROUNDS, min(MAX_ROUNDS, int(max_time / duration)))
+
+    gc_was_enabled = gc.isenabled()
+    if disable_gc:
+        gc.disable()
+    try:
+        times = [_time_round(func, iterations) for _ in range(rounds)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    q1, _, q3 = statistics.quantiles(times, n=4)
+    mean = statistics.mean(times)
+    return {
+        "min": min(times),
+        "max": max(times),
+        "mean": mean,
+        "stddev": statistics.stdev(times),
+        "median": statistics.median(times),
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "ops": 1 / mean if mean else 0.0,
+        "rounds": rounds,
+        "iterations": iterations,
+        "total": sum(times) * iterations,
+    }
+
+
+# ===============================
+# Synthetic data
+# ===============================
+def random_answers(level, rng):
+    """A questionnaire form for one level ("q_<id>" -> option key), as request.form would be."""
+    table = LEVEL_TABLES[level]
+    return {
+        f"q_{qid}": rng.choice(list(scores)) if scores else ""
+        for qid, scores in zip(table.question_ids, table.option_scores)
+    }
+
+
+def remove_users():
+    User.query.filter(User.email.like(BENCH_EMAIL.format("%"))).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def seed_users(attempt_counts, seed=42):
+    """One user per attempt count, every attempt with all four levels submitted; -> {attempts: user_id}."""
+    rng = random.Random(seed)
+    password_hash = generate_password_hash("benchmark")
+    remove_users()
+    users = {}
+    for n in attempt_counts:
+        user = User(email=BENCH_EMAIL.format(n), password_hash=password_hash, name=f"Benchmark {n}",
+                    language="en", onboard_complete=True)
+        db.session.add(user)
+        db.session.flush()
+        for attempt in range(1, n + 1):
+            for level in LEVEL_TABLES:
+                score, maturity, details = score_level(level, random_answers(level, rng))
+                db.session.add(Response(user_id=user.id, level=level, score=score, maturity_level=maturity,
+                                        details=details, attempt_number=attempt))
+        users[n] = user.id
+    db.session.commit()
+    backfill()
+    return users
+
+
+def sample_markdown():
+    """Typical suggestion Markdown: a fake LLM reply if LLM_FAKE_URL is set, else the local fallback."""
+    args = (27.5, sum(LEVEL_MAX_SCORES.values()))
+    if engine_registry.LLM_FAKE_URL:
+        return engine_registry.complete("total", *args)
+    return fallback_total_suggestion(*args)
+
+
+# ===============================
+# Benchmarks
+# ===============================
+# (group, name, per_user, in_request, setup): setup(user_id or None)
+# returns the callable to time (or None to skip); per_user benchmarks run
+# once per seeded attempt count, in_request ones inside a request context
+# with the user logged in.
+BENCHMARKS = []
+
+
+def benchmark(group, per_user=False, in_request=True):
+    def register(setup):
+        BENCHMARKS.append((group, setup.__name__, per_user, in_request, setup))
+        return setup
+    return register
+
+
+@benchmark("scoring")
+def score_all_levels(_):
+    """questionnaire_level POST: score one submission of every level."""
+    forms = {level: random_answers(level, random.Random(level)) for level in LEVEL_TABLES}
+    return lambda: [score_level(level, form) for level, form in forms.items()]
+
+
+@benchmark("scoring")
+def maturity_from_percent(_):
+    percents = [p / 2 for p in range(201)]
+    return lambda: [compute_level_maturity_from_percent(p) for p in percents]
+
+
+@benchmark("aggregation", per_user=True)
+def best_scores(user_id):
+    """Best score per level and per-attempt totals over all of a user's responses (score_summary)."""
+    responses = Response.query.filter_by(user_id=user_id).order_by(Response.id).all()
+    for response in responses:
+        db.session.expunge(response)
+    return lambda: rebuild_from(user_id, responses)
+
+
+def rebuild_from(user_id, responses):
+    # score_summary.rebuild() minus its query, so only the aggregation is timed
+    summary = UserScoreSummary(user_id=user_id, best_scores={}, attempts={}, total_best_score=0.0)
+    for response in responses:
+        _apply(summary, response, response.score_max)
+    return summary
+
+
+@benchmark("aggregation")
+def rebuild_query(_):
+    """score_summary.rebuild() of the 10-attempt user, query included."""
+    user_id = db.session.query(User.id).filter_by(email=BENCH_EMAIL.format(10)).scalar()
+    if user_id is None:
+        return None
+    return lambda: rebuild(user_id)
+
+
+@benchmark("markdown")
+def markdown_llm_output(_):
+    text = sample_markdown()
+    return lambda: markdown.markdown(text, extensions=["extra"])
+
+
+@benchmark("render", per_user=True)
+def performance_insights_html(user_id):
+    """Jinja only: performance_insights.html with the context the route builds."""
+    responses = Response.query.filter_by(user_id=user_id).order_by(Response.attempt_number, Response.level).all()
+    context = {
+        "attempts": [r.attempt_number for r in responses],
+        "scores": [r.score for r in responses],
+        "levels": [r.level for r in responses],
+        "group_names": [f"Level {r.level}" for r in responses],
+        "maturity": [r.maturity_level for r in responses],
+        "dates": [r.created_at.strftime("%d %b %Y") for r in responses],
+        "translations": TRANSLATIONS["en"],
+    }
+    return lambda: render_template("performance_insights.html", **context)
+
+
+@benchmark("render")
+def suggestions_html(_):
+    return lambda: render_template("suggestions.html", translations=NAV_TRANSLATIONS)
+
+
+def _route(path):
+    def setup(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+        response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+        return lambda: client.get(path).close()
+    return setup
+
+
+# Whole requests: the performance() grouping and suggestions_overall's level
+# totals live inside their views, so they are timed through the test client
+# (outside any app context, so each request gets its own session as in production)
+for _name, _path in [("performance", "/performance"), ("performance_insights", "/performance_insights"),
+                     ("suggestions_overall", "/suggestions/overall"), ("home", "/home")]:
+    _setup = _route(_path)
+    _setup.__name__ = _name
+    benchmark("route", per_user=True, in_request=False)(_setup)
+
+
+# ===============================
+# Reporting
+# ===============================
+UNITS = [(1e-9, "ns"), (1e-6, "us"), (1e-3, "ms"), (1, "s")]
+
+
+def _unit(seconds):
+    for scale, name in reversed(UNITS):
+        if seconds >= scale:
+            return scale, name
+    return UNITS[0]
+
+
+def print_table(results):
+    scale, unit = _unit(min(r["stats"]["min"] for r in results))
+    width = max(len(r["fullname"]) for r in results)
+    columns = ["min", "max", "mean", "stddev", "median", "iqr"]
+    print(f"{'Name (time in ' + unit + ')':<{width}}  " + "".join(f"{c.capitalize():>12}" for c in columns)
+          + f"{'OPS':>14}{'Rounds':>8}{'Iters':>8}")
+    for r in results:
+        s = r["stats"]
+        print(f"{r['fullname']:<{width}}  " + "".join(f"{s[c] / scale:>12.3f}" for c in columns)
+              + f"{s['ops']:>14.1f}{s['rounds']:>8}{s['iterations']:>8}")
+
+
+def compare(results, baseline_path, info, threshold=None):
+    """Print the change in median against a saved run; -> names that regressed beyond threshold (%)."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {b["fullname"]: b["stats"] for b in baseline["benchmarks"]}
+    commit = (baseline.get("commit_info", {}).get("id") or "?")[:12]
+    print(f"\nCompared with {baseline_path} (commit {commit}, {baseline.get('datetime', '?')}):")
+    for key in ("database", "markdown_source", "python_version"):
+        if baseline.get("machine_info", {}).get(key) != info[key]:
+            print(f"  ! {key} differs: {baseline.get('machine_info', {}).get(key)} -> {info[key]}")
+
+    regressed = []
+    width = max(len(r["fullname"]) for r in results)
+    for r in results:
+        old = before.get(r["fullname"])
+        if old is None:
+            print(f"  {r['fullname']:<{width}}  (new)")
+            continue
+        scale, unit = _unit(old["median"])
+        change = (r["stats"]["median"] / old["median"] - 1) * 100 if old["median"] else 0.0
+        flag = ""
+        if threshold is not None and change > threshold:
+            flag = "  REGRESSION"
+            regressed.append(r["fullname"])
+        print(f"  {r['fullname']:<{width}}  {old['median'] / scale:10.3f} -> {r['stats']['median'] / scale:10.3f} {unit:<2}"
+              f"  {change:+7.1f}%{flag}")
+    return regressed
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine_info():
+    with app.app_context():
+        database = db.engine.dialect.name
+    return {
+        "python_version": platform.python_version(),
+        "python_implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "database": database,
+        "markdown_source": "fake LLM" if engine_registry.LLM_FAKE_URL else "fallback",
+    }
+
+
+def commit_info():
+    return {
+        "id": _git("rev-parse", "HEAD"),
+        "branch": _git("rev-parse", "--abbrev-ref", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+# ===============================
+# Runner
+# ===============================
+def select(attempt_counts, keyword=None):
+    """(fullname, group, name, attempts or None, in_request, setup) of each benchmark to run."""
+    selected = []
+    for group, name, per_user, in_request, setup in BENCHMARKS:
+        for attempts in (attempt_counts if per_user else [None]):
+            fullname = f"{group}/{name}" + (f"[attempts={attempts}]" if per_user else "")
+            if not keyword or keyword in fullname:
+                selected.append((fullname, group, name, attempts, in_request, setup))
+    return selected
+
+
+def run_benchmarks(selected, attempt_counts, max_time=1.0, disable_gc=False, log=print):
+    results = []
+    with app.app_context():
+        users = seed_users(attempt_counts)
+    try:
+        for fullname, group, name, attempts, in_request, setup in selected:
+            params = {"attempts": attempts} if attempts is not None else {}
+            user_id = users[attempts] if attempts is not None else None
+            with app.test_request_context() if in_request else nullcontext():
+                if in_request and user_id is not None:
+                    # Templates may read current_user, as in the real request
+                    login_user(db.session.get(User, user_id))
+                func = setup(user_id)
+                if func is None:
+                    continue
+                stats = measure(func, max_time=max_time, disable_gc=disable_gc)
+            log(f"  {fullname}: median {stats['median'] * 1e6:.1f} us ({stats['rounds']} rounds)")
+            results.append({"group": group, "name": name, "fullname": fullname,
+                            "params": params, "stats": stats})
+    finally:
+        with app.app_context():
+            remove_users()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for scoring, aggregation and rendering.")
+    parser.add_argument("-k", dest="keyword", help="Only benchmarks whose name contains this.")
+    parser.add_argument("--attempts", default="1,10,100",
+                        help="Comma-separated attempt counts of the seeded users.")
+    parser.add_argument("--max-time", type=float, default=1.0, help="Seconds of timed rounds per benchmark.")
+    parser.add_argument("--disable-gc", action="store_true", help="Turn the garbage collector off while timing.")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as JSON (a baseline).")
+    parser.add_argument("--compare", metavar="PATH", help="Compare medians with a saved JSON baseline.")
+    parser.add_argument("--fail-threshold", type=float, metavar="PCT",
+                        help="With --compare, exit 1 if a median got slower by more than PCT percent.")
+    args = parser.parse_args()
+
+    attempt_counts = sorted({int(n) for n in args.attempts.split(",") if n.strip()})
+    selected = select(attempt_counts, args.keyword)
+    if not selected:
+        sys.exit("No benchmarks matched.")
+    info = machine_info()
+    print(f"Seeding users with {', '.join(map(str, attempt_counts))} attempt(s) on {info['database']} ...")
+    results = run_benchmarks(selected, attempt_counts, args.max_time, args.disable_gc)
+    print()
+    print_table(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "machine_info": info,
+                "commit_info": commit_info(),
+                "datetime": datetime.utcnow().isoformat() + "Z",
+                "benchmarks": results,
+            }, f, indent=2)
+        print(f"\nSaved {len(results)} result(s) to {args.save}.")
+
+    if args.compare:
+        regressed = compare(results, args.compare, info, args.fail_threshold)
+        if regressed:
+            sys.exit(f"{len(regressed)} benchmark(s) slower than the baseline by more than {args.fail_threshold}%.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+# bulk_import.py
+import json
+import re
+import time
+from datetime import datetime
+
+from models import db
+from question_bank import LEVEL_TABLES
+from bulk_scoring import BatchError, DetailsWriter, read_columns, score_level_batch
+
+# ===============================
+# Bulk import with PostgreSQL COPY
+# ===============================
+# Loads users and responses from a pg_dump of this schema (the COPY blocks
+# of e.g. carbon_db_backup.sql) or from legacy assessments (the CSV/JSONL
+# format of `flask score-batch`). Every response is checked against the
+# compiled questionnaire first. Valid rows are streamed with COPY into
+# temporary staging tables, BATCH_SIZE at a time, and merged from there in
+# set-based statements: users are upserted on email and responses on
+# (user, attempt_number, level), so importing the same data twice leaves no
+# duplicates. Each batch is committed on its own.
+
+BATCH_SIZE = 50000
+SCORE_TOLERANCE = 1e-6
+
+USER_FIELDS = [
+    "email", "password_hash", "name", "created_at", "language", "onboard_complete",
+    "step1", "step2", "step3", "step4", "step5",
+]
+RESPONSE_FIELDS = ["email", "level", "score", "maturity_level", "details", "attempt_number", "created_at"]
+
+STAGING_TABLES = [
+    """
+    CREATE TEMP TABLE IF NOT EXISTS import_users (
+        email TEXT, password_hash TEXT, name TEXT, created_at TIMESTAMP, language TEXT,
+        onboard_complete BOOLEAN, step1 TEXT, step2 TEXT, step3 INTEGER, step4 TEXT, step5 TEXT
+    ) ON COMMIT DELETE ROWS
+    """,
+    """
+    CREATE TEMP TABLE IF NOT EXISTS import_responses (
+        email TEXT, level INTEGER, score DOUBLE PRECISION, maturity_level INTEGER,
+        details JSONB, attempt_number INTEGER, created_at TIMESTAMP, user_id INTEGER
+    ) ON COMMIT DELETE ROWS
+    """,
+    # Users whose responses this batch actually inserted or changed
+    "CREATE TEMP TABLE IF NOT EXISTS import_changed (user_id INTEGER) ON COMMIT DELETE ROWS",
+]
+
+# The last row per key wins when a batch repeats one; imported values
+# replace existing ones, NULLs keep what is there
+MERGE_USERS = [
+    ("users_updated", """
+        UPDATE users u
+           SET password_hash = COALESCE(s.password_hash, u.password_hash),
+               name = COALESCE(s.name, u.name),
+               language = COALESCE(s.language, u.language),
+               onboard_complete = COALESCE(s.onboard_complete, u.onboard_complete),
+               step1 = COALESCE(s.step1, u.step1),
+               step2 = COALESCE(s.step2, u.step2),
+               step3 = COALESCE(s.step3, u.step3),
+               step4 = COALESCE(s.step4, u.step4),
+               step5 = COALESCE(s.step5, u.step5)
+          FROM (SELECT DISTINCT ON (email) * FROM import_users ORDER BY email, ctid DESC) s
+         WHERE u.email = s.email
+           AND (COALESCE(s.password_hash, u.password_hash), COALESCE(s.name, u.name),
+                COALESCE(s.language, u.language), COALESCE(s.onboard_complete, u.onboard_complete),
+                COALESCE(s.step1, u.step1), COALESCE(s.step2, u.step2), COALESCE(s.step3, u.step3),
+                COALESCE(s.step4, u.step4), COALESCE(s.step5, u.step5))
+               IS DISTINCT FROM
+               (u.password_hash, u.name, u.language, u.onboard_complete,
+                u.step1, u.step2, u.step3, u.step4, u.step5)
+    """),
+    ("users_inserted", """
+        INSERT INTO users (email, password_hash, name, created_at, language, onboard_complete,
+                           step1, step2, step3, step4, step5)
+        SELECT DISTINCT ON (email)
+               email, password_hash, COALESCE(name, split_part(email, '@', 1)),
+               COALESCE(created_at, now()), COALESCE(language, 'en'), COALESCE(onboard_complete, false),
+               step1, step2, step3, step4, step5
+          FROM import_users s
+         WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.email = s.email)
+         ORDER BY email, ctid DESC
+        ON CONFLICT (email) DO NOTHING
+    """),
+]
+
+# responses has no unique key on (user_id, attempt_number, level), so the
+# upsert is an UPDATE of the matching rows plus an INSERT of the rest, with
+# the table locked against concurrent writers in between
+_STAGED_RESPONSES = """
+    (SELECT DISTINCT ON (user_id, attempt_number, level) *
+       FROM import_responses
+      WHERE user_id IS NOT NULL
+      ORDER BY user_id, attempt_number, level, ctid DESC)
+"""
+MERGE_RESPONSES = [
+    ("", "LOCK TABLE responses IN SHARE ROW EXCLUSIVE MODE"),
+    # Unchanged (toasted) details are not rewritten by this UPDATE
+    ("", "UPDATE import_responses s SET user_id = u.id FROM users u WHERE u.email = s.email"),
+    ("", "ANALYZE import_responses"),
+    # _summary.submitted_at is the time of scoring, not part of the answers:
+    # re-importing the same assessments must not count as a change
+    ("responses_updated", f"""
+        WITH updated AS (
+            UPDATE responses r
+               SET score = m.score, maturity_level = m.maturity_level,
+                   details = m.details, created_at = COALESCE(m.created_at, r.created_at)
+              FROM {_STAGED_RESPONSES} m
+             WHERE r.user_id = m.user_id AND r.attempt_number = m.attempt_number AND r.level = m.level
+               AND (r.score, r.maturity_level, r.details #- '{{_summary,submitted_at}}', r.created_at)
+                   IS DISTINCT FROM (m.score, m.maturity_level, m.details #- '{{_summary,submitted_at}}',
+                                     COALESCE(m.created_at, r.created_at))
+         RETURNING r.user_id
+        )
+        INSERT INTO import_changed SELECT user_id FROM updated
+    """),
+    ("responses_inserted", f"""
+        WITH inserted AS (
+            INSERT INTO responses (user_id, level, score, maturity_level, details, attempt_number, created_at)
+            SELECT m.user_id, m.level, m.score, m.maturity_level, m.details, m.attempt_number,
+                   COALESCE(m.created_at, now())
+              FROM {_STAGED_RESPONSES} m
+             WHERE NOT EXISTS (
+                   SELECT 1 FROM responses r
+                    WHERE r.user_id = m.user_id AND r.attempt_number = m.attempt_number AND r.level = m.level)
+         RETURNING user_id
+        )
+        INSERT INTO import_changed SELECT user_id FROM inserted
+    """),
+    # Summaries of users with new or changed responses are rebuilt on next use
+    ("", "DELETE FROM user_score_summary WHERE user_id IN (SELECT user_id FROM import_changed)"),
+]
+
+
+# ===============================
+# COPY text format
+# ===============================
+_UNESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+_UNESCAPE_RE = re.compile(r"\\(.)")
+
+
+def _unescape(field):
+    if field == "\\N":
+        return None
+    if "\\" not in field:
+        return field
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), field)
+
+
+def _escape(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    value = str(value)
+    if "\\" in value:
+        value = value.replace("\\", "\\\\")
+    if "\t" in value or "\n" in value or "\r" in value:
+        value = value.replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return value
+
+
+def copy_line(values):
+    return "\t".join(map(_escape, values)) + "\n"
+
+
+def read_copy_block(path, table):
+    """
+    (column names, rows as lists of values) of one table's COPY ... FROM
+    stdin block in a pg_dump file; values stay strings (None for NULL).
+    """
+    header = re.compile(rf"^COPY (?:\w+\.)?{re.escape(table)} \((.*)\) FROM stdin;$")
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = header.match(line.rstrip("\n"))
+            if match:
+                break
+        else:
+            raise BatchError(f"{path}: no COPY block for table {table!r}.")
+        columns = [name.strip().strip('"') for name in match.group(1).split(",")]
+
+        def rows():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if header.match(line.rstrip("\n")):
+                        break
+                for line in f:
+                    line = line.rstrip("\n")
+                    if line == "\\.":
+                        return
+                    yield [_unescape(field) for field in line.split("\t")]
+
+        return columns, rows()
+
+
+class _CopySource:
+    """File-like object over an iterator of COPY lines, for cursor.copy_expert."""
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            data, self.buffer = self.buffer, ""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+# ===============================
+# Validation against the questionnaire
+# ===============================
+def _parse_details(value):
+    """Response.details from the dump: a JSON object, or (older rows) a JSON string holding one."""
+    details = json.loads(value)
+    if isinstance(details, str):
+        details = json.loads(details)
+    if not isinstance(details, dict) or not isinstance(details.get("_summary"), dict):
+        raise ValueError("details has no _summary")
+    return details
+
+
+def validate_response(level, score, details):
+    """Raise ValueError unless the stored answers exist in the questionnaire and add up to score."""
+    table = LEVEL_TABLES.get(level)
+    if table is None:
+        raise ValueError(f"unknown level {level}")
+    summary = details["_summary"]
+    if summary.get("level", level) != level:
+        raise ValueError(f"details are for level {summary.get('level')}")
+
+    option_scores = dict(zip(map(str, table.question_ids), table.option_scores))
+    total = 0.0
+    for group in (summary.get("parameter_summary") or {}).values():
+        for q in group.get("questions", []):
+            scores = option_scores.get(str(q.get("id")))
+            if scores is None:
+                raise ValueError(f"question {q.get('id')} is not part of level {level}")
+            selected = q.get("selected") or ""
+            if selected and selected not in scores:
+                raise ValueError(f"question {q.get('id')}: unknown option {selected!r}")
+            total += scores.get(selected, 0.0)
+    if abs(total - score) > SCORE_TOLERANCE:
+        raise ValueError(f"score {score} does not match the answers ({total})")
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value).strip().rstrip("Z"))
+
+
+# ===============================
+# Sources
+# ===============================
+def dump_source(path, invalid):
+    """(users, responses) row iterators from a pg_dump file; rejected rows go to invalid."""
+    columns, rows = read_copy_block(path, "users")
+    emails = {}
+    users = []
+    for values in rows:
+        row = dict(zip(columns, values))
+        email = (row.get("email") or "").strip().lower()
+        if not email:
+            invalid.append((f"users id {row.get('id')}", "no email"))
+            continue
+        emails[row.get("id")] = email
+        users.append([
+            email, row.get("password_hash"), row.get("name"), row.get("created_at"), row.get("language"),
+            row.get("onboard_complete"), row.get("step1"), row.get("step2"), row.get("step3"),
+            row.get("step4"), row.get("step5"),
+        ])
+
+    def responses():
+        columns, rows = read_copy_block(path, "responses")
+        for values in rows:
+            row = dict(zip(columns, values))
+            where = f"responses id {row.get('id')}"
+            email = emails.get(row.get("user_id"))
+            if email is None:
+                invalid.append((where, f"user {row.get('user_id')} is not in the dump"))
+                continue
+            try:
+                level, score = int(row["level"]), float(row["score"])
+                details = _parse_details(row.get("details") or "null")
+                validate_response(level, score, details)
+            except (KeyError, TypeError, ValueError) as e:
+                invalid.append((where, str(e)))
+                continue
+            # Stored as the JSON object, whichever way the dump encoded it
+            raw = row["details"]
+            yield [
+                email, level, row["score"], row.get("maturity_level"),
+                raw if raw.lstrip().startswith("{") else json.dumps(details, ensure_ascii=False),
+                row.get("attempt_number") or 1, row.get("created_at"),
+            ]
+
+    return users, responses()
+
+
+def assessment_source(path, fmt, invalid):
+    """
+    (users, responses) from legacy assessments, scored like `flask
+    score-batch`. Records without attempt_number count as attempt 1, so a
+    re-import updates rather than appends; responses with answers that are
+    not options of their question are rejected.
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        columns = read_columns(f, fmt)
+    size = len(next(iter(columns.values()), []))
+    emails = [str(e or "").strip().lower() for e in columns.get("email") or [""] * size]
+    names = [str(n or "").strip() or None for n in columns.get("name") or [""] * size]
+    attempts = [str(a or "").strip() or "1" for a in columns.get("attempt_number") or [""] * size]
+    created = columns.get("created_at") or [None] * size
+
+    rejected = set()
+    for n, (email, attempt, created_at) in enumerate(zip(emails, attempts, created)):
+        if not email:
+            invalid.append((f"record {n + 1}", "no email"))
+            rejected.add(n)
+        elif not attempt.isdigit():
+            invalid.append((f"record {n + 1}", f"attempt_number {attempt!r} is not a number"))
+            rejected.add(n)
+        else:
+            try:
+                created[n] = _timestamp(created_at)
+            except ValueError:
+                invalid.append((f"record {n + 1}", f"created_at {created_at!r} is not a timestamp"))
+                rejected.add(n)
+
+    users = [
+        [email, None, name] + [None] * (len(USER_FIELDS) - 3)
+        for n, (email, name) in enumerate(zip(emails, names)) if n not in rejected
+    ]
+    responses = []
+    submitted_at = datetime.utcnow().isoformat() + "Z"
+    for level, table in LEVEL_TABLES.items():
+        rows, result, unknown = score_level_batch(level, columns)
+        bad = set()
+        for row, qid, value in unknown:
+            invalid.append((f"record {row + 1}", f"question {qid}: unknown answer {value!r}"))
+            bad.add(row)
+        writer = DetailsWriter(table, result, submitted_at)
+        for j, row in enumerate(rows):
+            if row in rejected or row in bad:
+                continue
+            responses.append([
+                emails[row], level, result["score_total"][j], result["maturity_level"][j],
+                writer.row(j), attempts[row], created[row],
+            ])
+    return users, responses
+
+
+# ===============================
+# Loading
+# ===============================
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _copy(cursor, table, fields, rows):
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(fields)}) FROM STDIN",
+        _CopySource(copy_line(row) for row in rows)
+    )
+
+
+def load_batch(users, responses, stats):
+    """COPY one batch into the staging tables, merge it and commit."""
+    connection = db.session.connection()
+    for statement in STAGING_TABLES:
+        connection.exec_driver_sql(statement)
+    cursor = connection.connection.cursor()
+
+    started = time.monotonic()
+    if users:
+        _copy(cursor, "import_users", USER_FIELDS, users)
+    if responses:
+        _copy(cursor, "import_responses", RESPONSE_FIELDS, responses)
+    stats["copy_seconds"] += time.monotonic() - started
+
+    started = time.monotonic()
+    if users:
+        connection.exec_driver_sql("ANALYZE import_users")
+        for counter, statement in MERGE_USERS:
+            stats[counter] += connection.exec_driver_sql(statement).rowcount
+    if responses:
+        for counter, statement in MERGE_RESPONSES:
+            result = connection.exec_driver_sql(statement)
+            if counter:
+                stats[counter] += result.rowcount
+    db.session.commit()
+    stats["merge_seconds"] += time.monotonic() - started
+
+
+def import_rows(users, responses, batch_size=BATCH_SIZE, log=print):
+    """
+    Load (users, responses) row iterators (USER_FIELDS / RESPONSE_FIELDS
+    order) in batches. All users go in before any response, so responses
+    can refer to users anywhere in the input.
+    """
+    stats = {
+        "users": 0, "users_inserted": 0, "users_updated": 0,
+        "responses": 0, "responses_inserted": 0, "responses_updated": 0,
+        "copy_seconds": 0.0, "merge_seconds": 0.0,
+    }
+    started = time.monotonic()
+    for chunk in _chunks(users, batch_size):
+        load_batch(chunk, None, stats)
+        stats["users"] += len(chunk)
+        log(f"  users: {stats['users']} loaded")
+    for chunk in _chunks(responses, batch_size):
+        load_batch(None, chunk, stats)
+        stats["responses"] += len(chunk)
+        elapsed = time.monotonic() - started
+        log(f"  responses: {stats['responses']} loaded ({stats['responses'] / elapsed:.0f}/s)")
+    stats["seconds"] = time.monotonic() - started
+    return stats
@@ -0,0 +1,390 @@
+# bulk_scoring.py
+import csv
+import itertools
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import JSONB
+
+from models import db, User, Response
+from question_bank import LEVEL_TABLES, MATURITY_FLOOR, MATURITY_THRESHOLDS
+from score_summary import record_responses
+
+# ===============================
+# Bulk questionnaire scoring
+# ===============================
+# Scores batches of offline assessments (CSV or JSONL, one MSME per row,
+# answers keyed by questionnaire.json question id) with the same math as
+# questionnaire_level. The batch is held column by column; per level the
+# answers become a rows x questions matrix of selected scores and every
+# total is computed over all rows at once. Results are saved as Response
+# rows in bulk.
+
+INSERT_CHUNK = 5000
+RESULT_FIELDS = [
+    "row", "email", "level", "attempt_number", "score", "score_min", "score_max",
+    "percent_of_level", "maturity_level", "fulfilled_attributes", "total_attributes",
+]
+
+
+class BatchError(ValueError):
+    pass
+
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+
+def _aliases(table):
+    """Per question: option key or label (any language, case-insensitive) -> option key."""
+    aliases = []
+    for q in table.questions:
+        names = {}
+        for key, opt in q.get("options", {}).items():
+            names[_normalize(key)] = key
+            if isinstance(opt, dict):
+                for lang, label in opt.items():
+                    if lang != "score" and label:
+                        names.setdefault(_normalize(label), key)
+        aliases.append(names)
+    return aliases
+
+
+ALIASES = {level: _aliases(table) for level, table in LEVEL_TABLES.items()}
+
+
+# ===============================
+# Input
+# ===============================
+def read_columns(f, fmt):
+    """
+    The batch in an open text file ("csv" or "jsonl") as {column: [value
+    per record]}. JSONL lines are flat objects or {"email": .., "answers":
+    {"1": "aware", ..}}.
+    """
+    if fmt == "csv":
+        rows = list(csv.reader(f))
+        if not rows:
+            return {}
+        header, rows = [name.strip() for name in rows[0]], rows[1:]
+        # Short rows are padded so every column has one value per record
+        width = len(header)
+        rows = [row if len(row) == width else (row + [""] * width)[:width] for row in rows]
+        columns = list(zip(*rows)) if rows else [()] * width
+        return {name: list(values) for name, values in zip(header, columns)}
+
+    if fmt == "jsonl":
+        records = []
+        for n, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise BatchError(f"line {n}: {e}")
+            record.update(record.pop("answers", None) or {})
+            records.append(record)
+        names = dict.fromkeys(name for record in records for name in record)
+        return {str(name): [record.get(name) for record in records] for name in names}
+
+    raise BatchError(f"Unknown format {fmt!r} (use csv or jsonl).")
+
+
+def _batch_size(columns):
+    return len(next(iter(columns.values()), []))
+
+
+def _factorize(values):
+    """(distinct values, per record the index of its value)."""
+    index = {value: i for i, value in enumerate(dict.fromkeys(values))}
+    return list(index), np.fromiter(map(index.__getitem__, values), dtype=np.intp, count=len(values))
+
+
+def _answers(columns, qid, size):
+    """A question's answers, from a "<id>" and/or "q_<id>" column."""
+    plain, prefixed = columns.get(str(qid)), columns.get(f"q_{qid}")
+    if plain is None or prefixed is None:
+        return plain or prefixed or [""] * size
+    return [a or b for a, b in zip(plain, prefixed)]
+
+
+# ===============================
+# Vectorized scoring
+# ===============================
+def score_level_batch(level, columns):
+    """
+    Score every record that answers at least one question of this level.
+    Returns (record indexes, results, unknown answers as (record index,
+    question id, value)). results["codes"][j, i] indexes the choice made
+    for question i in results["choices"][i]: (option key, score).
+    """
+    table = LEVEL_TABLES[level]
+    aliases = ALIASES[level]
+    size = _batch_size(columns)
+    shape = (size, len(table.question_ids))
+    selected = np.zeros(shape)
+    answered = np.zeros(shape, dtype=bool)
+    key_codes = np.zeros(shape, dtype=np.intp)
+    choices = []
+    unknown_codes = []
+    for i, qid in enumerate(table.question_ids):
+        # Look up each distinct answer once, then broadcast back to the records
+        uniques, codes = _factorize(_answers(columns, qid, size))
+        given = [str(u).strip() if u is not None else "" for u in uniques]
+        keys = [aliases[i].get(_normalize(u), "") for u in given]
+        scores = [table.option_scores[i].get(k, 0.0) for k in keys]
+        selected[:, i] = np.array(scores)[codes]
+        answered[:, i] = np.array([bool(u) for u in given], dtype=bool)[codes]
+        key_codes[:, i] = codes
+        # Unknown answers are kept as given and score 0, like a form post
+        choices.append([(k or u, score) for k, u, score in zip(keys, given, scores)])
+        unknown_codes.append([code for code, (k, u) in enumerate(zip(keys, given)) if u and not k])
+
+    wanted = np.ones(size, dtype=bool)
+    if "level" in columns:
+        wanted = np.array([str(v or "").strip() in ("", str(level)) for v in columns["level"]], dtype=bool)
+    rows = np.flatnonzero(wanted & answered.any(axis=1))
+    selected, key_codes = selected[rows], key_codes[rows]
+
+    unknown = []
+    for i, qid in enumerate(table.question_ids):
+        for code in unknown_codes[i]:
+            unknown.extend((int(rows[j]), qid, choices[i][code][0]) for j in np.flatnonzero(key_codes[:, i] == code))
+
+    # Summed question by question, as questionnaire_level does, so every
+    # total is bit-for-bit the same as a form submission's
+    score_total = np.zeros(len(rows))
+    parameter_scores = {p: np.zeros(len(rows)) for p in table.parameter_min}
+    for i, parameter in enumerate(table.parameters):
+        score_total += selected[:, i]
+        parameter_scores[parameter] += selected[:, i]
+
+    percent = score_total / table.score_max * 100 if table.score_max > 0 else np.zeros(len(rows))
+    maturity = np.select(
+        [percent >= threshold for threshold, _ in MATURITY_THRESHOLDS],
+        [maturity_level for _, maturity_level in MATURITY_THRESHOLDS],
+        default=MATURITY_FLOOR,
+    )
+
+    return rows.tolist(), {
+        "codes": key_codes,
+        "choices": choices,
+        "score_total": score_total.tolist(),
+        "parameter_scores": {p: a.tolist() for p, a in parameter_scores.items()},
+        "percent_of_level": percent.tolist(),
+        "maturity_level": maturity.tolist(),
+        "fulfilled_attributes": (selected > 0).sum(axis=1).tolist(),
+    }, unknown
+
+
+class DetailsWriter:
+    """
+    Serializes the Response.details JSON questionnaire_level would store.
+    The per-question parts (text, options, chosen key and score) are the
+    same for every row that made that choice, so each is encoded once and
+    rows are assembled from the encoded fragments.
+    """
+
+    def __init__(self, table, result, submitted_at):
+        self.table = table
+        self.result = result
+        self.submitted_at = json.dumps(submitted_at)
+        self.fragments = [
+            [
+                json.dumps({
+                    "id": qid,
+                    "text": q.get("text"),
+                    "selected": key,
+                    "selected_score": score,
+                    "options": q.get("options", {})
+                }, ensure_ascii=False)
+                for key, score in choices
+            ]
+            for qid, q, choices in zip(table.question_ids, table.questions, result["choices"])
+        ]
+
+    def row(self, j):
+        table, result = self.table, self.result
+        questions = {p: [] for p in table.parameter_min}
+        for fragments, parameter, code in zip(self.fragments, table.parameters, result["codes"][j].tolist()):
+            questions[parameter].append(fragments[code])
+        groups = ", ".join(
+            f'{json.dumps(p)}: {{"total": {len(questions[p])}, "score": {result["parameter_scores"][p][j]!r}, '
+            f'"min": {table.parameter_min[p]!r}, "max": {table.parameter_max[p]!r}, '
+            f'"questions": [{", ".join(questions[p])}]}}'
+            for p in table.parameter_min
+        )
+        return (
+            f'{{"_summary": {{"level": {table.level}, "score_total": {result["score_total"][j]!r}, '
+            f'"score_min": {table.score_min!r}, "score_max": {table.score_max!r}, '
+            f'"percent_of_level": {result["percent_of_level"][j]!r}, '
+            f'"fulfilled_attributes": {result["fulfilled_attributes"][j]}, '
+            f'"total_attributes": {len(table.question_ids)}, '
+            f'"parameter_summary": {{{groups}}}, "submitted_at": {self.submitted_at}}}}}'
+        )
+
+
+# ===============================
+# Users and attempts
+# ===============================
+def _chunks(items, size):
+    """Lists of up to size items, taken from items as they are produced."""
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def resolve_users(names, create_users=False):
+    """
+    email -> user id for every email in names (email -> display name);
+    missing users are created or reported.
+    """
+    user_ids = {}
+    for chunk in _chunks(names, 1000):
+        user_ids.update(db.session.execute(
+            db.select(User.email, User.id).filter(User.email.in_(chunk))
+        ).all())
+
+    missing = sorted(set(names) - set(user_ids))
+    if missing and not create_users:
+        raise BatchError(f"{len(missing)} unknown email(s), e.g. {missing[0]} (use create_users to add them).")
+    users = User.__table__
+    for chunk in _chunks(missing, INSERT_CHUNK):
+        user_ids.update(db.session.execute(
+            db.insert(users).returning(users.c.email, users.c.id, sort_by_parameter_order=True),
+            [{"email": email, "name": names[email] or email.split("@")[0]} for email in chunk]
+        ).all())
+    return user_ids
+
+
+def latest_attempts(user_ids):
+    """user id -> highest attempt number on record."""
+    latest = {}
+    for chunk in _chunks(user_ids, 1000):
+        latest.update(db.session.execute(
+            db.select(Response.user_id, db.func.max(Response.attempt_number))
+            .filter(Response.user_id.in_(chunk))
+            .group_by(Response.user_id)
+        ).all())
+    return latest
+
+
+def _attempt_numbers(columns, emails, user_ids):
+    """Per record its attempt; records without attempt_number start the user's next attempt."""
+    latest = latest_attempts(set(user_ids.values()))
+    given = columns.get("attempt_number") or [""] * len(emails)
+    attempts = []
+    for n, (email, value) in enumerate(zip(emails, given), start=1):
+        user_id = user_ids[email]
+        value = str(value or "").strip()
+        if value and not value.isdigit():
+            raise BatchError(f"record {n}: attempt_number {value!r} is not a number.")
+        attempt = int(value) if value else (latest.get(user_id) or 0) + 1
+        latest[user_id] = max(latest.get(user_id) or 0, attempt)
+        attempts.append(attempt)
+    return attempts
+
+
+# ===============================
+# Batch
+# ===============================
+def score_batch(columns, create_users=False, dry_run=False, log=print):
+    """
+    Score and save a batch read by read_columns. Every record needs an
+    "email"; "name", "attempt_number" and "level" are optional (default: a
+    new attempt per record, every level with at least one answer). Returns
+    {"records": n, "results": [..], "unknown_answers": [..], "responses":
+    n, "seconds": t}.
+    """
+    started = time.monotonic()
+    size = _batch_size(columns)
+    emails = [str(e or "").strip().lower() for e in columns.get("email") or [""] * size]
+    if "" in emails:
+        raise BatchError(f"record {emails.index('') + 1} has no email.")
+    names = dict(zip(emails, [str(n or "").strip() for n in columns.get("name") or [""] * size]))
+
+    user_ids = resolve_users(names, create_users=create_users)
+    attempts = _attempt_numbers(columns, emails, user_ids)
+
+    submitted_at = datetime.utcnow().isoformat() + "Z"
+    results, unknown = [], []
+
+    def scored():
+        """Score level by level, yielding each response's row to insert (none on a dry run)."""
+        for level, table in LEVEL_TABLES.items():
+            rows, result, level_unknown = score_level_batch(level, columns)
+            unknown.extend(level_unknown)
+            writer = DetailsWriter(table, result, submitted_at)
+            for j, row in enumerate(rows):
+                results.append({
+                    "row": row + 1,
+                    "email": emails[row],
+                    "level": level,
+                    "attempt_number": attempts[row],
+                    "score": result["score_total"][j],
+                    "score_min": table.score_min,
+                    "score_max": table.score_max,
+                    "percent_of_level": result["percent_of_level"][j],
+                    "maturity_level": result["maturity_level"][j],
+                    "fulfilled_attributes": result["fulfilled_attributes"][j],
+                    "total_attributes": len(table.question_ids),
+                })
+                if not dry_run:
+                    yield {
+                        "user_id": user_ids[emails[row]],
+                        "level": level,
+                        "score": result["score_total"][j],
+                        "maturity_level": result["maturity_level"][j],
+                        "details_json": writer.row(j),
+                        "attempt_number": attempts[row],
+                    }
+
+    # details arrive pre-serialized (DetailsWriter); PostgreSQL casts the
+    # text to JSONB server-side, other databases store the JSON text as is
+    responses = Response.__table__
+    details = db.bindparam("details_json", type_=db.Text)
+    if db.engine.dialect.name == "postgresql":
+        details = db.cast(details, JSONB)
+    stmt = (
+        db.insert(responses)
+        .values(details=details)
+        .returning(responses.c.id, sort_by_parameter_order=True)
+    )
+    # Each chunk is written as soon as it is scored, so only one chunk's
+    # details JSON is held at a time
+    saved = []
+    for chunk in _chunks(scored(), INSERT_CHUNK):
+        ids = db.session.execute(stmt, chunk).scalars().all()
+        saved.extend(
+            {"id": response_id, "user_id": row["user_id"], "level": row["level"], "score": row["score"],
+             "attempt_number": row["attempt_number"], "score_max": LEVEL_TABLES[row["level"]].score_max}
+            for row, response_id in zip(chunk, ids)
+        )
+    log(f"Scored {size} record(s) into {len(results)} level response(s) "
+        f"in {time.monotonic() - started:.2f}s.")
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        record_responses(saved)
+        db.session.commit()
+
+    results.sort(key=lambda r: (r["row"], r["level"]))
+    return {
+        "records": size,
+        "results": results,
+        "unknown_answers": unknown,
+        "responses": len(results),
+        "seconds": time.monotonic() - started,
+    }
+
+
+def write_results(f, results):
+    writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+    writer.writeheader()
+    writer.writerows(results)
@@ -1,13 +1,13 @@
 import os
+import json
 from dotenv import load_dotenv
-from openai import OpenAI
+from engine_registry import register_engine, generate
 
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# News goes straight to OpenAI rather than through the AI Pipe proxy
+NEWS_BASE_URL = os.getenv("NEWS_BASE_URL", "https://api.openai.com/v1")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-def get_carbon_news_llm():
+def build_request():
     prompt = """
     Provide a list of 5 recent news articles related to 'carbon footprint' or 'Green India'.
     For each article, give:
@@ -18,7 +18,7 @@ def get_carbon_news_llm():
     Format the output as a JSON list of objects.
     """
     
-    response = client.chat.completions.create(
+    return dict(
         model="gpt-5-mini",
         messages=[
             {"role": "system", "content": "You are a helpful assistant that provides news summaries."},
@@ -26,12 +26,15 @@ def get_carbon_news_llm():
         ],
         max_tokens=500
     )
-    
+
+# News should be fresh, so it is never cached
+register_engine("carbon_news", build_request, timeout=30, base_url=NEWS_BASE_URL, cacheable=False)
+
+def get_carbon_news_llm():
     # Extract the LLM output
-    content = response.choices[0].message.content
+    content = generate("carbon_news")
     
     # Try to parse JSON if the model returns JSON
-    import json
     try:
         news_list = json.loads(content)
     except json.JSONDecodeError:
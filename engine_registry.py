@@ -0,0 +1,366 @@
+# engine_registry.py
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import httpx
+import openai
+from dotenv import load_dotenv
+from flask import current_app, has_app_context
+from openai import OpenAI
+
+import metrics
+import profiling
+import single_flight
+import suggestion_cache
+
+load_dotenv()
+
+# ===============================
+# Shared client configuration
+# ===============================
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+CUSTOM_BASE_URL = os.getenv("CUSTOM_BASE_URL", "https://aipipe.org/openai/v1")
+# Send every engine, whatever its base_url, to fake_llm_server.py (load tests)
+LLM_FAKE_URL = os.getenv("LLM_FAKE_URL")
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))  # seconds
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+LLM_FANOUT_WORKERS = int(os.getenv("LLM_FANOUT_WORKERS", 16))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))  # consecutive failures
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))  # seconds
+
+# Errors worth another attempt; anything else (bad request, auth) is final
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class EngineBusy(Exception):
+    """Raised when an engine has no free concurrency slot within its timeout."""
+
+
+class CircuitOpen(Exception):
+    """Raised without calling the upstream while its circuit breaker is open."""
+
+
+# One keep-alive connection pool for every engine in this process
+_http_client = None
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url=None):
+    """
+    Return the OpenAI client for base_url (default CUSTOM_BASE_URL).
+    All clients share one pooled httpx.Client; retries are done here,
+    not inside the SDK, so they are bounded and jittered in one place.
+    """
+    global _http_client
+    base_url = base_url or CUSTOM_BASE_URL
+    with _clients_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(60, connect=LLM_CONNECT_TIMEOUT),
+            )
+        if base_url not in _clients:
+            _clients[base_url] = OpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=base_url,
+                http_client=_http_client,
+                max_retries=0,
+            )
+        return _clients[base_url]
+
+
+# ===============================
+# Circuit breaker (one per upstream base URL)
+# ===============================
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _breaker(base_url):
+    base_url = base_url or CUSTOM_BASE_URL
+    with _breakers_lock:
+        return _breakers.setdefault(base_url, {"failures": 0, "opened_at": None})
+
+
+def breaker_open(name):
+    """True while the engine's upstream is considered down."""
+    breaker = _breaker(ENGINES[name]["base_url"])
+    opened_at = breaker["opened_at"]
+    return opened_at is not None and time.monotonic() - opened_at < LLM_BREAKER_COOLDOWN
+
+
+def _before_call(engine):
+    breaker = _breaker(engine["base_url"])
+    with _breakers_lock:
+        opened_at = breaker["opened_at"]
+        if opened_at is None:
+            return
+        if time.monotonic() - opened_at < LLM_BREAKER_COOLDOWN:
+            raise CircuitOpen(f"{engine['name']}: upstream circuit open")
+        # Half-open: let this call through as a probe, keep others out
+        # for another cooldown period until it reports back.
+        breaker["opened_at"] = time.monotonic()
+
+
+def _after_call(engine, ok):
+    breaker = _breaker(engine["base_url"])
+    with _breakers_lock:
+        if ok:
+            breaker["failures"] = 0
+            breaker["opened_at"] = None
+            return
+        breaker["failures"] += 1
+        if breaker["failures"] >= LLM_BREAKER_THRESHOLD:
+            breaker["opened_at"] = time.monotonic()
+
+
+# ===============================
+# Registry
+# ===============================
+ENGINES = {}
+
+
+def register_engine(name, build_request, prompt_version="1", timeout=30.0,
+                    max_concurrency=4, base_url=None, cacheable=True):
+    """
+    Register a prompt definition.
+
+    build_request(*args) returns the chat.completions.create keyword
+    arguments (model, messages, temperature, ...). timeout is per upstream
+    call, max_concurrency caps parallel calls to this engine per process.
+    """
+    ENGINES[name] = {
+        "name": name,
+        "build_request": build_request,
+        "prompt_version": prompt_version,
+        "timeout": timeout,
+        "max_concurrency": max_concurrency,
+        "slots": threading.BoundedSemaphore(max_concurrency),
+        "base_url": LLM_FAKE_URL or base_url,
+        "cacheable": cacheable,
+    }
+    return ENGINES[name]
+
+
+def cache_key(name, *args):
+    engine = ENGINES[name]
+    return suggestion_cache.make_key(name, engine["prompt_version"], *args)
+
+
+def _backoff(attempt):
+    # "Full jitter": spread retries from many workers over the whole window
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+@contextmanager
+def _slot(engine):
+    """Hold one of the engine's concurrency slots, or fail fast with EngineBusy."""
+    if not engine["slots"].acquire(timeout=engine["timeout"]):
+        metrics.inc("llm_errors_total", engine=engine["name"], route=metrics.current_route(), error="EngineBusy")
+        raise EngineBusy(f"{engine['name']}: no free slot within {engine['timeout']}s")
+    try:
+        yield
+    finally:
+        engine["slots"].release()
+
+
+def _create(engine, request):
+    """
+    chat.completions.create with the engine's timeout, bounded jittered
+    retries and the upstream's circuit breaker. Records retries and errors
+    in metrics, plus latency and token usage of a complete response;
+    _stream records those for a stream, which this returns unread.
+    """
+    labels = {"engine": engine["name"], "route": metrics.current_route()}
+    started = time.monotonic()
+    try:
+        _before_call(engine)
+        client = get_client(engine["base_url"])
+        attempt = 0
+        while True:
+            try:
+                response = client.chat.completions.create(timeout=engine["timeout"], **request)
+                _after_call(engine, ok=True)
+                break
+            except RETRYABLE_ERRORS:
+                if attempt >= LLM_MAX_RETRIES:
+                    _after_call(engine, ok=False)
+                    raise
+                metrics.inc("llm_retries_total", **labels)
+                time.sleep(_backoff(attempt))
+                attempt += 1
+    except Exception as e:
+        metrics.inc("llm_errors_total", error=type(e).__name__, **labels)
+        raise
+
+    if not request.get("stream"):
+        metrics.observe("llm_request_duration_seconds", time.monotonic() - started, **labels)
+        profiling.add("llm", time.monotonic() - started)
+        metrics.inc("llm_requests_total", **labels)
+        metrics.record_usage(getattr(response, "usage", None), **labels)
+    return response
+
+
+def cached(name, *args):
+    """Cache lookup for an engine's reply, counted as a hit or miss."""
+    value = suggestion_cache.get(cache_key(name, *args))
+    metrics.inc(
+        "suggestion_cache_requests_total",
+        engine=name, route=metrics.current_route(), result="miss" if value is None else "hit"
+    )
+    return value
+
+
+def complete(name, *args):
+    """Call the engine upstream (no cache) and return the reply text."""
+    engine = ENGINES[name]
+    with _slot(engine):
+        response = _create(engine, engine["build_request"](*args))
+    return response.choices[0].message.content.strip()
+
+
+def generate(name, *args):
+    """Return the engine's reply for args, served from the cache when possible."""
+    engine = ENGINES[name]
+    if not engine["cacheable"]:
+        return complete(name, *args)
+
+    key = cache_key(name, *args)
+    value = cached(name, *args)
+    if value is not None:
+        return value
+    # Identical concurrent requests share one upstream call
+    return single_flight.do(key, lambda: _fill(engine, key, args))
+
+
+def _fill(engine, key, args):
+    with single_flight.process_lock(key, timeout=engine["timeout"]):
+        # Another worker may have filled the cache while we waited for the lock
+        value = suggestion_cache.get(key)
+        if value is None:
+            value = complete(engine["name"], *args)
+            suggestion_cache.put(key, value, engine=engine["name"])
+    return value
+
+
+def stream(name, *args):
+    """
+    Yield the engine's reply in chunks as the model produces them.
+    A cached reply is yielded in one piece; a fresh one is cached once complete.
+    """
+    engine = ENGINES[name]
+    if not engine["cacheable"]:
+        yield from _stream(engine, args)
+        return
+
+    value = cached(name, *args)
+    if value is not None:
+        yield value
+        return
+    # Identical concurrent requests share one upstream stream: followers
+    # get the leader's chunks as they arrive
+    key = cache_key(name, *args)
+    yield from single_flight.stream(key, lambda: _fill_stream(engine, key, args), timeout=engine["timeout"])
+
+
+def _fill_stream(engine, key, args):
+    with single_flight.process_lock(key, timeout=engine["timeout"]):
+        # Another worker may have filled the cache while we waited for the lock
+        value = suggestion_cache.get(key)
+        if value is not None:
+            yield value
+            return
+        parts = []
+        for chunk in _stream(engine, args):
+            parts.append(chunk)
+            yield chunk
+        text = "".join(parts).strip()
+        if text:
+            suggestion_cache.put(key, text, engine=engine["name"])
+
+
+def _stream(engine, args):
+    """
+    Stream one reply from the upstream (no cache). Records the time to the
+    first text and, once the stream ends, its whole duration.
+    """
+    name = engine["name"]
+    # include_usage adds a final chunk carrying response.usage
+    request = dict(engine["build_request"](*args), stream=True, stream_options={"include_usage": True})
+    labels = {"engine": name, "route": metrics.current_route()}
+    started = time.monotonic()
+    first = True
+    with _slot(engine):
+        for chunk in _create(engine, request):
+            metrics.record_usage(getattr(chunk, "usage", None), **labels)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first:
+                    metrics.observe("llm_stream_first_token_seconds", time.monotonic() - started, **labels)
+                    first = False
+                yield delta
+    metrics.observe("llm_request_duration_seconds", time.monotonic() - started, **labels)
+    metrics.inc("llm_requests_total", **labels)
+    profiling.add("llm", time.monotonic() - started)
+
+
+# ===============================
+# Parallel fan-out
+# ===============================
+_fanout_pool = ThreadPoolExecutor(max_workers=LLM_FANOUT_WORKERS, thread_name_prefix="llm-fanout")
+
+
+def generate_many(jobs, timeout):
+    """
+    Run several generate() calls at once.
+
+    jobs maps a section name to (engine name, args). Waits at most timeout
+    seconds overall and returns (results, errors): a section that failed or
+    did not finish in time is None in results and has its exception in
+    errors, so the caller can degrade just that section.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+    route = metrics.current_route()
+    profile = profiling.current()
+
+    def run(name, args):
+        with metrics.route(route), profiling.bound(profile):
+            if app is None:
+                return generate(name, *args)
+            with app.app_context():
+                return generate(name, *args)
+
+    futures = {
+        section: _fanout_pool.submit(run, name, args)
+        for section, (name, args) in jobs.items()
+    }
+    deadline = time.monotonic() + timeout
+    results, errors = {}, {}
+    for section, future in futures.items():
+        try:
+            results[section] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except Exception as e:
+            results[section] = None
+            errors[section] = e
+    return results, errors
@@ -0,0 +1,185 @@
+# export.py
+import csv
+import io
+from datetime import datetime
+
+from models import db, User, Response
+from question_bank import LEVEL_TABLES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export needs pyarrow; CSV works without it
+    pa = pq = None
+
+# ===============================
+# Streaming data export
+# ===============================
+# Users LEFT JOINed with their responses, one row per response (users with
+# none get one row of empty response columns), including the flattened
+# details._summary. Values are pulled out of the JSON by the database and
+# rows are read through a server-side cursor in batches, so memory stays
+# flat however big the tables are.
+
+BATCH_SIZE = 2000
+
+_details = Response.__table__.c.details
+
+
+def _summary(*path):
+    return _details[("_summary",) + path].as_string()
+
+
+def _question(level, parameter, index, field):
+    # score_level appends questions to their parameter group in question
+    # order, so the position is known; other levels' rows read NULL
+    path = _details[("_summary", "parameter_summary", str(parameter), "questions", index, field)]
+    return db.case((Response.level == level, path.as_string()), else_=None)
+
+
+# name -> (SQL expression, type: "int" | "float" | "str" | "bool" | "datetime")
+COLUMNS = {
+    "user_id": (User.id, "int"),
+    "email": (User.email, "str"),
+    "name": (User.name, "str"),
+    "language": (User.language, "str"),
+    "registered_at": (User.created_at, "datetime"),
+    "onboard_complete": (User.onboard_complete, "bool"),
+    "organization": (User.step1, "str"),
+    "industry_type": (User.step2, "str"),
+    "employees": (User.step3, "int"),
+    "main_fuel_type": (User.step4, "str"),
+    "primary_concern": (User.step5, "str"),
+    "response_id": (Response.id, "int"),
+    "level": (Response.level, "int"),
+    "attempt_number": (Response.attempt_number, "int"),
+    "score": (Response.score, "float"),
+    "maturity_level": (Response.maturity_level, "int"),
+    "submitted_at": (Response.created_at, "datetime"),
+    "score_min": (db.cast(_summary("score_min"), db.Float), "float"),
+    "score_max": (db.cast(_summary("score_max"), db.Float), "float"),
+    "percent_of_level": (db.cast(_summary("percent_of_level"), db.Float), "float"),
+    "fulfilled_attributes": (db.cast(_summary("fulfilled_attributes"), db.Integer), "int"),
+    "total_attributes": (db.cast(_summary("total_attributes"), db.Integer), "int"),
+}
+
+# parameter_summary, flattened: one score/min/max column per parameter group
+for _parameter in dict.fromkeys(p for table in LEVEL_TABLES.values() for p in table.parameters):
+    _slug = str(_parameter).lower().replace(" ", "_")
+    for _field in ("score", "min", "max"):
+        COLUMNS[f"param_{_slug}_{_field}"] = (
+            db.cast(_summary("parameter_summary", str(_parameter), _field), db.Float), "float"
+        )
+
+# ...and the chosen option and its score for every question
+for _level, _table in LEVEL_TABLES.items():
+    _positions = {}
+    for _qid, _parameter in zip(_table.question_ids, _table.parameters):
+        _index = _positions[_parameter] = _positions.get(_parameter, -1) + 1
+        COLUMNS[f"q_{_qid}"] = (_question(_level, _parameter, _index, "selected"), "str")
+        COLUMNS[f"q_{_qid}_score"] = (
+            db.cast(_question(_level, _parameter, _index, "selected_score"), db.Float), "float"
+        )
+
+DEFAULT_COLUMNS = [name for name in COLUMNS if not name.startswith(("q_", "param_"))]
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def parse_columns(value):
+    """Comma-separated column names -> list (default columns when blank); ValueError on unknown names."""
+    names = [name.strip() for name in (value or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    return names or DEFAULT_COLUMNS
+
+
+def export_query(columns):
+    """Only the requested columns are selected, so JSON paths not asked for cost nothing."""
+    return (
+        db.select(*[COLUMNS[name][0].label(name) for name in columns])
+        .select_from(User)
+        .outerjoin(Response, Response.user_id == User.id)
+        .order_by(User.id, Response.id)
+    )
+
+
+def iter_batches(engine, columns, batch_size=BATCH_SIZE):
+    """Lists of row tuples, batch_size at a time, from a server-side cursor."""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+            export_query(columns)
+        )
+        for partition in result.partitions():
+            yield partition
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(engine, columns, batch_size=BATCH_SIZE):
+    """CSV text, one chunk per batch."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for batch in iter_batches(engine, columns, batch_size):
+        writer.writerows([_csv_value(v) for v in row] for row in batch)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+
+class _ByteSink:
+    """Write-only file object that hands back whatever was written since the last drain()."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+ARROW_TYPES = {"int": "int64", "float": "float64", "str": "string", "bool": "bool_"}
+
+
+def stream_parquet(engine, columns, batch_size=BATCH_SIZE):
+    """Parquet bytes, one row group per batch."""
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow).")
+    schema = pa.schema([
+        (name, pa.timestamp("us") if COLUMNS[name][1] == "datetime" else getattr(pa, ARROW_TYPES[COLUMNS[name][1]])())
+        for name in columns
+    ])
+    sink = _ByteSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in iter_batches(engine, columns, batch_size):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,243 @@
+# fake_llm_server.py
+"""
+Stand-in for the OpenAI chat.completions API, for offline load tests.
+
+    python fake_llm_server.py --port 8765 --latency lognormal:1.5,0.5 --error-rate 0.02
+    LLM_FAKE_URL=http://127.0.0.1:8765/v1 flask run
+
+Replies come from a replay file of recorded responses (keyed by a hash of
+model + messages) or are synthesised deterministically from that hash.
+With --record, misses are forwarded to a real upstream and appended to the
+replay file, so a later offline run answers the same prompts identically.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
+
+load_dotenv()
+
+STREAM_TOKEN_DELAY = 0.01  # seconds between streamed chunks
+ERROR_MESSAGES = {
+    429: "Rate limit reached (injected by fake_llm_server).",
+    500: "Internal server error (injected by fake_llm_server).",
+    503: "Service unavailable (injected by fake_llm_server).",
+}
+
+
+# ===============================
+# Latency distributions
+# ===============================
+def parse_latency(spec):
+    """
+    Return a sampler for a latency spec, in seconds:
+    "fixed:0.5", "uniform:0.2,1.5", "normal:1.0,0.3" (mean, sd) or
+    "lognormal:1.5,0.5" (median, sigma of the log).
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+
+def prompt_hash(body):
+    """Replay key: the model and messages, independent of sampling settings."""
+    payload = {"model": body.get("model"), "messages": body.get("messages")}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _count_tokens(text):
+    # Rough stand-in for a tokenizer: about 4 characters per token
+    return max(1, len(text) // 4)
+
+
+def _synthesise(key, body):
+    """Deterministic Markdown reply, sized by max_tokens."""
+    rng = random.Random(key)
+    topics = ["energy audit", "LED retrofit", "solar rooftop", "fuel switching", "waste heat recovery",
+              "employee training", "emissions tracking", "supplier engagement", "water reuse", "green financing"]
+    lines = ["## Recommendations", ""]
+    budget = int(body.get("max_tokens") or body.get("max_completion_tokens") or 300)
+    while _count_tokens("\n".join(lines)) < budget * 0.8:
+        topic = rng.choice(topics)
+        lines.append(f"{len(lines) - 1}. **{topic.title()}**: start a {topic} pilot this quarter "
+                     f"and review the savings after {rng.randint(2, 12)} months.")
+    return "\n".join(lines)
+
+
+# ===============================
+# Server
+# ===============================
+def create_app(latency="fixed:0.05", error_rate=0.0, error_codes=(429, 500, 503), replay_path=None,
+               record=False, upstream_url=None, api_key=None, seed=None, token_delay=STREAM_TOKEN_DELAY):
+    app = Flask(__name__)
+    sample_latency = parse_latency(latency)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    replay = {}
+    replay_lock = threading.Lock()
+    stats = {"requests": 0, "replayed": 0, "recorded": 0, "synthesised": 0, "errors": 0}
+    stats_lock = threading.Lock()
+
+    if replay_path and os.path.exists(replay_path):
+        with open(replay_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    replay[entry["hash"]] = entry
+
+    def count(name):
+        with stats_lock:
+            stats[name] += 1
+
+    def draw():
+        with rng_lock:
+            return sample_latency(rng), rng.random() < error_rate, rng.choice(error_codes)
+
+    def forward(body):
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key, base_url=upstream_url)
+        response = client.chat.completions.create(**dict(body, stream=False))
+        usage = response.usage
+        return response.choices[0].message.content, {
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": usage.completion_tokens if usage else 0,
+        }
+
+    def reply_for(body):
+        key = prompt_hash(body)
+        with replay_lock:
+            entry = replay.get(key)
+        if entry is not None:
+            count("replayed")
+            return entry["content"], entry.get("usage")
+
+        if record and upstream_url:
+            content, usage = forward(body)
+            entry = {"hash": key, "model": body.get("model"), "content": content, "usage": usage}
+            with replay_lock:
+                replay[key] = entry
+                with open(replay_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            count("recorded")
+            return content, usage
+
+        count("synthesised")
+        return _synthesise(key, body), None
+
+    @app.post("/v1/chat/completions")
+    def chat_completions():
+        body = request.get_json(force=True)
+        count("requests")
+        delay, fail, code = draw()
+
+        if fail:
+            count("errors")
+            time.sleep(delay / 2)
+            return jsonify({"error": {"message": ERROR_MESSAGES.get(code, "Injected error."),
+                                      "type": "fake_error", "code": code}}), code
+
+        content, usage = reply_for(body)
+        prompt_text = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        usage = dict(usage or {"prompt_tokens": _count_tokens(prompt_text), "completion_tokens": _count_tokens(content)})
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = body.get("model", "fake-model")
+        created = int(time.time())
+
+        if not body.get("stream"):
+            time.sleep(delay)
+            return jsonify({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        def chunk(delta, finish_reason=None, chunk_usage=None):
+            data = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            if chunk_usage:
+                data["usage"] = chunk_usage
+            return f"data: {json.dumps(data)}\n\n"
+
+        def events():
+            # The sampled latency is the time to first token
+            time.sleep(delay)
+            yield chunk({"role": "assistant", "content": ""})
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                yield chunk({"content": word if i == len(words) - 1 else word + " "})
+                time.sleep(token_delay)
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk(None, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return Response(events(), mimetype="text/event-stream")
+
+    @app.get("/v1/models")
+    def models():
+        return jsonify({"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "fake"}]})
+
+    @app.get("/stats")
+    def server_stats():
+        with stats_lock:
+            return jsonify(stats)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat.completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("FAKE_LLM_PORT", 8765)))
+    parser.add_argument("--latency", default=os.getenv("FAKE_LLM_LATENCY", "fixed:0.05"),
+                        help="fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--token-delay", type=float, default=STREAM_TOKEN_DELAY,
+                        help="Seconds between streamed chunks.")
+    parser.add_argument("--error-rate", type=float, default=float(os.getenv("FAKE_LLM_ERROR_RATE", 0)))
+    parser.add_argument("--error-codes", default="429,500,503", help="Comma-separated HTTP codes to inject.")
+    parser.add_argument("--replay", dest="replay_path", default=os.getenv("FAKE_LLM_REPLAY"),
+                        help="JSONL file of recorded responses keyed by prompt hash.")
+    parser.add_argument("--record", action="store_true",
+                        help="Forward replay misses to --upstream and append them to --replay.")
+    parser.add_argument("--upstream", default=os.getenv("FAKE_LLM_UPSTREAM", "https://aipipe.org/openai/v1"),
+                        help="Real API used by --record.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible latency and errors.")
+    args = parser.parse_args()
+
+    if args.record and not args.replay_path:
+        parser.error("--record needs --replay")
+
+    app = create_app(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_codes=tuple(int(c) for c in args.error_codes.split(",") if c),
+        replay_path=args.replay_path,
+        record=args.record,
+        upstream_url=args.upstream,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        seed=args.seed,
+        token_delay=args.token_delay,
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# fallback_engine.py
+import json
+import os
+
+from question_bank import QUESTION_MAX_SCORES, option_score
+
+# ===============================
+# Deterministic, local suggestions
+# ===============================
+# Served when the LLM is slow, failing or its circuit breaker is open.
+# Built only from the stored "_summary" of a response and the curated
+# snippets in suggestion_snippets.json (keyed by questionnaire.json ids).
+
+SNIPPETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "suggestion_snippets.json")
+
+with open(SNIPPETS_PATH, "r", encoding="utf-8") as f:
+    SNIPPETS = json.load(f)
+
+FALLBACK_NOTE = "*Quick recommendations based on your answers while your detailed AI recommendations are being prepared.*"
+
+MATURITY_ADVICE = [
+    (25, "Start with awareness and measurement: brief the team, collect a year of energy and fuel bills, and pick one quick win."),
+    (50, "Turn awareness into routine: assign an owner, track energy and emissions monthly, and plan two or three low-cost projects."),
+    (75, "Build on what works: set reduction targets, budget for efficiency upgrades and document results for buyers and lenders."),
+    (101, "Lead and sustain: pursue certification, extend targets to suppliers and share your practices with peer MSMEs."),
+]
+
+
+def _gaps(summary):
+    """
+    (gap, question id) for every question answered below its best option,
+    largest gap first.
+    """
+    gaps = []
+    for parameter in (summary or {}).get("parameter_summary", {}).values():
+        for q in parameter.get("questions", []):
+            best = QUESTION_MAX_SCORES.get(str(q.get("id")))
+            if best is None:
+                # Question no longer in the bank: use the options stored with the answer
+                best = max((option_score(o) for o in (q.get("options") or {}).values()), default=0.0)
+            gap = best - float(q.get("selected_score", 0.0))
+            if gap > 0:
+                gaps.append((gap, q.get("id")))
+    gaps.sort(key=lambda item: (-item[0], item[1]))
+    return gaps
+
+
+def _snippet(question_id, lang):
+    snippet = SNIPPETS.get(str(question_id))
+    if not snippet:
+        return None
+    return snippet.get("topic"), snippet.get(lang) or snippet.get("en")
+
+
+def _maturity_advice(percentage):
+    for upper, advice in MATURITY_ADVICE:
+        if percentage < upper:
+            return advice
+    return MATURITY_ADVICE[-1][1]
+
+
+def _recommendations(summaries, lang, limit):
+    gaps = []
+    for summary in summaries:
+        gaps.extend(_gaps(summary))
+    gaps.sort(key=lambda item: (-item[0], item[1]))
+
+    lines = []
+    for _, question_id in gaps:
+        snippet = _snippet(question_id, lang)
+        if snippet is None:
+            continue
+        topic, advice = snippet
+        lines.append(f"{len(lines) + 1}. **{topic}**: {advice}")
+        if len(lines) >= limit:
+            break
+    return lines
+
+
+def fallback_level_suggestion(score, max_score, summary=None, lang="en", limit=5):
+    """
+    Markdown suggestions for one level, from its stored _summary.
+    """
+    percentage = (score / max_score * 100) if max_score else 0
+    lines = [FALLBACK_NOTE, "", f"You scored **{score:g} out of {max_score:g}** ({percentage:.0f}%).", ""]
+
+    recommendations = _recommendations([summary] if summary else [], lang, limit)
+    if recommendations:
+        lines += ["### Where to focus next", ""] + recommendations
+    elif summary:
+        lines.append("You chose the strongest answer for every question in this section. "
+                     "Keep your records current and share what worked with peer MSMEs.")
+    else:
+        lines.append(_maturity_advice(percentage))
+    return "\n".join(lines)
+
+
+def fallback_total_suggestion(total_score, max_total_score, summaries=(), lang="en", limit=8):
+    """
+    Markdown roadmap across all levels, from the latest attempt's summaries.
+    """
+    percentage = (total_score / max_total_score * 100) if max_total_score else 0
+    lines = [
+        FALLBACK_NOTE,
+        "",
+        f"Overall you scored **{total_score:g} out of {max_total_score:g}** ({percentage:.0f}%).",
+        "",
+        _maturity_advice(percentage),
+        "",
+    ]
+
+    recommendations = _recommendations(summaries, lang, limit)
+    if recommendations:
+        lines += ["### Priority actions", ""] + recommendations
+    return "\n".join(lines)
@@ -0,0 +1,125 @@
+# metrics.py
+import threading
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+
+# ===============================
+# In-process metrics, Prometheus text format
+# ===============================
+# Counters and histograms live in this process only; with several workers
+# each one is scraped (or summed) separately.
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+METRICS = {
+    "llm_request_duration_seconds": ("histogram", "LLM call latency, including retries; a stream's lasts until its end."),
+    "llm_stream_first_token_seconds": ("histogram", "Time until a streamed LLM reply's first text, including retries."),
+    "llm_tokens_total": ("counter", "Tokens reported in response.usage."),
+    "llm_requests_total": ("counter", "Completed LLM calls."),
+    "llm_errors_total": ("counter", "Failed LLM calls, by exception type."),
+    "llm_retries_total": ("counter", "Retried LLM attempts."),
+    "suggestion_cache_requests_total": ("counter", "Suggestion cache lookups, by result (hit or miss)."),
+    "page_cache_requests_total": ("counter", "Cached page requests, by result (hit, miss, not_modified or bypass)."),
+    # Per-request profiling (profiling.py, only with PROFILING on)
+    "http_requests_total": ("counter", "Requests served, by route, method and status."),
+    "http_request_duration_seconds": ("histogram", "Wall time per request, until the body was sent."),
+    "http_request_db_seconds": ("histogram", "Time spent executing SQL per request."),
+    "http_request_sql_statements": ("histogram", "SQL statements executed per request."),
+    "http_request_llm_seconds": ("histogram", "LLM call time per request that called the LLM (summed over parallel calls)."),
+    "http_request_template_seconds": ("histogram", "Template render time per request."),
+    "http_slow_requests_total": ("counter", "Requests slower than PROFILING_SLOW_REQUEST."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_local = threading.local()
+
+
+def current_route():
+    """The Flask endpoint serving this call, or the route bound with route()."""
+    if has_request_context() and request.endpoint:
+        return request.endpoint
+    return getattr(_local, "route", None) or "none"
+
+
+@contextmanager
+def route(name):
+    """Label metrics recorded on this (worker) thread with route name."""
+    previous = getattr(_local, "route", None)
+    _local.route = name
+    try:
+        yield
+    finally:
+        _local.route = previous
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, upper in enumerate(hist["buckets"]):
+            if value <= upper:
+                hist["counts"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+def record_usage(usage, **labels):
+    """Add response.usage prompt/completion token counts (usage may be None)."""
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if tokens:
+            inc("llm_tokens_total", tokens, type=kind, **labels)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: dict(hist, counts=list(hist["counts"])) for key, hist in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        else:
+            for (metric, labels), hist in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for upper, count in zip(hist["buckets"], hist["counts"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{upper:g}')])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,120 @@
+# migrations.py
+from sqlalchemy import text
+
+from analytics import create_statements as analytics_views
+
+# ===============================
+# Schema migrations for existing databases
+# ===============================
+# `flask initdb` (db.create_all) builds a fresh schema with everything below
+# already in place; `flask migrate` brings an existing database up to date.
+# Each migration runs once, in its own transaction, and is recorded in
+# schema_migrations. Statements are written to be safe on a fresh schema too.
+# They are PostgreSQL SQL: on SQLite (config.py DB_PROFILE), whose schema
+# always comes from `flask initdb`, they are only recorded.
+
+MIGRATIONS = [
+    (
+        "0001_details_jsonb",
+        "Store responses.details as JSONB objects instead of JSON strings",
+        [
+            # Rows written before this change hold a JSON *string* in the JSONB column
+            """
+            UPDATE responses
+               SET details = (details #>> '{}')::jsonb
+             WHERE jsonb_typeof(details) = 'string'
+            """,
+        ],
+    ),
+    (
+        "0002_user_score_summary",
+        "Per-user score summary table (rows are built from responses on first use)",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS user_score_summary (
+                user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+                best_scores JSONB NOT NULL,
+                attempts JSONB NOT NULL,
+                latest_attempt INTEGER,
+                total_best_score DOUBLE PRECISION NOT NULL,
+                final_level INTEGER,
+                updated_at TIMESTAMP NOT NULL DEFAULT now()
+            )
+            """,
+        ],
+    ),
+    (
+        "0003_responses_indexes",
+        "Composite indexes for the per-user responses queries",
+        [
+            """
+            CREATE INDEX IF NOT EXISTS ix_responses_user_attempt_level
+                ON responses (user_id, attempt_number, level) INCLUDE (score)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_responses_user_level_score
+                ON responses (user_id, level, score DESC)
+            """,
+            "ANALYZE responses",
+        ],
+    ),
+    (
+        "0004_keyset_indexes",
+        "(created_at, id) indexes for keyset pagination in the admin browser",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_responses_created_at_id ON responses (created_at, id)",
+        ],
+    ),
+    (
+        "0005_analytics_views",
+        "Materialized views behind /admin/analytics (refresh with `flask refresh-analytics`)",
+        analytics_views(),
+    ),
+    (
+        "0006_drop_details_index",
+        "Drop the GIN index on responses.details (no query filters on details; it only slowed writes)",
+        ["DROP INDEX IF EXISTS ix_responses_details"],
+    ),
+    (
+        "0007_final_level_from_thresholds",
+        "Recreate mv_onboarding_breakdown: final levels from the question bank's thresholds, none for unassessed users",
+        ["DROP MATERIALIZED VIEW IF EXISTS mv_onboarding_breakdown"] + analytics_views(),
+    ),
+]
+
+
+def _ensure_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            id VARCHAR(100) PRIMARY KEY,
+            description VARCHAR(300),
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+def applied_migrations(engine):
+    with engine.begin() as conn:
+        _ensure_table(conn)
+        return {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+
+def migrate(engine, log=print):
+    """Apply every pending migration in order; return the ids applied."""
+    done = applied_migrations(engine)
+    postgresql = engine.dialect.name == "postgresql"
+    applied = []
+    for migration_id, description, statements in MIGRATIONS:
+        if migration_id in done:
+            continue
+        log(f"Applying {migration_id}: {description}" + ("" if postgresql else " (recorded only)"))
+        with engine.begin() as conn:
+            for statement in statements if postgresql else []:
+                conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (id, description) VALUES (:id, :description)"),
+                {"id": migration_id, "description": description}
+            )
+        applied.append(migration_id)
+    return applied
@@ -3,8 +3,13 @@ from flask_login import UserMixin
 from datetime import datetime
 import json
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import column_property, deferred
 db = SQLAlchemy()
 
+# JSONB on PostgreSQL, JSON (stored as text) on other databases such as the
+# SQLite profile in config.py
+JSONDocument = db.JSON().with_variant(JSONB(), "postgresql")
+
 class User(UserMixin, db.Model):
     __tablename__ = "users"
 
@@ -16,7 +21,7 @@ class User(UserMixin, db.Model):
 
     # UI preferences + onboarding
     language = db.Column(db.String(10), nullable=False, server_default="en")
-    onboard_complete = db.Column(db.Boolean, nullable=False, server_default="false")
+    onboard_complete = db.Column(db.Boolean, nullable=False, server_default=db.false())
 
     step1 = db.Column(db.String(200))
     step2 = db.Column(db.String(200))
@@ -26,6 +31,11 @@ class User(UserMixin, db.Model):
 
     responses = db.relationship("Response", backref="user", lazy=True)
 
+    __table_args__ = (
+        # Keyset pagination in the admin browser
+        db.Index("ix_users_created_at_id", "created_at", "id"),
+    )
+
 
 class Response(db.Model):
     __tablename__ = "responses"
@@ -35,10 +45,23 @@ class Response(db.Model):
     level = db.Column(db.Integer, nullable=False)
     score = db.Column(db.Float, nullable=False, default=0.0)
     maturity_level = db.Column(db.Integer, nullable=False, default=1)
-    details = db.Column(JSONB)  # Store details as JSONB in PostgreSQL
+    # JSON object (not a JSON string); only loaded when accessed, pages
+    # read the fields they need through the SQL expressions below
+    details = deferred(db.Column(JSONDocument))
     attempt_number = db.Column(db.Integer, nullable=False, default=1)
     created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
 
+    __table_args__ = (
+        # Per-user lookups by attempt (next attempt number, completed levels,
+        # performance pages); score is included for index-only scans
+        db.Index("ix_responses_user_attempt_level", "user_id", "attempt_number", "level",
+                 postgresql_include=["score"]),
+        # Per-user, per-level lookups ordered by level or best score
+        db.Index("ix_responses_user_level_score", "user_id", "level", db.text("score DESC")),
+        # Keyset pagination in the admin browser
+        db.Index("ix_responses_created_at_id", "created_at", "id"),
+    )
+
     def details_json(self):
         try:
             if self.details:
@@ -48,6 +71,34 @@ class Response(db.Model):
             return {}
 
 
+# Fields of details["_summary"], extracted by PostgreSQL
+# score_max: always loaded (None when the summary lacks it)
+Response.score_max = column_property(Response.__table__.c.details[("_summary", "score_max")].as_float())
+# summary: the whole "_summary" object, loaded on first access
+Response.summary = column_property(Response.__table__.c.details[("_summary",)], deferred=True)
+
+
+# --------------------------------------------------
+# Per-user score summary (maintained by score_summary.py)
+# --------------------------------------------------
+
+class UserScoreSummary(db.Model):
+    __tablename__ = "user_score_summary"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # {"<level>": {"score": .., "score_max": .., "response_id": ..}} of the best response per level
+    best_scores = db.Column(JSONDocument, nullable=False, default=dict)
+    # {"<attempt>": {"total": .., "levels": {"<level>": {"score": .., "score_max": .., "response_id": ..}}}}
+    attempts = db.Column(JSONDocument, nullable=False, default=dict)
+    latest_attempt = db.Column(db.Integer)
+    total_best_score = db.Column(db.Float, nullable=False, default=0.0)
+    final_level = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+
+    def __repr__(self):
+        return f"<UserScoreSummary user={self.user_id}>"
+
+
 # --------------------------------------------------
 # ✅ Admin Table
 # --------------------------------------------------
@@ -61,3 +112,21 @@ class Admin(db.Model):
 
     def __repr__(self):
         return f"<Admin {self.username}>"
+
+
+# --------------------------------------------------
+# Suggestion cache (PostgreSQL backend of suggestion_cache.py)
+# --------------------------------------------------
+
+class SuggestionCache(db.Model):
+    __tablename__ = "suggestion_cache"
+
+    key = db.Column(db.String(255), primary_key=True)
+    engine = db.Column(db.String(64), nullable=False, index=True)
+    value = db.Column(JSONDocument, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+    expires_at = db.Column(db.Float)  # NULL = never expires / never evicted
+    accessed_at = db.Column(db.Float, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<SuggestionCache {self.key}>"
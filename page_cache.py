@@ -0,0 +1,100 @@
+# page_cache.py
+import hashlib
+import os
+import time
+from functools import wraps
+
+from flask import current_app, request, session
+
+import metrics
+from suggestion_cache import MemoryBackend
+
+# ===============================
+# Rendered page and fragment cache
+# ===============================
+# Pages (and HTML fragments) that only change with the language and the
+# user's state are rendered once per (route, language, user-state version)
+# and kept in a per-process LRU. Pages go out with a strong ETag, the hash
+# of their bytes, so a browser revalidating gets 304 Not Modified without
+# anything being rendered. When the user's state changes (a new Response,
+# an edited profile) the version changes with it and the next request
+# simply misses; invalidate_user() also frees their old entries here.
+
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE", "true").lower() in ("1", "true", "yes")
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 3600))  # seconds, 0 = never expire
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", 2048))
+
+_store = MemoryBackend(max_entries=PAGE_CACHE_MAX_ENTRIES)
+
+
+def make_key(name, lang, user_id=None, version=None):
+    """Entries of one user share the "<user_id>:" prefix (see invalidate_user)."""
+    digest = hashlib.sha1(repr(version).encode("utf-8")).hexdigest()[:16]
+    return f"{user_id if user_id is not None else '-'}:{name}:{lang}:{digest}"
+
+
+def get(key):
+    if not PAGE_CACHE_ENABLED:
+        return None
+    return _store.get(key)
+
+
+def put(key, value):
+    if PAGE_CACHE_ENABLED:
+        _store.put(key, value, expires_at=time.time() + PAGE_CACHE_TTL if PAGE_CACHE_TTL > 0 else None)
+
+
+def invalidate_user(user_id):
+    """Drop every page and fragment cached for this user in this process."""
+    _store.clear(str(user_id))
+
+
+def clear():
+    _store.clear()
+
+
+def _send(body, etag, private):
+    response = current_app.response_class(body, mimetype="text/html")
+    response.set_etag(etag)
+    # Revalidate on every visit: cheap (304) while the version is unchanged
+    response.headers["Cache-Control"] = "private, no-cache" if private else "no-cache"
+    response.vary.add("Cookie")
+    return response.make_conditional(request)
+
+
+def cached_page(vary):
+    """
+    Serve a view's rendered HTML from the cache. vary() returns (language,
+    user_id or None, version) for the request, or None to bypass the cache
+    (e.g. when the page would redirect). Only 200 HTML responses are kept,
+    and never while flashed messages are waiting to be shown.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            key_parts = vary() if PAGE_CACHE_ENABLED and request.method == "GET" else None
+            if key_parts is None or session.get("_flashes"):
+                metrics.inc("page_cache_requests_total", route=metrics.current_route(), result="bypass")
+                return view(*args, **kwargs)
+
+            lang, user_id, version = key_parts
+            key = make_key(request.full_path, lang, user_id, version)
+            entry = _store.get(key)
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.mimetype != "text/html" or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = (body, hashlib.sha256(body).hexdigest()[:32])
+                put(key, entry)
+                result = "miss"
+            else:
+                result = "hit"
+
+            response = _send(entry[0], entry[1], private=user_id is not None)
+            if response.status_code == 304:
+                result = "not_modified"
+            metrics.inc("page_cache_requests_total", route=metrics.current_route(), result=result)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,124 @@
+# precompute.py
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import engine_registry
+import metrics
+import suggestion_cache
+# Importing the engine modules registers their prompts
+import suggestion_engine, suggestion_engine1, suggestion_engine2  # noqa: F401
+import suggestion_engine3, suggestion_engine4, suggestion_engine5  # noqa: F401
+import snippet_engine
+from question_bank import LEVEL_TABLES
+
+# Engines fed with a single level's (score, max_score)
+LEVEL_ENGINES = {
+    1: "awareness_engagement",
+    2: "knowledge_capabilities",
+    3: "planning_strategies",
+    4: "action_strategies",
+}
+
+# Engines fed with the overall (total_score, max_total_score)
+TOTAL_ENGINES = [
+    "total",
+]
+
+# Registered, but no route reads them: only precomputed when asked for by
+# name (--engine), so a default run spends no tokens or pinned cache on them
+OPT_IN_TOTAL_ENGINES = [
+    "tips_resources",
+]
+
+
+# ===============================
+# Score space
+# ===============================
+def _sum_sets(left, right):
+    return {round(a + b, 4) for a in left for b in right}
+
+
+def reachable_level_scores(table):
+    """Every score a level can produce: one option picked per question."""
+    scores = {0.0}
+    for option_scores in table.option_scores:
+        scores = _sum_sets(scores, set(option_scores.values()) or {0.0})
+    return sorted(scores)
+
+
+def suggestion_space(level_tables=LEVEL_TABLES, total_engines=TOTAL_ENGINES):
+    """
+    List every (engine, score, max_score) the /suggestions/* routes can ask for.
+    """
+    jobs = []
+    total_scores = {0.0}
+    total_max = 0.0
+
+    for level, table in sorted(level_tables.items()):
+        scores = reachable_level_scores(table)
+        engine = LEVEL_ENGINES.get(level)
+        if engine is not None:
+            jobs.extend((engine, score, table.score_max) for score in scores)
+        total_scores = _sum_sets(total_scores, scores)
+        total_max += table.score_max
+
+    for engine in total_engines:
+        jobs.extend((engine, score, total_max) for score in sorted(total_scores))
+    return jobs
+
+
+# ===============================
+# Runner
+# ===============================
+def precompute_suggestions(app, concurrency=4, engines=None, dry_run=False, snippets=False, log=print):
+    """
+    Generate and pin (never expire) a cached answer for every reachable score,
+    plus every per-answer snippet when snippets is set. Entries already in
+    the cache are pinned without calling the LLM again, so an interrupted
+    run picks up where it stopped.
+    """
+    opt_in = [engine for engine in OPT_IN_TOTAL_ENGINES if engine in (engines or ())]
+    jobs = suggestion_space(total_engines=TOTAL_ENGINES + opt_in)
+    if snippets:
+        jobs += snippet_engine.snippet_space()
+    if engines:
+        jobs = [job for job in jobs if job[0] in engines]
+
+    pending = []
+    with app.app_context():
+        for job in jobs:
+            engine, args = job[0], job[1:]
+            key = engine_registry.cache_key(engine, *args)
+            cached = suggestion_cache.get(key)
+            if cached is None:
+                pending.append(job)
+            elif not dry_run:
+                suggestion_cache.put(key, cached, engine=engine, ttl=0)
+
+    log(f"{len(jobs)} suggestions in space, {len(jobs) - len(pending)} cached, {len(pending)} to generate.")
+    if dry_run or not pending:
+        return {"total": len(jobs), "generated": 0, "failed": 0}
+
+    def run(job):
+        engine, args = job[0], job[1:]
+        with app.app_context(), metrics.route("precompute-suggestions"):
+            value = engine_registry.complete(engine, *args)
+            suggestion_cache.put(engine_registry.cache_key(engine, *args), value, engine=engine, ttl=0)
+
+    generated = failed = 0
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(run, job): job for job in pending}
+        for future in as_completed(futures):
+            engine, args = futures[future][0], futures[future][1:]
+            try:
+                future.result()
+                generated += 1
+            except Exception as e:
+                failed += 1
+                log(f"  ! {engine} {args}: {e}")
+            done = generated + failed
+            if done % 25 == 0 or done == len(pending):
+                log(f"  {done}/{len(pending)} done ({time.time() - started:.0f}s)")
+
+    return {"total": len(jobs), "generated": generated, "failed": failed}
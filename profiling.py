@@ -0,0 +1,322 @@
+# profiling.py
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import before_render_template, request, session, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+try:
+    import pyinstrument
+except ImportError:  # PROFILER=pyinstrument needs it; cProfile is built in
+    pyinstrument = None
+
+# ===============================
+# Per-request profiling (opt-in: PROFILING=true)
+# ===============================
+# Every request gets a RequestProfile holding its wall time, the time and
+# text of each SQL statement (SQLAlchemy cursor events), LLM call time
+# (added by engine_registry) and template render time (Flask signals).
+# Work done on fan-out / stream worker threads is counted through bound().
+# Totals go to /metrics as per-route histograms and, with recent slow
+# requests and profiler dumps, to /admin/profiling. A sampled share of
+# requests (PROFILING_SAMPLE_RATE), or one an admin asks for with the
+# "X-Profile: 1" header, also runs under cProfile (or pyinstrument) and
+# leaves a dump per route in PROFILING_DIR.
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+MAX_STATEMENTS = 200      # SQL text kept per request (all are counted)
+RECENT_PER_ROUTE = 500    # wall times kept per route for the percentiles
+SLOW_REQUESTS_KEPT = 50
+PROFILE_FILES_KEPT = 100
+
+_local = threading.local()
+_lock = threading.Lock()
+_routes = {}
+_slow = deque(maxlen=SLOW_REQUESTS_KEPT)
+# Only one profiler may run at a time (sys.monitoring is process-wide)
+_profiler_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Timings of one request; DB and LLM time may arrive from worker threads."""
+
+    def __init__(self, route, method, path):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.llm = 0.0
+        self.template = 0.0
+        self.sql_count = 0
+        self.statements = []
+        self.profiler = None
+        self._template_starts = []
+        self._lock = threading.Lock()
+
+    def add(self, kind, seconds):
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + seconds)
+
+    def add_statement(self, statement, seconds):
+        with self._lock:
+            self.db += seconds
+            self.sql_count += 1
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append((seconds, " ".join(statement.split())))
+
+
+def current():
+    return getattr(_local, "profile", None)
+
+
+@contextmanager
+def bound(profile):
+    """Count this (worker) thread's SQL and LLM time towards profile (may be None)."""
+    previous = current()
+    _local.profile = profile
+    try:
+        yield
+    finally:
+        _local.profile = previous
+
+
+def add(kind, seconds):
+    """Add "llm" or "template" seconds to the current request, if profiled."""
+    profile = current()
+    if profile is not None:
+        profile.add(kind, seconds)
+
+
+# --- SQLAlchemy and template hooks ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current() is not None:
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("profiling_started")
+    profile = current()
+    if started:
+        seconds = time.perf_counter() - started.pop()
+        if profile is not None:
+            profile.add_statement(statement, seconds)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("profiling_started"):
+        conn.info["profiling_started"].pop()
+
+
+def _before_render(sender, template, context, **extra):
+    profile = current()
+    if profile is not None:
+        profile._template_starts.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    profile = current()
+    if profile is not None and profile._template_starts:
+        profile.add("template", time.perf_counter() - profile._template_starts.pop())
+
+
+# --- Profiler dumps ---
+
+def profile_dir(app):
+    return app.config.get("PROFILING_DIR") or os.path.join(app.instance_path, "profiles")
+
+
+def _wants_profiler(app):
+    header = request.headers.get("X-Profile")
+    if header:
+        token = app.config.get("METRICS_TOKEN")
+        if session.get("is_admin") or (token and header == token):
+            return True
+    rate = app.config.get("PROFILING_SAMPLE_RATE") or 0
+    return rate > 0 and random.random() < rate
+
+
+def _start_profiler(app):
+    if not _profiler_lock.acquire(blocking=False):
+        return None
+    if app.config.get("PROFILER") == "pyinstrument" and pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def _save_profiler(app, profile):
+    """Stop the request's profiler and write <route>-<timestamp>.prof (or .html)."""
+    profiler = profile.profiler
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+    finally:
+        _profiler_lock.release()
+
+    directory = profile_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{re.sub(r'[^A-Za-z0-9_.]', '_', profile.route)}-{datetime.now():%Y%m%d-%H%M%S-%f}"
+    if isinstance(profiler, cProfile.Profile):
+        profiler.dump_stats(os.path.join(directory, stem + ".prof"))
+    else:
+        with open(os.path.join(directory, stem + ".html"), "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+
+    for old in list_profiles(app)[PROFILE_FILES_KEPT:]:
+        os.remove(os.path.join(directory, old["name"]))
+
+
+def list_profiles(app):
+    """Profiler dumps on disk, newest first."""
+    directory = profile_dir(app)
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for name in os.listdir(directory):
+        if name.endswith((".prof", ".html")):
+            stat = os.stat(os.path.join(directory, name))
+            files.append({"name": name, "size": stat.st_size, "modified": datetime.fromtimestamp(stat.st_mtime)})
+    return sorted(files, key=lambda f: f["modified"], reverse=True)
+
+
+def profile_path(app, name):
+    """Path of a dump listed by list_profiles(), or None."""
+    if not re.fullmatch(r"[\w.-]+\.(prof|html)", name):
+        return None
+    path = os.path.join(profile_dir(app), name)
+    return path if os.path.isfile(path) else None
+
+
+def profile_stats(path, limit=40):
+    """A .prof dump as text: the top functions by cumulative time."""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+# --- Aggregation ---
+
+def _record(app, profile, status):
+    wall = time.perf_counter() - profile.started
+    route = profile.route
+    metrics.inc("http_requests_total", route=route, method=profile.method, status=status)
+    metrics.observe("http_request_duration_seconds", wall, buckets=REQUEST_BUCKETS, route=route)
+    metrics.observe("http_request_db_seconds", profile.db, buckets=REQUEST_BUCKETS, route=route)
+    metrics.observe("http_request_sql_statements", profile.sql_count, buckets=SQL_BUCKETS, route=route)
+    metrics.observe("http_request_template_seconds", profile.template, buckets=REQUEST_BUCKETS, route=route)
+    if profile.llm:
+        metrics.observe("http_request_llm_seconds", profile.llm, route=route)
+
+    with _lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = {
+                "count": 0, "wall": 0.0, "db": 0.0, "sql": 0, "sql_max": 0, "llm": 0.0, "template": 0.0,
+                "recent": deque(maxlen=RECENT_PER_ROUTE),
+            }
+        stats["count"] += 1
+        stats["wall"] += wall
+        stats["db"] += profile.db
+        stats["sql"] += profile.sql_count
+        stats["sql_max"] = max(stats["sql_max"], profile.sql_count)
+        stats["llm"] += profile.llm
+        stats["template"] += profile.template
+        stats["recent"].append(wall)
+
+    threshold = app.config.get("PROFILING_SLOW_REQUEST")
+    if threshold is not None and wall >= threshold:
+        metrics.inc("http_slow_requests_total", route=route)
+        _slow.appendleft({
+            "at": datetime.now(), "route": route, "method": profile.method, "path": profile.path,
+            "status": status, "wall": wall, "db": profile.db, "sql_count": profile.sql_count,
+            "llm": profile.llm, "template": profile.template, "statements": profile.statements,
+        })
+        app.logger.warning(
+            "Slow request %s %s (%s): %.0f ms, %d SQL statement(s) in %.0f ms, LLM %.0f ms, templates %.0f ms%s",
+            profile.method, profile.path, status, wall * 1000, profile.sql_count, profile.db * 1000,
+            profile.llm * 1000, profile.template * 1000,
+            "".join(f"\n  {seconds * 1000:7.1f} ms  {sql}" for seconds, sql in profile.statements)
+        )
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def snapshot():
+    """Per-route averages (slowest total first) and the recent slow requests."""
+    with _lock:
+        routes = []
+        for route, stats in _routes.items():
+            n = stats["count"]
+            routes.append({
+                "route": route, "count": n, "total": stats["wall"], "avg": stats["wall"] / n,
+                "p50": _percentile(stats["recent"], 0.5), "p95": _percentile(stats["recent"], 0.95),
+                "max": max(stats["recent"]), "db": stats["db"] / n, "sql": stats["sql"] / n,
+                "sql_max": stats["sql_max"], "llm": stats["llm"] / n, "template": stats["template"] / n,
+            })
+        slow = list(_slow)
+    return {"routes": sorted(routes, key=lambda r: r["total"], reverse=True), "slow": slow}
+
+
+def reset():
+    with _lock:
+        _routes.clear()
+        _slow.clear()
+
+
+def init_app(app):
+    """Profile every request served by app (called from create_app when PROFILING is on)."""
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_request_profile():
+        profile = _local.profile = RequestProfile(request.endpoint or "none", request.method, request.full_path.rstrip("?"))
+        if _wants_profiler(app):
+            profile.profiler = _start_profiler(app)
+
+    @app.after_request
+    def finish_request_profile(response):
+        profile = current()
+        if profile is None:
+            return response
+
+        def done():
+            _local.profile = None
+            if profile.profiler is not None:
+                _save_profiler(app, profile)
+            _record(app, profile, response.status_code)
+
+        # A streamed body is produced after this hook; the server's close() ends it
+        if response.is_streamed:
+            response.call_on_close(done)
+        else:
+            done()
+        return response
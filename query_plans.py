@@ -0,0 +1,163 @@
+# query_plans.py
+import json
+from datetime import datetime
+
+from sqlalchemy import text
+
+from models import db, User, Response, UserScoreSummary
+from attempt_state import attempt_levels_query
+
+# ===============================
+# Query-plan regression check
+# ===============================
+# Seeds a large synthetic dataset inside a transaction, runs EXPLAIN on the
+# per-user queries the routes issue, reports any sequential scan on the
+# tables below, then rolls everything back. Works on PostgreSQL (EXPLAIN
+# (FORMAT JSON)) and SQLite (EXPLAIN QUERY PLAN).
+
+CHECKED_TABLES = {"users", "responses", "user_score_summary"}
+SEED_EMAIL_DOMAIN = "plan-check.invalid"
+
+
+def route_queries(user_id, email, cursor):
+    """(name, statement) for the user-scoped queries behind each route."""
+    select = db.select
+    newest_first = (Response.created_at.desc(), Response.id.desc())
+    return [
+        ("login: user by email",
+         select(User).filter_by(email=email)),
+        ("load_user: user by id",
+         select(User).filter_by(id=user_id)),
+        ("attempt state: levels of the last two attempts",
+         attempt_levels_query(user_id)),
+        ("performance_insights: all responses",
+         select(Response).filter_by(user_id=user_id).order_by(Response.attempt_number, Response.level)),
+        ("admin_dashboard: user responses",
+         select(Response).filter_by(user_id=user_id).order_by(Response.level)),
+        ("best score per level",
+         select(Response).filter_by(user_id=user_id, level=2).order_by(Response.score.desc()).limit(1)),
+        ("score summary: PK lookup",
+         select(UserScoreSummary).filter_by(user_id=user_id)),
+        ("score summary: rebuild",
+         select(Response).filter_by(user_id=user_id).order_by(Response.id)),
+        ("admin_browse: responses page",
+         select(Response, User).join(User, Response.user_id == User.id)
+         .filter(db.tuple_(Response.created_at, Response.id) < cursor).order_by(*newest_first).limit(51)),
+        ("admin_browse: users page",
+         select(User).filter(db.tuple_(User.created_at, User.id) < cursor)
+         .order_by(User.created_at.desc(), User.id.desc()).limit(51)),
+    ]
+
+
+SEED_SQL = {
+    "postgresql": [
+        """
+        INSERT INTO users (email, name, language, onboard_complete)
+        SELECT 'user' || g || '@' || :domain, 'Plan check ' || g, 'en', true
+          FROM generate_series(1, :users) AS g
+        """,
+        """
+        INSERT INTO responses (user_id, level, score, maturity_level, details, attempt_number)
+        SELECT u.id, l, round((random() * 7)::numeric, 2), 1 + (random() * 3)::int,
+               jsonb_build_object('_summary', jsonb_build_object('level', l, 'score_max', 7)), a
+          FROM users u, generate_series(1, 4) AS l, generate_series(1, :attempts) AS a
+         WHERE u.email LIKE '%@' || :domain
+        """,
+        """
+        INSERT INTO user_score_summary (user_id, best_scores, attempts, latest_attempt, total_best_score)
+        SELECT id, '{}'::jsonb, '{}'::jsonb, :attempts, 0
+          FROM users WHERE email LIKE '%@' || :domain
+        """,
+    ],
+    # No generate_series: recursive CTEs count instead
+    "sqlite": [
+        """
+        INSERT INTO users (email, name, language, onboard_complete)
+        WITH RECURSIVE g(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM g WHERE n < :users)
+        SELECT 'user' || n || '@' || :domain, 'Plan check ' || n, 'en', 1 FROM g
+        """,
+        """
+        INSERT INTO responses (user_id, level, score, maturity_level, details, attempt_number)
+        WITH RECURSIVE l(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM l WHERE n < 4),
+                       a(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM a WHERE n < :attempts)
+        SELECT u.id, l.n, abs(random() % 700) / 100.0, 1 + abs(random() % 4),
+               json_object('_summary', json_object('level', l.n, 'score_max', 7)), a.n
+          FROM users u, l, a
+         WHERE u.email LIKE '%@' || :domain
+        """,
+        """
+        INSERT INTO user_score_summary (user_id, best_scores, attempts, latest_attempt, total_best_score, updated_at)
+        SELECT id, '{}', '{}', :attempts, 0, CURRENT_TIMESTAMP
+          FROM users WHERE email LIKE '%@' || :domain
+        """,
+    ],
+}
+
+
+def _seed(conn, users, attempts):
+    for statement in SEED_SQL[conn.dialect.name]:
+        conn.execute(text(statement), {"users": users, "attempts": attempts, "domain": SEED_EMAIL_DOMAIN})
+    conn.execute(text("ANALYZE users"))
+    conn.execute(text("ANALYZE responses"))
+    conn.execute(text("ANALYZE user_score_summary"))
+
+
+def _seq_scans(plan):
+    """Tables read with a sequential scan anywhere in an EXPLAIN (FORMAT JSON) plan."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in CHECKED_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def _sqlite_plan(conn, sql):
+    """
+    EXPLAIN QUERY PLAN rows as {"Steps": [..]} plus the tables read by a
+    full scan: "SCAN <table>" without USING (COVERING) INDEX.
+    """
+    steps = [row.detail for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+    found = []
+    for step in steps:
+        words = step.split()
+        if words[0] == "SCAN" and "USING" not in words:
+            table = words[2] if words[1] == "TABLE" else words[1]
+            if table in CHECKED_TABLES:
+                found.append(table)
+    return {"Steps": steps}, found
+
+
+def check_query_plans(users=20000, attempts=3, log=print):
+    """
+    Return {query name: {"plan": .., "seq_scans": [..]}}. Nothing is left
+    behind in the database: the seed data is rolled back.
+    """
+    results = {}
+    with db.engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            log(f"Seeding {users} users x {attempts} attempts x 4 levels ...")
+            _seed(conn, users, attempts)
+            email = f"user{users // 2}@{SEED_EMAIL_DOMAIN}"
+            user_id, created_at = conn.execute(
+                text("SELECT id, created_at FROM users WHERE email = :email"), {"email": email}
+            ).one()
+
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+
+            for name, stmt in route_queries(user_id, email, (created_at, user_id)):
+                sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+                if conn.dialect.name == "sqlite":
+                    root, scans = _sqlite_plan(conn, sql)
+                    results[name] = {"sql": sql, "plan": root, "seq_scans": scans}
+                    continue
+                plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                root = plan[0]["Plan"]
+                results[name] = {"sql": sql, "plan": root, "seq_scans": _seq_scans(root)}
+        finally:
+            trans.rollback()
+    return results
@@ -0,0 +1,151 @@
+# question_bank.py
+import json
+import os
+from datetime import datetime
+
+# ===============================
+# Compiled question bank
+# ===============================
+# questionnaire.json is read and compiled once at import: per level, the
+# question ids, an option -> score map per question, each question's min
+# and max score and its parameter group, plus the level totals. Scoring a
+# submission is then a dict lookup per question. Routes, suggestion engines
+# and the precompute job all read the bank from here.
+
+QUESTIONNAIRE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questionnaire.json")
+
+with open(QUESTIONNAIRE_PATH, "r", encoding="utf-8") as f:
+    QUESTION_BANK = json.load(f)
+
+# Raw structures, as the templates render them
+CATEGORIES_AS_LEVELS = {str(k): v for k, v in QUESTION_BANK.get("categories_as_levels", {}).items()}
+LEVELS = QUESTION_BANK.get("levels", {})
+
+# Question id (str) -> raw question dict
+QUESTIONS = {
+    str(q["id"]): q
+    for category in CATEGORIES_AS_LEVELS.values()
+    for q in category.get("questions", [])
+}
+
+
+def option_score(option):
+    """Score of one raw option: {"en": .., "score": 0.66} or a bare number."""
+    return float(option.get("score", 0.0)) if isinstance(option, dict) else float(option)
+
+
+class LevelTable:
+    """Scoring tables for one level, in question order."""
+
+    def __init__(self, level, questions):
+        self.level = level
+        self.questions = questions
+        self.question_ids = [q.get("id") for q in questions]
+        self.option_scores = [
+            {key: option_score(opt) for key, opt in q.get("options", {}).items()}
+            for q in questions
+        ]
+        self.min_scores = [min(scores.values(), default=0.0) for scores in self.option_scores]
+        self.max_scores = [max(scores.values(), default=0.0) for scores in self.option_scores]
+        self.parameters = [q.get("parameter", q.get("category", "General")) for q in questions]
+
+        self.score_min = sum(self.min_scores)
+        self.score_max = sum(self.max_scores)
+        self.parameter_min = {}
+        self.parameter_max = {}
+        for parameter, q_min, q_max in zip(self.parameters, self.min_scores, self.max_scores):
+            self.parameter_min[parameter] = self.parameter_min.get(parameter, 0.0) + q_min
+            self.parameter_max[parameter] = self.parameter_max.get(parameter, 0.0) + q_max
+
+
+LEVEL_TABLES = {
+    int(level): LevelTable(int(level), category.get("questions", []))
+    for level, category in sorted(CATEGORIES_AS_LEVELS.items(), key=lambda item: int(item[0]))
+}
+
+# Best option score per question id (str)
+QUESTION_MAX_SCORES = {
+    str(qid): q_max
+    for table in LEVEL_TABLES.values()
+    for qid, q_max in zip(table.question_ids, table.max_scores)
+}
+
+# Highest possible score per level and overall
+LEVEL_MAX_SCORES = {level: table.score_max for level, table in LEVEL_TABLES.items()}
+TOTAL_MAX_SCORE = sum(LEVEL_MAX_SCORES.values())
+
+
+# (minimum percent of a level's max score, maturity level), highest first;
+# anything below the last threshold is level 1. bulk_scoring reads it too.
+MATURITY_THRESHOLDS = ((75, 4), (50, 3), (25, 2))
+MATURITY_FLOOR = 1
+
+# The overall level from the sum of best level scores uses the same
+# thresholds as a share of TOTAL_MAX_SCORE (9, 18 and 27 of 36), except that
+# a total has to exceed a cut-off: 9 is still level 1
+FINAL_MATURITY_CUTOFFS = tuple(
+    (threshold * TOTAL_MAX_SCORE / 100, maturity) for threshold, maturity in MATURITY_THRESHOLDS
+)
+
+
+def compute_level_maturity_from_percent(pct):
+    for threshold, maturity in MATURITY_THRESHOLDS:
+        if pct >= threshold:
+            return maturity
+    return MATURITY_FLOOR
+
+
+def score_level(level, answers):
+    """
+    Score one level's submission. answers maps "q_<id>" to the chosen option
+    key (e.g. request.form). Returns (score, maturity level, details) where
+    details is the dict stored in Response.details.
+    """
+    table = LEVEL_TABLES[level]
+    parameter_map = {
+        parameter: {
+            "total": 0, "score": 0.0,
+            "min": table.parameter_min[parameter], "max": table.parameter_max[parameter],
+            "questions": []
+        }
+        for parameter in table.parameter_min
+    }
+    total_score = 0.0
+    fulfilled_attributes = 0
+
+    for i, qid in enumerate(table.question_ids):
+        ans_key = (answers.get(f"q_{qid}") or "").strip()
+        selected_score = table.option_scores[i].get(ans_key, 0.0)
+        total_score += selected_score
+        if selected_score > 0:
+            fulfilled_attributes += 1
+
+        q = table.questions[i]
+        group = parameter_map[table.parameters[i]]
+        group["total"] += 1
+        group["score"] += selected_score
+        group["questions"].append({
+            "id": qid,
+            "text": q.get("text"),
+            "selected": ans_key,
+            "selected_score": selected_score,
+            "options": q.get("options", {})
+        })
+
+    percent_of_level = (total_score / table.score_max * 100) if table.score_max > 0 else 0.0
+    level_maturity = compute_level_maturity_from_percent(percent_of_level)
+
+    details = {
+        "_summary": {
+            "level": level,
+            "score_total": total_score,
+            "score_min": table.score_min,
+            "score_max": table.score_max,
+            "percent_of_level": percent_of_level,
+            "fulfilled_attributes": fulfilled_attributes,
+            "total_attributes": len(table.question_ids),
+            "parameter_summary": parameter_map,
+            "submitted_at": datetime.utcnow().isoformat() + "Z"
+        }
+    }
+    return total_score, level_maturity, details
@@ -1,7 +1,7 @@
 # routes.py
 from flask import (
     render_template, request, redirect, url_for,
-    flash, session
+    flash, session, abort, stream_with_context, send_file
 )
 from flask_login import (
     login_user, logout_user, login_required,
@@ -9,19 +9,76 @@ from flask_login import (
 )
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-import json
-import os
+import io
 from functools import wraps
 from models import db, User, Response
-from flask import Blueprint, render_template, request
-from suggestion_engine5 import generate_tips_and_resources
-from suggestion_engine import generate_dynamic_suggestion
-from suggestion_engine1 import generate_dynamic_suggestion_knowledge
-from suggestion_engine2 import generate_dynamic_suggestion_planning
-from suggestion_engine3 import generate_dynamic_suggestion_advanced
-from suggestion_engine4 import generate_total_suggestion
+from sqlalchemy.orm import selectinload
+from score_summary import final_maturity_level, get_summary, record_response
+from attempt_state import get_attempt_state, invalidate_attempt_state
+from question_bank import CATEGORIES_AS_LEVELS, LEVELS, LEVEL_MAX_SCORES, TOTAL_MAX_SCORE, score_level
+import analytics
+import bulk_scoring
+import export
+from suggestion_engine import stream_dynamic_suggestion
+from suggestion_engine1 import stream_dynamic_suggestion_knowledge
+from suggestion_engine2 import stream_dynamic_suggestion_planning
+from suggestion_engine3 import stream_dynamic_suggestion_advanced
+from suggestion_engine4 import stream_total_suggestion
+from suggestion_stream import sse_markdown
+import engine_registry
+import metrics
+import page_cache
+import profiling
+import user_cache
+from fallback_engine import fallback_level_suggestion, fallback_total_suggestion
+from snippet_engine import compose_level_suggestion, compose_total_suggestion
 import markdown
 
+# ======================================================================
+# USER TRANSLATIONS
+# ======================================================================
+TRANSLATIONS = {
+    "en": {
+        "welcome": "Welcome",
+        "home_title": "Carbon Emission Analysis - Home",
+        "questionnaire": "Questionnaire",
+        "profile": "Profile",
+        "performance": "Performance",
+        "performance_insights": "Performance Insights",
+        "suggestions": "Suggestions",
+        "documentaries": "Documentaries",
+        "analysis": "Analysis",
+        "start": "Start",
+        "next_level_locked": "Complete previous level to unlock this level.",
+        "onboard_title": "5 quick steps to get started"
+    },
+    "hi": {
+        "welcome": "स्वागत है",
+        "home_title": "कार्बन उत्सर्जन विश्लेषण - होम",
+        "questionnaire": "प्रश्नावली",
+        "profile": "प्रोफ़ाइल",
+        "performance": "प्रदर्शन",
+        "performance_insights": "प्रदर्शन विश्लेषण",
+        "suggestions": "सुझाव",
+        "documentaries": "डॉक्यूमेंटरी",
+        "analysis": "विश्लेषण",
+        "start": "शुरू करें",
+        "next_level_locked": "इस स्तर को अनलॉक करने के लिए पिछले स्तर को पूरा करें।",
+        "onboard_title": "शुरू करने के लिए 5 त्वरित कदम"
+    }
+}
+
+# Navigation labels of the suggestion and resource pages
+NAV_TRANSLATIONS = {
+    "home_title": "Home",
+    "questionnaire": "Questionnaire",
+    "performance": "Performance",
+    "performance_insights": "Performance Insights",
+    "suggestions": "Suggestions",
+    "profile": "Profile"
+}
+
+
 def register_routes(app):
     # ----------------------------------------------------------------------
     # ADMIN CREDENTIALS (default if not using Admin table)
@@ -41,10 +98,40 @@ def register_routes(app):
             return f(*args, **kwargs)
         return decorated
 
+    # ----------------------------------------------------------------------
+    # PAGE CACHE KEYS (see page_cache.py)
+    # ----------------------------------------------------------------------
+    def shared_page():
+        """Pages that are the same for every visitor: vary by language only."""
+        return current_language(), None, None
+
+    def visitor_page():
+        """
+        Pages with the same content for everyone, but base.html's navbar
+        shows who is logged in: one entry per user (and one for anonymous
+        visitors), renewed when their name or email changes.
+        """
+        if not current_user.is_authenticated:
+            return shared_page()
+        u = current_user
+        return current_language(), u.id, (u.name, u.email)
+
+    def anonymous_page():
+        """Like shared_page, but logged-in visitors are redirected, so skip the cache."""
+        if session.get("is_admin") or current_user.is_authenticated:
+            return None
+        return shared_page()
+
+    def profile_page():
+        """The user's own page: changes whenever their profile does."""
+        u = current_user
+        return current_language(), u.id, (u.name, u.email, u.step1, u.step2, u.step3, u.step4, u.step5)
+
     # ----------------------------------------------------------------------
     # LANDING PAGE
     # ----------------------------------------------------------------------
     @app.route("/")
+    @page_cache.cached_page(anonymous_page)
     def landing_page():
         if session.get("is_admin"):
             return redirect(url_for("admin_dashboard"))
@@ -86,20 +173,17 @@ def register_routes(app):
     @app.route("/admin/dashboard")
     @admin_required
     def admin_dashboard():
-        # Total counts
-        total_users = User.query.count()
-        total_responses = Response.query.count()
+        # Both totals in one round trip
+        total_users, total_responses = db.session.query(
+            db.select(db.func.count(User.id)).scalar_subquery(),
+            db.select(db.func.count(Response.id)).scalar_subquery()
+        ).one()
 
-        # Latest 10 users
-        recent_users = User.query.order_by(User.id.desc()).limit(10).all()
+        # Latest 10 users, with their responses loaded in one more query
+        recent_users = User.query.options(selectinload(User.responses))\
+                        .order_by(User.id.desc()).limit(10).all()
 
-        # Prepare responses grouped by user
-        users_with_responses = []
-        for u in recent_users:
-            responses = Response.query.filter_by(user_id=u.id).order_by(Response.level).all()
-            if responses:
-                u.responses = responses  # Attach responses to user
-                users_with_responses.append(u)
+        users_with_responses = [u for u in recent_users if u.responses]
 
         return render_template(
             "admin_dashboard.html",
@@ -109,47 +193,232 @@ def register_routes(app):
             users_with_responses=users_with_responses  # Pass this to template
         )
 
+    # --------------------------
+    # Admin Browser (keyset pagination)
+    # --------------------------
+    BROWSE_PAGE_SIZE = 50
+    BROWSE_TEXT_FILTERS = ["step1", "step2", "step4", "step5"]
+
+    def parse_cursor(value):
+        """ "<created_at ISO>_<id>" -> (datetime, id), or None."""
+        try:
+            created_at, _, row_id = (value or "").rpartition("_")
+            return datetime.fromisoformat(created_at), int(row_id)
+        except ValueError:
+            return None
+
+    def browse_filters(args):
+        """Filter values from the query string, blanks dropped."""
+        filters = {name: args.get(name, "").strip() for name in BROWSE_TEXT_FILTERS}
+        for name in ("step3", "level", "maturity_level"):
+            value = args.get(name, "").strip()
+            filters[name] = int(value) if value.isdigit() else None
+        return {k: v for k, v in filters.items() if v not in ("", None)}
+
+    def apply_user_filters(query, filters):
+        for name in BROWSE_TEXT_FILTERS:
+            if name in filters:
+                query = query.filter(getattr(User, name).ilike(f"%{filters[name]}%"))
+        if "step3" in filters:
+            query = query.filter(User.step3 == filters["step3"])
+        return query
+
+    @app.route("/admin/browse")
+    @admin_required
+    def admin_browse():
+        """
+        Page through users or responses newest first. Pages are keyed on
+        (created_at, id) of the last row shown (?after=...), so every page
+        is one index range scan however deep the admin goes.
+        """
+        view = "users" if request.args.get("view") == "users" else "responses"
+        filters = browse_filters(request.args)
+        cursor = parse_cursor(request.args.get("after"))
+
+        if view == "users":
+            model = User
+            query = apply_user_filters(User.query, filters)
+            response_filters = [
+                getattr(Response, name) == filters[name]
+                for name in ("level", "maturity_level") if name in filters
+            ]
+            if response_filters:
+                query = query.filter(
+                    db.exists().where(Response.user_id == User.id, *response_filters)
+                )
+        else:
+            model = Response
+            query = apply_user_filters(
+                Response.query.join(User, Response.user_id == User.id)
+                        .options(db.contains_eager(Response.user)),
+                filters
+            )
+            for name in ("level", "maturity_level"):
+                if name in filters:
+                    query = query.filter(getattr(Response, name) == filters[name])
 
-    # ======================================================================
-    # USER TRANSLATIONS & QUESTION BANK
-    # ======================================================================
-    TRANSLATIONS = {
-        "en": {
-            "welcome": "Welcome",
-            "home_title": "Carbon Emission Analysis - Home",
-            "questionnaire": "Questionnaire",
-            "profile": "Profile",
-            "performance": "Performance",
-            "performance_insights": "Performance Insights",
-            "suggestions": "Suggestions",
-            "documentaries": "Documentaries",
-            "analysis": "Analysis",
-            "start": "Start",
-            "next_level_locked": "Complete previous level to unlock this level.",
-            "onboard_title": "5 quick steps to get started"
-        },
-        "hi": {
-            "welcome": "स्वागत है",
-            "home_title": "कार्बन उत्सर्जन विश्लेषण - होम",
-            "questionnaire": "प्रश्नावली",
-            "profile": "प्रोफ़ाइल",
-            "performance": "प्रदर्शन",
-            "performance_insights": "प्रदर्शन विश्लेषण",
-            "suggestions": "सुझाव",
-            "documentaries": "डॉक्यूमेंटरी",
-            "analysis": "विश्लेषण",
-            "start": "शुरू करें",
-            "next_level_locked": "इस स्तर को अनलॉक करने के लिए पिछले स्तर को पूरा करें।",
-            "onboard_title": "शुरू करने के लिए 5 त्वरित कदम"
-        }
-    }
+        if cursor:
+            query = query.filter(db.tuple_(model.created_at, model.id) < cursor)
+        rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(BROWSE_PAGE_SIZE + 1).all()
+
+        next_cursor = None
+        if len(rows) > BROWSE_PAGE_SIZE:
+            rows = rows[:BROWSE_PAGE_SIZE]
+            next_cursor = f"{rows[-1].created_at.isoformat()}_{rows[-1].id}"
+
+        return render_template(
+            "admin_browse.html",
+            view=view,
+            rows=rows,
+            filters=filters,
+            next_cursor=next_cursor,
+            is_first_page=cursor is None,
+            page_size=BROWSE_PAGE_SIZE
+        )
+
+    # --------------------------
+    # Admin Analytics (materialized views)
+    # --------------------------
+    @app.route("/admin/analytics")
+    @admin_required
+    def admin_analytics():
+        """
+        Cohort analytics read from the materialized views in analytics.py,
+        so the page costs a handful of small reads however many responses
+        there are. With ANALYTICS_MAX_AGE set, stale views are refreshed in
+        the background and the current numbers are shown meanwhile.
+        """
+        if not analytics.views_exist():
+            return render_template("admin_analytics.html", data=None, dimensions=analytics.DIMENSIONS)
+
+        data = analytics.load()
+        max_age = app.config.get("ANALYTICS_MAX_AGE")
+        refreshed_at = data["meta"]["refreshed_at"] if data["meta"] else None
+        # SQLite's CURRENT_TIMESTAMP is naive UTC; PostgreSQL's now() is aware
+        now = datetime.now(refreshed_at.tzinfo) if refreshed_at and refreshed_at.tzinfo else datetime.utcnow()
+        if max_age and (refreshed_at is None or (now - refreshed_at).total_seconds() > max_age):
+            analytics.refresh_in_background(app)
+
+        return render_template("admin_analytics.html", data=data, dimensions=analytics.DIMENSIONS)
+
+    @app.route("/admin/analytics/refresh", methods=["POST"])
+    @admin_required
+    def admin_analytics_refresh():
+        seconds = analytics.refresh_views()
+        flash(f"Analytics refreshed in {seconds:.1f}s.", "success")
+        return redirect(url_for("admin_analytics"))
+
+    # --------------------------
+    # Admin Export (streaming CSV / Parquet)
+    # --------------------------
+    @app.route("/admin/export")
+    @admin_required
+    def admin_export():
+        """
+        Without ?format= the export form; with it, users joined with their
+        responses streamed as CSV or Parquet (?columns=a,b,c to choose).
+        """
+        fmt = request.args.get("format")
+        if not fmt:
+            return render_template(
+                "admin_export.html",
+                columns=export.COLUMNS,
+                default_columns=export.DEFAULT_COLUMNS,
+                parquet_available=export.pa is not None
+            )
+        if fmt not in export.FORMATS or (fmt == "parquet" and export.pa is None):
+            abort(400, f"Unsupported export format {fmt!r}.")
+        try:
+            columns = export.parse_columns(",".join(request.args.getlist("columns")))
+        except ValueError as e:
+            abort(400, str(e))
+
+        stream = export.stream_csv if fmt == "csv" else export.stream_parquet
+        filename = f"msme_nze_export_{datetime.utcnow():%Y%m%d_%H%M}.{fmt}"
+        return app.response_class(
+            stream(db.engine, columns),
+            mimetype=export.FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+
+    # --------------------------
+    # Admin Bulk Scoring (offline assessments)
+    # --------------------------
+    @app.route("/admin/bulk-score", methods=["GET", "POST"])
+    @admin_required
+    def admin_bulk_score():
+        """
+        Upload a CSV/JSONL of offline assessments (see bulk_scoring.py);
+        the responses are saved and the per-level scores come back as CSV.
+        """
+        if request.method == "GET":
+            return render_template("admin_bulk_score.html")
+
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Choose a CSV or JSONL file.", "danger")
+            return redirect(url_for("admin_bulk_score"))
+
+        fmt = "jsonl" if upload.filename.lower().endswith((".jsonl", ".json")) else "csv"
+        try:
+            columns = bulk_scoring.read_columns(
+                io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline=""), fmt
+            )
+            result = bulk_scoring.score_batch(
+                columns,
+                create_users=bool(request.form.get("create_users")),
+                dry_run=bool(request.form.get("dry_run")),
+                log=app.logger.info
+            )
+        except (bulk_scoring.BatchError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            flash(f"Could not score {upload.filename}: {e}", "danger")
+            return redirect(url_for("admin_bulk_score"))
+
+        out = io.StringIO()
+        bulk_scoring.write_results(out, result["results"])
+        return app.response_class(
+            out.getvalue(),
+            mimetype="text/csv",
+            headers={
+                "Content-Disposition": "attachment; filename=scores.csv",
+                "X-Responses-Saved": "0" if request.form.get("dry_run") else str(result["responses"]),
+                "X-Unknown-Answers": str(len(result["unknown_answers"])),
+            }
+        )
 
-    # Load questions
-    with open(os.path.join(os.path.dirname(__file__), "questionnaire.json"), "r", encoding="utf-8") as f:
-        QUESTION_BANK = json.load(f)
+    # --------------------------
+    # Admin Profiling (PROFILING=true, see profiling.py)
+    # --------------------------
+    @app.route("/admin/profiling")
+    @admin_required
+    def admin_profiling():
+        """Per-route timings and SQL counts, recent slow requests and profiler dumps of this process."""
+        return render_template(
+            "admin_profiling.html",
+            enabled=app.config.get("PROFILING"),
+            data=profiling.snapshot(),
+            profiles=profiling.list_profiles(app)
+        )
+
+    @app.route("/admin/profiling/reset", methods=["POST"])
+    @admin_required
+    def admin_profiling_reset():
+        profiling.reset()
+        flash("Profiling statistics cleared.", "success")
+        return redirect(url_for("admin_profiling"))
+
+    @app.route("/admin/profiling/dumps/<name>")
+    @admin_required
+    def admin_profiling_dump(name):
+        """A cProfile dump as text (?download=1 for the .prof file), or a pyinstrument page."""
+        path = profiling.profile_path(app, name)
+        if path is None:
+            abort(404)
+        if name.endswith(".html") or request.args.get("download"):
+            return send_file(path, as_attachment=name.endswith(".prof"))
+        return app.response_class(profiling.profile_stats(path), mimetype="text/plain")
 
-    CATEGORIES_AS_LEVELS = {str(k): v for k, v in QUESTION_BANK.get("categories_as_levels", {}).items()}
-    LEVELS = QUESTION_BANK.get("levels", {})
 
     # ----------------------------------------------------------------------
     # Helper Functions
@@ -159,21 +428,129 @@ def register_routes(app):
             return current_user.language
         return session.get("lang", "en")
 
-    def compute_level_maturity_from_percent(pct):
-        if pct >= 75: return 4
-        if pct >= 50: return 3
-        if pct >= 25: return 2
-        return 1
+    def user_state_version():
+        """Changes with every response the user submits (the score summary is updated with it)."""
+        summary = get_summary(current_user.id)
+        # A summary rebuilt on the fly (none stored yet) has no updated_at
+        return summary.updated_at or summary.attempts
 
     def level_name(level_int):
         return LEVELS.get(str(level_int), f"Level {level_int}")
 
-    def get_next_attempt_number(user_id):
-        last_attempt = db.session.query(db.func.max(Response.attempt_number)).filter_by(user_id=user_id).scalar()
-        if not last_attempt:
-            return 1
-        level_count = Response.query.filter_by(user_id=user_id, attempt_number=last_attempt).count()
-        return last_attempt if level_count < 4 else last_attempt + 1
+    def response_summary(response_id):
+        """The stored "_summary" of a response, or {}."""
+        if response_id is None:
+            return {}
+        summary = db.session.query(Response.summary).filter(Response.id == response_id).scalar()
+        return summary if isinstance(summary, dict) else {}
+
+    def response_summaries(response_ids):
+        """The "_summary" of several responses, in one query."""
+        if not response_ids:
+            return []
+        rows = dict(db.session.query(Response.id, Response.summary).filter(Response.id.in_(response_ids)))
+        return [rows.get(i) if isinstance(rows.get(i), dict) else {} for i in response_ids]
+
+    def best_level_score(level, default_max):
+        """
+        (score, max_score, response_id) of the current user's best response
+        for a level; response_id is None when the level was never submitted.
+        """
+        best = get_summary(current_user.id).best_scores.get(str(level))
+        if not best:
+            return 0, default_max, None
+        max_score = best["score_max"] if best["score_max"] is not None else default_max
+        return best["score"], max_score, best["response_id"]
+
+    def latest_attempt_scores():
+        """
+        (total_score, total_max_score, level_scores, response_ids) of the
+        current user's latest attempt, or None when nothing has been
+        submitted yet.
+        """
+        summary = get_summary(current_user.id)
+        if not summary.latest_attempt:
+            return None
+        levels = summary.attempts[str(summary.latest_attempt)]["levels"]
+
+        total_score = 0
+        total_max_score = TOTAL_MAX_SCORE
+        level_scores = {}
+        for level, max_score in LEVEL_MAX_SCORES.items():
+            level_score = levels.get(str(level), {}).get("score", 0)
+            total_score += level_score
+            level_scores[level] = {
+                "score": level_score,
+                "max_score": max_score,
+                "percentage": (level_score / max_score * 100) if max_score else 0
+            }
+        response_ids = [entry["response_id"] for entry in levels.values()]
+        return total_score, total_max_score, level_scores, response_ids
+
+    def suggestions_or_stream(engine, args, fallback, compose=None):
+        """
+        Return (suggestions_html, stream_url) for a suggestion page.
+
+        With SUGGESTION_MODE = "compositional" the page is assembled by
+        compose(lang=..., budget=...) from per-answer snippets instead of
+        one whole-page generation.
+
+        Otherwise a cached answer is rendered straight away. While the LLM
+        circuit breaker is open the local fallback() Markdown is used
+        instead. With SUGGESTION_STREAMING on, the page shell is sent
+        without suggestions and the text follows over
+        /suggestions/stream/<engine>; without streaming we wait at most
+        SUGGESTION_LATENCY_BUDGET seconds before serving the fallback (the
+        LLM answer still lands in the cache for the next visit).
+
+        The rendered HTML of a final LLM answer is kept in the page cache
+        until the user's next response.
+        """
+        mode = app.config.get("SUGGESTION_MODE")
+        fragment_key = page_cache.make_key(
+            f"suggestions/{engine}", current_language(), current_user.id,
+            (user_state_version(), mode, args)
+        )
+        suggestions_html = page_cache.get(fragment_key)
+        if suggestions_html is not None:
+            return suggestions_html, None
+
+        raw_suggestions = None
+        # Only whole-page LLM answers are final; fallback text and composed
+        # pages with curated stand-ins improve on a later visit
+        cacheable = True
+        if compose is not None and mode == "compositional":
+            cacheable = False
+            raw_suggestions = compose(
+                lang=current_language(), budget=app.config.get("SUGGESTION_LATENCY_BUDGET", 8)
+            )
+            if raw_suggestions is None:
+                raw_suggestions = fallback()
+        if raw_suggestions is None:
+            raw_suggestions = engine_registry.cached(engine, *args)
+        if raw_suggestions is None:
+            if engine_registry.breaker_open(engine):
+                raw_suggestions = fallback()
+                cacheable = False
+            elif app.config.get("SUGGESTION_STREAMING"):
+                return "", url_for("suggestions_stream", engine=engine)
+            else:
+                results, errors = engine_registry.generate_many(
+                    {engine: (engine, args)}, timeout=app.config.get("SUGGESTION_LATENCY_BUDGET", 8)
+                )
+                raw_suggestions = results[engine]
+                if not raw_suggestions:
+                    raw_suggestions = fallback()
+                    cacheable = False
+
+        # Convert Markdown → HTML
+        suggestions_html = markdown.markdown(
+            raw_suggestions,
+            extensions=["extra"]
+        )
+        if cacheable:
+            page_cache.put(fragment_key, suggestions_html)
+        return suggestions_html, None
 
     # ======================================================================
     # USER REGISTRATION
@@ -255,7 +632,9 @@ def register_routes(app):
             current_user.step4 = request.form.get("step4")
             current_user.step5 = request.form.get("step5")
             current_user.onboard_complete = True
+            user_id = current_user.id
             db.session.commit()
+            user_cache.invalidate(user_id)
             flash("Onboarding complete!", "success")
             return redirect(url_for("home"))
 
@@ -270,21 +649,7 @@ def register_routes(app):
         t = TRANSLATIONS[current_language()]
         lang = current_language()
 
-        responses = Response.query.filter_by(user_id=current_user.id).all()
-        final_level = None
-
-        if responses:
-            best_scores = {}
-            for r in responses:
-                if r.level not in best_scores or r.score > best_scores[r.level]:
-                    best_scores[r.level] = r.score
-            total_best_score = sum(best_scores.values())
-            final_level = (
-                1 if total_best_score <= 9 else
-                2 if total_best_score <= 18 else
-                3 if total_best_score <= 27 else
-                4
-            )
+        final_level = get_summary(current_user.id).final_level
 
         return render_template("home.html",
                                translations=t,
@@ -301,7 +666,9 @@ def register_routes(app):
             session['lang'] = lang
             if current_user.is_authenticated:
                 current_user.language = lang
+                user_id = current_user.id
                 db.session.commit()
+                user_cache.invalidate(user_id)
         return redirect(request.referrer or url_for("home"))
 
     # ======================================================================
@@ -309,6 +676,7 @@ def register_routes(app):
     # ======================================================================
     @app.route("/profile")
     @login_required
+    @page_cache.cached_page(profile_page)
     def profile():
         t = TRANSLATIONS.get(current_language(), TRANSLATIONS['en'])
         return render_template("profile.html", translations=t)
@@ -328,42 +696,19 @@ def register_routes(app):
     def questionnaire_index():
         t = TRANSLATIONS.get(current_language(), TRANSLATIONS['en'])
 
-        current_attempt = get_next_attempt_number(current_user.id)
-        session['current_attempt'] = current_attempt
-
-        completed_levels = {
-            r.level for r in Response.query.filter_by(
-                user_id=current_user.id,
-                attempt_number=current_attempt
-            ).all()
-        }
-
-        levels_unlocked = [1]
-        for lvl in range(2, 5):
-            if (lvl - 1) in completed_levels:
-                levels_unlocked.append(lvl)
-            else:
-                break
-
-        session['levels_unlocked'] = levels_unlocked
+        state = get_attempt_state(current_user.id)
+        current_attempt = state.current_attempt
 
         # Only flash "new attempt" message once
         new_attempt_flash_key = f"new_attempt_flash_{current_user.id}_{current_attempt}"
-        if not session.get(new_attempt_flash_key):
-            last_attempt = current_attempt - 1
-            if last_attempt >= 1:
-                last_count = Response.query.filter_by(
-                    user_id=current_user.id,
-                    attempt_number=last_attempt
-                ).count()
-                if last_count == 4:
-                    flash(f"Starting new attempt #{current_attempt}", "info")
-                    session[new_attempt_flash_key] = True
+        if not session.get(new_attempt_flash_key) and state.previous_complete:
+            flash(f"Starting new attempt #{current_attempt}", "info")
+            session[new_attempt_flash_key] = True
 
         return render_template("questionnaire_index.html",
                             translations=t,
-                            completed_levels=completed_levels,
-                            levels_unlocked=levels_unlocked,
+                            completed_levels=state.completed_levels,
+                            levels_unlocked=state.levels_unlocked,
                             categories_as_levels=CATEGORIES_AS_LEVELS,
                             levels=LEVELS,
                             current_lang=current_language())
@@ -380,101 +725,31 @@ def register_routes(app):
             flash("Invalid level.", "danger")
             return redirect(url_for("questionnaire_index"))
 
-        current_attempt = session.get('current_attempt') or get_next_attempt_number(current_user.id)
-        levels_unlocked = session.get('levels_unlocked', [1])
+        state = get_attempt_state(current_user.id)
+        current_attempt = state.current_attempt
 
-        if level not in levels_unlocked:
+        if level not in state.levels_unlocked:
             flash(TRANSLATIONS[current_language()]['next_level_locked'], "warning")
             return redirect(url_for("questionnaire_index"))
 
-        questions = CATEGORIES_AS_LEVELS[level_str]["questions"]
-
         if request.method == "POST":
-            total_score = 0.0
-            total_min_score = 0.0
-            total_max_score = 0.0
-            fulfilled_attributes = 0
-            total_attributes_in_level = 0
-
-            details_dict = {}
-            parameter_map = {}
-
-            for q in questions:
-                qid = q.get("id")
-                ans_key = request.form.get(f"q_{qid}", "").strip()
-
-                question_parameter = q.get("parameter", q.get("category", "General"))
-                parameter_map.setdefault(question_parameter, {
-                    "total": 0, "score": 0.0, "min": 0.0, "max": 0.0, "questions": []
-                })
-
-                parameter_map[question_parameter]["total"] += 1
-                total_attributes_in_level += 1
-
-                options = q.get("options", {})
-                option_scores = [
-                    float(opt.get("score", 0.0)) if isinstance(opt, dict) else float(opt)
-                    for opt in options.values()
-                ] if options else [0.0]
-
-                q_min = min(option_scores)
-                q_max = max(option_scores)
-                total_min_score += q_min
-                total_max_score += q_max
-
-                selected_score = 0.0
-                if ans_key in options:
-                    opt_val = options[ans_key]
-                    selected_score = float(opt_val.get("score", 0.0)) if isinstance(opt_val, dict) else float(opt_val)
-
-                total_score += selected_score
-                parameter_map[question_parameter]["score"] += selected_score
-                parameter_map[question_parameter]["min"] += q_min
-                parameter_map[question_parameter]["max"] += q_max
-
-                if selected_score > 0:
-                    fulfilled_attributes += 1
-
-                parameter_map[question_parameter]["questions"].append({
-                    "id": qid,
-                    "text": q.get("text"),
-                    "selected": ans_key,
-                    "selected_score": selected_score,
-                    "options": options
-                })
-
-            percent_of_level = (total_score / total_max_score * 100) if total_max_score > 0 else 0.0
-            level_maturity = compute_level_maturity_from_percent(percent_of_level)
-
-            details_dict["_summary"] = {
-                "level": level,
-                "score_total": total_score,
-                "score_min": total_min_score,
-                "score_max": total_max_score,
-                "percent_of_level": percent_of_level,
-                "fulfilled_attributes": fulfilled_attributes,
-                "total_attributes": total_attributes_in_level,
-                "parameter_summary": parameter_map,
-                "submitted_at": datetime.utcnow().isoformat() + "Z"
-            }
+            total_score, level_maturity, details_dict = score_level(level, request.form)
+            total_max_score = details_dict["_summary"]["score_max"]
 
             response = Response(
                 user_id=current_user.id,
                 level=level,
                 score=total_score,
                 maturity_level=level_maturity,
-                details=json.dumps(details_dict),
+                details=details_dict,
                 attempt_number=current_attempt
             )
 
             db.session.add(response)
+            record_response(response, total_max_score)
             db.session.commit()
-
-            if level < 4:
-                unlocked = session.get('levels_unlocked', [1])
-                if level + 1 not in unlocked:
-                    unlocked.append(level + 1)
-                session['levels_unlocked'] = unlocked
+            invalidate_attempt_state(current_user.id)
+            page_cache.invalidate_user(current_user.id)
 
             flash(f"Level {level} completed. Score: {total_score})",
                   "success")
@@ -493,19 +768,14 @@ def register_routes(app):
     @app.route("/start_new_attempt")
     @login_required
     def start_new_attempt():
-        next_attempt = get_next_attempt_number(current_user.id)
-        last_count = Response.query.filter_by(
-            user_id=current_user.id,
-            attempt_number=next_attempt - 1
-        ).count()
-
-        if next_attempt > 1 and last_count < 4:
+        state = get_attempt_state(current_user.id)
+        if not state.can_start_new:
             flash("Finish all levels before starting a new attempt.", "warning")
             return redirect(url_for("performance"))
 
-        flash(f"Starting new attempt #{next_attempt}", "info")
-        session['current_attempt'] = next_attempt
-        session['levels_unlocked'] = [1]
+        flash(f"Starting new attempt #{state.current_attempt}", "info")
+        # The index page would otherwise flash the same message again
+        session[f"new_attempt_flash_{current_user.id}_{state.current_attempt}"] = True
         return redirect(url_for("questionnaire_index"))
 
     # --------------------------
@@ -516,9 +786,7 @@ def register_routes(app):
     def performance():
         t = TRANSLATIONS.get(current_language(), TRANSLATIONS['en'])
 
-        responses = Response.query.filter_by(
-            user_id=current_user.id
-        ).order_by(Response.attempt_number, Response.level).all()
+        attempts = get_summary(current_user.id).attempts
 
         LEVEL_GROUP_NAMES = {
             1: "Awareness",
@@ -528,21 +796,20 @@ def register_routes(app):
         }
 
         grouped_by_attempt = {}
-        for r in responses:
-            att = r.attempt_number or 1
-            grouped_by_attempt.setdefault(att, [])
-
-            details = json.loads(r.details) if r.details else {}
-            score_max = details.get("_summary", {}).get("score_max", r.score)
-
-            grouped_by_attempt[att].append({
-                "id": r.id,
-                "level": r.level,
-                "group_name": LEVEL_GROUP_NAMES.get(r.level, f"Level {r.level}"),
-                "score": r.score,
-                "score_max": score_max,
-                "level_label": level_name(r.level)
-            })
+        for att in sorted(attempts, key=int):
+            grouped_by_attempt[int(att)] = []
+            for level_str, entry in sorted(attempts[att]["levels"].items(), key=lambda item: int(item[0])):
+                level = int(level_str)
+                score_max = entry["score_max"] if entry["score_max"] is not None else entry["score"]
+
+                grouped_by_attempt[int(att)].append({
+                    "id": entry["response_id"],
+                    "level": level,
+                    "group_name": LEVEL_GROUP_NAMES.get(level, f"Level {level}"),
+                    "score": entry["score"],
+                    "score_max": score_max,
+                    "level_label": level_name(level)
+                })
 
         last_attempt = max(grouped_by_attempt.keys()) if grouped_by_attempt else 0
         start_new_enabled = (len(grouped_by_attempt.get(last_attempt, [])) == 4) if last_attempt else True
@@ -551,6 +818,7 @@ def register_routes(app):
                                translations=t,
                                grouped_by_attempt=grouped_by_attempt,
                                start_new_enabled=start_new_enabled,
+                               final_maturity_level=final_maturity_level,
                                lang=current_language())
 
     # --------------------------
@@ -601,40 +869,18 @@ def register_routes(app):
         """
         Reusable function to render suggestions for a specific level.
         """
-        translations = {
-            "home_title": "Home",
-            "questionnaire": "Questionnaire",
-            "performance": "Performance",
-            "performance_insights": "Performance Insights",
-            "suggestions": "Suggestions",
-            "profile": "Profile"
-        }
-        # Get the latest response for this user and level
-        last_response = Response.query.filter_by(user_id=current_user.id, level=level)\
-                        .order_by(Response.score.desc()).first()
-
-        if last_response:
-            score = last_response.score
-            try:
-                max_score = json.loads(last_response.details)["_summary"]["score_max"]
-            except (KeyError, TypeError, json.JSONDecodeError):
-                max_score = 7  # default max score
-        else:
-            score = 0
-            max_score = 7  # default max score
+        translations = NAV_TRANSLATIONS
+        # Get the best response for this user and level
+        score, max_score, best = best_level_score(level, 7)  # default max score 7
 
         # Calculate percentage
         percentage = (score / max_score * 100) if max_score else 0
-        import markdown
-        # Generate AI-based personalized suggestions
-        raw_suggestions = generate_dynamic_suggestion(score, max_score)
-
-        # Convert Markdown → HTML
-        suggestions_html = markdown.markdown(
-           raw_suggestions,
-           extensions=["extra"]
+        # Generate AI-based personalized suggestions (or stream them)
+        suggestions_html, stream_url = suggestions_or_stream(
+            "awareness_engagement", (score, max_score),
+            lambda: fallback_level_suggestion(score, max_score, response_summary(best), lang=current_language()),
+            compose=lambda **kw: compose_level_suggestion(response_summary(best), **kw)
         )
-        #suggestions_text = generate_dynamic_suggestion(score, max_score)
 
         # Render template
         return render_template(
@@ -643,6 +889,7 @@ def register_routes(app):
             max_score=max_score,
             percentage=percentage,
             suggestions=suggestions_html,
+            stream_url=stream_url,
             level_name=level_name,
             translations=translations
         )
@@ -659,34 +906,16 @@ def register_routes(app):
         """
         Render suggestions for Knowledge & Capabilities level using suggestion_engine1.py
         """
-        translations = {
-            "home_title": "Home",
-            "questionnaire": "Questionnaire",
-            "performance": "Performance",
-            "performance_insights": "Performance Insights",
-            "suggestions": "Suggestions",
-            "profile": "Profile"
-        }
-
-        # Get latest response for this user and level
-        last_response = Response.query.filter_by(user_id=current_user.id, level=level)\
-                                    .order_by(Response.score.desc()).first()
+        translations = NAV_TRANSLATIONS
 
-        if last_response:
-            score = last_response.score
-            try:
-                max_score = json.loads(last_response.details)["_summary"]["score_max"]
-            except (KeyError, TypeError, json.JSONDecodeError):
-                max_score = 13  # default max score
-        else:
-            score = 0
-            max_score = 13
+        # Get best response for this user and level
+        score, max_score, best = best_level_score(level, 13)  # default max score 13
         percentage = (score / max_score * 100) if max_score else 0
 
-        raw_suggestions = generate_dynamic_suggestion_knowledge(score, max_score)
-        suggestions_html = markdown.markdown(
-           raw_suggestions,
-           extensions=["extra"]
+        suggestions_html, stream_url = suggestions_or_stream(
+            "knowledge_capabilities", (score, max_score),
+            lambda: fallback_level_suggestion(score, max_score, response_summary(best), lang=current_language()),
+            compose=lambda **kw: compose_level_suggestion(response_summary(best), **kw)
         )
 
         return render_template(
@@ -695,6 +924,7 @@ def register_routes(app):
             max_score=max_score,
             percentage=percentage,
             suggestions=suggestions_html,
+            stream_url=stream_url,
             level_name=level_name,
             translations=translations
         )
@@ -716,33 +946,15 @@ def register_routes(app):
         """
         Render suggestions for Planning & Strategies level using suggestion_engine2.py
         """
-        translations = {
-            "home_title": "Home",
-            "questionnaire": "Questionnaire",
-            "performance": "Performance",
-            "performance_insights": "Performance Insights",
-            "suggestions": "Suggestions",
-            "profile": "Profile"
-        }
+        translations = NAV_TRANSLATIONS
 
-        last_response = Response.query.filter_by(user_id=current_user.id, level=level)\
-                                    .order_by(Response.score.desc()).first()
-
-        if last_response:
-            score = last_response.score
-            try:
-                max_score = json.loads(last_response.details)["_summary"]["score_max"]
-            except (KeyError, TypeError, json.JSONDecodeError):
-                max_score = 6
-        else:
-            score = 0
-            max_score = 6
+        score, max_score, best = best_level_score(level, 6)
 
         percentage = (score / max_score * 100) if max_score else 0
-        raw_suggestions = generate_dynamic_suggestion_planning(score, max_score)
-        suggestions_html = markdown.markdown(
-            raw_suggestions,
-            extensions=["extra"]
+        suggestions_html, stream_url = suggestions_or_stream(
+            "planning_strategies", (score, max_score),
+            lambda: fallback_level_suggestion(score, max_score, response_summary(best), lang=current_language()),
+            compose=lambda **kw: compose_level_suggestion(response_summary(best), **kw)
         )
 
         return render_template(
@@ -751,6 +963,7 @@ def register_routes(app):
             max_score=max_score,
             percentage=percentage,
             suggestions=suggestions_html,
+            stream_url=stream_url,
             level_name=level_name,
             translations=translations
         )
@@ -772,35 +985,16 @@ def register_routes(app):
         """
         Render suggestions for Action & Sustainability Strategies level using suggestion_engine3.py
         """
-        translations = {
-           "home_title": "Home",
-            "questionnaire": "Questionnaire",
-            "performance": "Performance",
-            "performance_insights": "Performance Insights",
-            "suggestions": "Suggestions",
-            "profile": "Profile"
-            }
+        translations = NAV_TRANSLATIONS
 
-        last_response = Response.query.filter_by(user_id=current_user.id, level=level) \
-                      .order_by(Response.score.desc()).first()
-
-        if last_response:
-            score = last_response.score
-            try:
-               max_score = json.loads(last_response.details)["_summary"]["score_max"]
-            except (KeyError, TypeError, json.JSONDecodeError):
-               max_score = 10
-        else:
-            score = 0
-            max_score = 10
+        score, max_score, best = best_level_score(level, 10)
 
         percentage = (score / max_score * 100) if max_score else 0
 
-        from suggestion_engine3 import generate_dynamic_suggestion_advanced
-        raw_suggestions = generate_dynamic_suggestion_advanced(score, max_score)
-        suggestions_html = markdown.markdown(
-            raw_suggestions,
-            extensions=["extra"]
+        suggestions_html, stream_url = suggestions_or_stream(
+            "action_strategies", (score, max_score),
+            lambda: fallback_level_suggestion(score, max_score, response_summary(best), lang=current_language()),
+            compose=lambda **kw: compose_level_suggestion(response_summary(best), **kw)
         )
 
         return render_template(
@@ -809,6 +1003,7 @@ def register_routes(app):
             max_score=max_score,
             percentage=percentage,
             suggestions=suggestions_html,
+            stream_url=stream_url,
             level_name=level_name,
             translations=translations
        )
@@ -816,61 +1011,28 @@ def register_routes(app):
     @app.route("/suggestions/overall")
     @login_required	
     def suggestions_overall():
-        translations = {
-            "home_title": "Home",
-            "questionnaire": "Questionnaire",
-            "performance": "Performance",
-            "performance_insights": "Performance Insights",
-            "suggestions": "Suggestions",
-            "profile": "Profile"
-        }
-        level_max_scores = {1: 7,2: 13,3: 6,4: 10}
-        latest_attempt=(
-            db.session.query(Response.attempt_number)
-            .filter(Response.user_id == current_user.id)
-            .order_by(Response.attempt_number.desc())
-            .first()
-        )
-        if not latest_attempt:
+        translations = NAV_TRANSLATIONS
+        scores = latest_attempt_scores()
+        if not scores:
             return render_template(
                 "suggestion_total_score.html",
                 total_score=0,
-                total_max_score=sum(level_max_scores.values()),
+                total_max_score=TOTAL_MAX_SCORE,
                 overall_percentage=0,
                 level_scores={},
                 suggestions="No data available",
                 translations=translations
             )
-        latest_attempt=latest_attempt[0]
-
-        responses=Response.query.filter_by(
-            user_id=current_user.id,
-            attempt_number=latest_attempt
-        ).all()
+        total_score, total_max_score, level_scores_details, response_ids = scores
 
-        total_score = 0
-        total_max_score = sum(level_max_scores.values())
-        level_scores_details = {}
-        for level, max_score in level_max_scores.items():
-            level_score=sum(
-                r.score for r in responses if r.level == level
-            )
-            total_score += level_score
-            level_scores_details[level] = {
-                "score": level_score,
-                "max_score": max_score,
-                "percentage": (level_score / max_score * 100) if max_score else 0
-            }
         overall_percentage = (total_score / total_max_score * 100) if total_max_score else 0
-        raw_suggestions = generate_total_suggestion(
-            total_score,
-            total_max_score
-        )
-        suggestions_html = markdown.markdown(
-            raw_suggestions,
-            extensions=["extra"]
+        suggestions_html, stream_url = suggestions_or_stream(
+            "total", (total_score, total_max_score),
+            lambda: fallback_total_suggestion(
+                total_score, total_max_score, response_summaries(response_ids), lang=current_language()
+            ),
+            compose=lambda **kw: compose_total_suggestion(response_summaries(response_ids), **kw)
         )
-        #suggestions_text = generate_total_suggestion(total_score, total_max_score)
         return render_template(
             "suggestions_total_score.html",
             total_score=total_score,
@@ -878,18 +1040,152 @@ def register_routes(app):
             overall_percentage=overall_percentage,
             level_scores=level_scores_details,
             suggestions=suggestions_html,
+            stream_url=stream_url,
             translations=translations
         )
+
+    # --------------------------
+    # All-in-one Suggestion Report
+    # --------------------------
+    REPORT_SECTIONS = [
+        (1, "Awareness & Engagement", "awareness_engagement"),
+        (2, "Knowledge & Capabilities", "knowledge_capabilities"),
+        (3, "Planning & Strategies", "planning_strategies"),
+        (4, "Action & Strategies", "action_strategies"),
+    ]
+
+    @app.route("/suggestions/report")
+    @login_required
+    def suggestions_report():
+        """
+        Every level's suggestions plus the overall roadmap on one page.
+        The five engines run in parallel, so the page takes as long as the
+        slowest call; a failed or late engine falls back to the local
+        suggestions in its own section only.
+        """
+        translations = NAV_TRANSLATIONS
+
+        # Compositional mode assembles sections from snippets below instead
+        compositional = app.config.get("SUGGESTION_MODE") == "compositional"
+        jobs = {}
+        sections = []
+        for level, name, engine in REPORT_SECTIONS:
+            score, max_score, best = best_level_score(level, LEVEL_MAX_SCORES[level])
+            if not compositional and not engine_registry.breaker_open(engine):
+                jobs[engine] = (engine, (score, max_score))
+            sections.append({
+                "engine": engine,
+                "name": name,
+                "score": score,
+                "max_score": max_score,
+                "response": best,
+                "percentage": (score / max_score * 100) if max_score else 0
+            })
+
+        scores = latest_attempt_scores()
+        if scores:
+            total_score, total_max_score, level_scores_details, response_ids = scores
+            if not compositional and not engine_registry.breaker_open("total"):
+                jobs["total"] = ("total", (total_score, total_max_score))
+        else:
+            total_score, total_max_score, level_scores_details, response_ids = 0, TOTAL_MAX_SCORE, {}, []
+
+        results, errors = engine_registry.generate_many(
+            jobs, timeout=app.config.get("SUGGESTION_REPORT_TIMEOUT", 45)
+        )
+        for engine, error in errors.items():
+            app.logger.warning("Suggestion report: %s failed: %r", engine, error)
+
+        def to_html(raw):
+            return markdown.markdown(raw, extensions=["extra"]) if raw else None
+
+        lang = current_language()
+        budget = app.config.get("SUGGESTION_LATENCY_BUDGET", 8)
+        for section in sections:
+            raw = results.get(section["engine"])
+            if raw is None:
+                summary = response_summary(section["response"])
+                if compositional:
+                    raw = compose_level_suggestion(summary, lang=lang, budget=budget)
+                raw = raw or fallback_level_suggestion(section["score"], section["max_score"], summary, lang=lang)
+            section["suggestions"] = to_html(raw)
+        total_suggestions = None
+        if scores:
+            raw = results.get("total")
+            if raw is None:
+                summaries = response_summaries(response_ids)
+                if compositional:
+                    raw = compose_total_suggestion(summaries, lang=lang, budget=budget)
+                raw = raw or fallback_total_suggestion(total_score, total_max_score, summaries, lang=lang)
+            total_suggestions = to_html(raw)
+
+        return render_template(
+            "suggestions_report.html",
+            sections=sections,
+            total_score=total_score,
+            total_max_score=total_max_score,
+            overall_percentage=(total_score / total_max_score * 100) if total_max_score else 0,
+            level_scores=level_scores_details,
+            total_suggestions=total_suggestions,
+            has_total=bool(scores),
+            translations=translations
+        )
+
+    # --------------------------
+    # Suggestion Streaming (Server-Sent Events)
+    # --------------------------
+    LEVEL_STREAMS = {
+        "awareness_engagement": (1, 7, stream_dynamic_suggestion),
+        "knowledge_capabilities": (2, 13, stream_dynamic_suggestion_knowledge),
+        "planning_strategies": (3, 6, stream_dynamic_suggestion_planning),
+        "action_strategies": (4, 10, stream_dynamic_suggestion_advanced),
+    }
+
+    @app.route("/suggestions/stream/<engine>")
+    @login_required
+    def suggestions_stream(engine):
+        """
+        Stream one suggestion engine's output as Server-Sent Events.
+        Scores are looked up again here rather than taken from the URL.
+        """
+        # Summaries are read up front: the session is gone once streaming starts
+        lang = current_language()
+        if engine in LEVEL_STREAMS:
+            level, default_max, stream = LEVEL_STREAMS[engine]
+            score, max_score, best = best_level_score(level, default_max)
+            args = (score, max_score)
+            summary = response_summary(best)
+            fallback = lambda: fallback_level_suggestion(score, max_score, summary, lang=lang)
+        elif engine == "total":
+            scores = latest_attempt_scores()
+            if not scores:
+                abort(404)
+            total_score, total_max_score, _, response_ids = scores
+            stream = stream_total_suggestion
+            args = (total_score, total_max_score)
+            summaries = response_summaries(response_ids)
+            fallback = lambda: fallback_total_suggestion(total_score, total_max_score, summaries, lang=lang)
+        else:
+            abort(404)
+
+        # While the upstream is down skip it and serve the fallback at once
+        chunks = iter(()) if engine_registry.breaker_open(engine) else stream(*args)
+
+        return app.response_class(
+            stream_with_context(sse_markdown(
+                chunks,
+                fallback=fallback,
+                budget=app.config.get("SUGGESTION_LATENCY_BUDGET", 8),
+                app=app
+            )),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
     @app.route('/tips-resources')
+    @page_cache.cached_page(visitor_page)
     def tips_resources():
-        translations = {
-            "home_title": "Home",
-            "questionnaire": "Questionnaire",
-            "performance": "Performance",
-            "performance_insights": "Performance Insights",
-            "suggestions": "Suggestions",
-            "profile": "Profile"
-        }
+        translations = NAV_TRANSLATIONS
         return render_template('tips_resources.html',
                                translations=translations)
         
@@ -899,19 +1195,27 @@ def register_routes(app):
     # Suggestions Dashboard
     @app.route("/suggestions")
     @login_required
+    @page_cache.cached_page(visitor_page)
     def suggestions():
         """
         Main suggestions dashboard showing all 4 levels and extra cards.
         """
-        # Example: define translations (or import them from your translations module)
-        translations = {
-            "home_title": "Home",
-            "questionnaire": "Questionnaire",
-            "performance": "Performance",
-            "performance_insights": "Performance Insights",
-            "suggestions": "Suggestions",
-            "profile": "Profile"
-        }
+        translations = NAV_TRANSLATIONS
 
         return render_template("suggestions.html", translations=translations)
 
+    # --------------------------
+    # Prometheus Metrics
+    # --------------------------
+    @app.route("/metrics")
+    def metrics_endpoint():
+        """
+        LLM latency, token, error/retry and cache counters for this process
+        (and, with PROFILING on, per-route request timings and SQL counts)
+        in Prometheus text format. Set METRICS_TOKEN to require
+        "Authorization: Bearer <token>".
+        """
+        token = app.config.get("METRICS_TOKEN")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            abort(403)
+        return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,150 @@
+# score_summary.py
+from types import SimpleNamespace
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Response, UserScoreSummary
+from question_bank import FINAL_MATURITY_CUTOFFS, MATURITY_FLOOR
+
+# ===============================
+# Per-user score summary
+# ===============================
+# One user_score_summary row per user, updated in the same transaction as
+# each questionnaire submission, so pages read scores with a single
+# primary-key lookup however many attempts the user has made.
+
+
+def final_maturity_level(total_best_score):
+    """Overall maturity level (1-4) from the sum of the best level scores."""
+    for cutoff, maturity in FINAL_MATURITY_CUTOFFS:
+        if total_best_score > cutoff:
+            return maturity
+    return MATURITY_FLOOR
+
+
+def _apply(summary, response, score_max):
+    """
+    Fold one response into the summary. A level submitted again within the
+    same attempt replaces the earlier entry in that attempt (its total is
+    the latest score per level, so it cannot exceed TOTAL_MAX_SCORE); both
+    submissions still count towards the best score for the level.
+    """
+    level, attempt = str(response.level), str(response.attempt_number or 1)
+    entry = {"score": response.score, "score_max": score_max, "response_id": response.id}
+
+    # New dicts (not in-place edits) so SQLAlchemy sees the JSONB change
+    best_scores = dict(summary.best_scores or {})
+    if level not in best_scores or response.score > best_scores[level]["score"]:
+        best_scores[level] = entry
+
+    attempts = dict(summary.attempts or {})
+    levels = dict((attempts.get(attempt) or {}).get("levels", {}))
+    levels[level] = entry
+    attempts[attempt] = {"total": sum(e["score"] for e in levels.values()), "levels": levels}
+
+    summary.best_scores = best_scores
+    summary.attempts = attempts
+    summary.latest_attempt = max(int(a) for a in attempts)
+    summary.total_best_score = sum(e["score"] for e in best_scores.values())
+    summary.final_level = final_maturity_level(summary.total_best_score)
+
+
+def rebuild(user_id):
+    """A summary built from scratch from the user's responses (not yet added to the session)."""
+    summary = UserScoreSummary(user_id=user_id, best_scores={}, attempts={}, total_best_score=0.0)
+    for r in Response.query.filter_by(user_id=user_id).order_by(Response.id):
+        _apply(summary, r, r.score_max)
+    return summary
+
+
+def _insert(summary):
+    """
+    Insert a new summary in a savepoint. Returns False when another
+    transaction inserted one first; the rest of the session's work is kept
+    either way.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.add(summary)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _insert_rebuilt(user_id):
+    """Insert a summary rebuilt from the user's responses (see _insert)."""
+    return _insert(rebuild(user_id))
+
+
+def get_summary(user_id):
+    """
+    The user's summary. Users without a stored one (never submitted, or
+    responses loaded by `flask import-data`) get one rebuilt from their
+    responses and not saved, so reads never write; their next submission
+    or `flask backfill-score-summaries` stores it.
+    """
+    summary = db.session.get(UserScoreSummary, user_id)
+    return summary if summary is not None else rebuild(user_id)
+
+
+def backfill(batch_size=500, log=None):
+    """Store a summary for every user with responses but none yet; -> how many were stored."""
+    stored = 0
+    while True:
+        user_ids = [row[0] for row in db.session.query(Response.user_id)
+                    .outerjoin(UserScoreSummary, UserScoreSummary.user_id == Response.user_id)
+                    .filter(UserScoreSummary.user_id.is_(None))
+                    .distinct().order_by(Response.user_id).limit(batch_size)]
+        if not user_ids:
+            return stored
+        summaries = {}
+        for r in Response.query.filter(Response.user_id.in_(user_ids)).order_by(Response.id):
+            summary = summaries.get(r.user_id)
+            if summary is None:
+                summary = summaries[r.user_id] = UserScoreSummary(
+                    user_id=r.user_id, best_scores={}, attempts={}, total_best_score=0.0
+                )
+            _apply(summary, r, r.score_max)
+        # A user whose first submission lands meanwhile already has one
+        stored += sum(_insert(summary) for summary in summaries.values())
+        db.session.commit()
+        if log:
+            log(f"  {stored} summaries stored")
+
+
+def record_response(response, score_max):
+    """
+    Fold a new response into its user's summary. Call after db.session.add
+    and before the commit, so both are saved in one transaction.
+    """
+    db.session.flush()  # assigns response.id
+    summary = db.session.get(UserScoreSummary, response.user_id, with_for_update=True)
+    if summary is None:
+        if _insert_rebuilt(response.user_id):
+            return  # built from all responses, this one included
+        # A concurrent first submission created it: lock it and add ours
+        summary = db.session.get(
+            UserScoreSummary, response.user_id, with_for_update=True, populate_existing=True
+        )
+    _apply(summary, response, score_max)
+
+
+def record_responses(rows):
+    """
+    Bulk counterpart of record_response for rows already inserted: dicts
+    with id, user_id, level, attempt_number, score and score_max. Users
+    without a summary yet are left alone; get_summary rebuilds theirs from
+    all of their responses until one is stored.
+    """
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row["user_id"], []).append(SimpleNamespace(**row))
+
+    user_ids = sorted(by_user)
+    for start in range(0, len(user_ids), 1000):
+        summaries = UserScoreSummary.query.filter(
+            UserScoreSummary.user_id.in_(user_ids[start:start + 1000])
+        ).with_for_update().all()
+        for summary in summaries:
+            for response in sorted(by_user[summary.user_id], key=lambda r: r.id):
+                _apply(summary, response, response.score_max)
@@ -0,0 +1,164 @@
+# single_flight.py
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process half is available
+    fcntl = None
+
+load_dotenv()
+
+LOCK_DIR = os.getenv(
+    "SINGLE_FLIGHT_LOCK_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "locks")
+)
+
+
+# ===============================
+# In-process coalescing
+# ===============================
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.chunks = []  # pieces produced so far by a streaming leader
+        self.changed = threading.Condition()
+
+    def add_chunk(self, chunk):
+        with self.changed:
+            self.chunks.append(chunk)
+            self.changed.notify_all()
+
+    def finish(self):
+        with self.changed:
+            self.done.set()
+            self.changed.notify_all()
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def do(key, fn):
+    """
+    Run fn() once for all threads asking for the same key at the same time.
+    The first caller runs it; the others wait and get the same result (or
+    the same exception).
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    try:
+        call.value = fn()
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.finish()
+    return call.value
+
+
+def stream(key, fn, timeout=None):
+    """
+    do() for a streamed reply: fn() returns an iterator of text chunks. The
+    first caller iterates it and yields its chunks; the others yield the
+    same chunks as they arrive instead of starting their own. The joined
+    text is the call's value, so a do() caller for the same key shares it too.
+    A follower that gets no new chunk within timeout raises TimeoutError.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        yield from _follow(call, timeout)
+        return
+
+    try:
+        for chunk in fn():
+            call.add_chunk(chunk)
+            yield chunk
+        call.value = "".join(call.chunks).strip()
+    except BaseException as e:
+        # A leader whose reader went away must not end its followers' iteration
+        call.error = e if isinstance(e, Exception) else RuntimeError("in-flight stream was abandoned")
+        raise
+    finally:
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.finish()
+
+
+def _follow(call, timeout):
+    sent = 0
+    while True:
+        with call.changed:
+            while sent == len(call.chunks) and not call.done.is_set():
+                if not call.changed.wait(timeout):
+                    raise TimeoutError("no progress from the in-flight call")
+            new, finished = call.chunks[sent:], call.done.is_set()
+        for chunk in new:
+            yield chunk
+        sent += len(new)
+        if finished:
+            break
+    if call.error is not None:
+        raise call.error
+    # The leader was a do() call: its reply arrives in one piece
+    if not sent and call.value:
+        yield call.value
+
+
+# ===============================
+# Cross-process lock (one per key, per host)
+# ===============================
+@contextmanager
+def process_lock(key, timeout):
+    """
+    Hold an exclusive file lock for key so that only one worker process
+    calls the upstream for it. Yields True when the lock was taken, False
+    when it could not be taken within timeout (the caller proceeds anyway).
+    """
+    if fcntl is None:
+        yield False
+        return
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    path = os.path.join(LOCK_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+    with open(path, "a") as f:
+        deadline = time.monotonic() + timeout
+        acquired = False
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(0.05)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,160 @@
+# snippet_engine.py
+import engine_registry
+from engine_registry import register_engine
+from fallback_engine import SNIPPETS, FALLBACK_NOTE
+from question_bank import QUESTIONS, QUESTION_MAX_SCORES
+
+# ===============================
+# Per-answer advice snippets
+# ===============================
+# One short piece of advice per (question id, selected option, language).
+# The key space is bounded by questions x options x languages, so once
+# warmed every suggestion page is assembled from cached snippets.
+
+PROMPT_VERSION = "1"
+ENGINE = "answer_snippet"
+
+LANGUAGES = {"en": "English", "hi": "Hindi"}
+
+
+def _label(value, lang):
+    if isinstance(value, dict):
+        return value.get(lang) or value.get("en") or ""
+    return str(value or "")
+
+
+def build_request(question_id, option, lang):
+    """
+    Chat completion arguments for the advice on one answered question.
+    """
+    q = QUESTIONS[str(question_id)]
+    options = q.get("options", {})
+    answer = _label(options.get(option), "en") or option
+    choices = ", ".join(_label(o, "en") or key for key, o in options.items())
+
+    prompt = f"""
+    An Indian MSME answered a Net Zero maturity questionnaire.
+    Question: {_label(q.get("text"), "en")}
+    Possible answers: {choices}
+    Their answer: {answer}
+    Write 2-3 sentences of specific, practical advice for an MSME that gave
+    this answer: what to do next to move to a better answer, or how to
+    sustain it if it is already the best one. No heading, no list.
+    Reply in {LANGUAGES.get(lang, "English")}.
+    """
+
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are a concise sustainability advisor for small manufacturers."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.4,
+        max_tokens=160
+    )
+
+
+register_engine(ENGINE, build_request, prompt_version=PROMPT_VERSION, timeout=20, max_concurrency=8)
+
+
+def snippet_space():
+    """Every (engine, question id, option, language) a page can ask for."""
+    return [
+        (ENGINE, qid, option, lang)
+        for qid, q in QUESTIONS.items()
+        for option in q.get("options", {})
+        for lang in LANGUAGES
+    ]
+
+
+def _curated(question_id, lang):
+    snippet = SNIPPETS.get(str(question_id)) or {}
+    return snippet.get(lang) or snippet.get("en")
+
+
+def _answered(summaries):
+    """(parameter, question) for every answered question in the summaries."""
+    for summary in summaries:
+        for parameter, data in (summary or {}).get("parameter_summary", {}).items():
+            for q in data.get("questions", []):
+                if str(q.get("id")) in QUESTIONS and q.get("selected"):
+                    yield parameter, q
+
+
+def _lookup(answers, lang, budget):
+    """
+    Advice text per (question id, option): cached snippets first, then the
+    misses generated in parallel within budget seconds, then the curated
+    per-question snippet for whatever is still missing. Returns (advice,
+    number of curated stand-ins).
+    """
+    advice, jobs = {}, {}
+    for _, q in answers:
+        ident = (str(q["id"]), q["selected"])
+        if ident in advice or ident in jobs:
+            continue
+        args = (ident[0], ident[1], lang)
+        cached = engine_registry.cached(ENGINE, *args)
+        if cached is not None:
+            advice[ident] = cached
+        else:
+            jobs[ident] = (ENGINE, args)
+
+    if jobs and budget and not engine_registry.breaker_open(ENGINE):
+        results, _ = engine_registry.generate_many(jobs, timeout=budget)
+        advice.update((ident, text) for ident, text in results.items() if text)
+
+    curated = 0
+    for ident in jobs:
+        if ident not in advice:
+            advice[ident] = _curated(ident[0], lang)
+            curated += 1
+    return advice, curated
+
+
+def _line(q, advice, lang):
+    text = _label(q.get("text"), lang)
+    answer = _label(q.get("options", {}).get(q["selected"]), lang) or q["selected"]
+    tip = advice.get((str(q["id"]), q["selected"]))
+    line = f"- **{text}** *{answer}*"
+    # Keep each snippet on its own list item line
+    return f"{line}: {' '.join(tip.split())}" if tip else line
+
+
+def compose_level_suggestion(summary, lang="en", budget=0):
+    """
+    Markdown suggestions for one level, one snippet per answered question,
+    grouped by parameter.
+    """
+    answers = list(_answered([summary]))
+    if not answers:
+        return None
+    advice, curated = _lookup(answers, lang, budget)
+
+    lines = [FALLBACK_NOTE, ""] if curated else []
+    for parameter in dict.fromkeys(parameter for parameter, _ in answers):
+        lines += [f"### {parameter}", ""]
+        lines += [_line(q, advice, lang) for p, q in answers if p == parameter]
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def compose_total_suggestion(summaries, lang="en", budget=0, limit=10):
+    """
+    Markdown roadmap across all levels: snippets for the answers furthest
+    below their best option.
+    """
+    def gap(q):
+        # _answered() only yields questions still in the bank
+        return QUESTION_MAX_SCORES[str(q["id"])] - float(q.get("selected_score", 0.0))
+
+    answers = sorted(_answered(summaries), key=lambda item: -gap(item[1]))
+    answers = [(p, q) for p, q in answers if gap(q) > 0][:limit]
+    if not answers:
+        return None
+    advice, curated = _lookup(answers, lang, budget)
+
+    lines = [FALLBACK_NOTE, ""] if curated else []
+    lines += ["### Priority actions", ""]
+    lines += [_line(q, advice, lang) for _, q in answers]
+    return "\n".join(lines)
@@ -0,0 +1,391 @@
+# suggestion_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ===============================
+# Configuration
+# ===============================
+# Backend: "disk" (SQLite file), "postgres" (app database) or "memory"
+CACHE_BACKEND = os.getenv("SUGGESTION_CACHE_BACKEND", "disk")
+CACHE_PATH = os.getenv(
+    "SUGGESTION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "suggestion_cache.sqlite3")
+)
+CACHE_TTL = int(os.getenv("SUGGESTION_CACHE_TTL", 7 * 24 * 3600))  # seconds, 0 = never expire
+CACHE_MAX_ENTRIES = int(os.getenv("SUGGESTION_CACHE_MAX_ENTRIES", 5000))
+MEMORY_MAX_ENTRIES = int(os.getenv("SUGGESTION_CACHE_MEMORY_ENTRIES", 512))
+
+
+def make_key(engine, prompt_version, *args):
+    """
+    Build a cache key from the engine name, its prompt version and the
+    prompt inputs. Numbers are normalised so 3.3200000000000003 and 3.32
+    share one entry.
+    """
+    parts = []
+    for arg in args:
+        if isinstance(arg, (int, float)) and not isinstance(arg, bool):
+            parts.append(f"{float(arg):.4f}")
+        else:
+            parts.append(str(arg))
+    return ":".join([engine, f"v{prompt_version}"] + parts)
+
+
+def _older_version(key, current):
+    """
+    True when key was built for an older prompt version than current (both
+    "engine:vN:..."). Numeric versions compare as numbers, so a worker still
+    running the old code during a deploy never prunes the new entries;
+    other versions only match themselves.
+    """
+    if ":" not in key:
+        return False
+    version, current = key.split(":", 2)[1][1:], current.split(":", 2)[1][1:]
+    if version.isdigit() and current.isdigit():
+        return int(version) < int(current)
+    return version != current
+
+
+def _expiry(ttl):
+    ttl = CACHE_TTL if ttl is None else ttl
+    return time.time() + ttl if ttl > 0 else None
+
+
+# ===============================
+# In-process LRU (first tier)
+# ===============================
+class MemoryBackend:
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, engine=None, expires_at=None):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self, engine=None):
+        with self._lock:
+            if engine is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if k.startswith(engine + ":")]:
+                    del self._data[key]
+
+    def prune(self, engine, is_stale):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(engine + ":") and is_stale(k)]:
+                del self._data[key]
+        return True
+
+
+# ===============================
+# SQLite file (persistent, shared by all workers on one host)
+# ===============================
+class DiskBackend:
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS suggestion_cache (
+                    key TEXT PRIMARY KEY,
+                    engine TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_suggestion_cache_accessed ON suggestion_cache (accessed_at)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM suggestion_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < now:
+            conn.execute("DELETE FROM suggestion_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE suggestion_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return json.loads(value), expires_at
+
+    def put(self, key, value, engine=None, expires_at=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            """
+            INSERT INTO suggestion_cache (key, engine, value, created_at, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value,
+                created_at = excluded.created_at,
+                expires_at = excluded.expires_at,
+                accessed_at = excluded.accessed_at
+            """,
+            (key, engine or key.split(":", 1)[0], json.dumps(value), now, expires_at, now)
+        )
+        # Expired rows go first, then least recently used ones beyond the limit.
+        # Entries without expiry (precomputed) are never evicted.
+        conn.execute("DELETE FROM suggestion_cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        conn.execute(
+            """
+            DELETE FROM suggestion_cache WHERE key IN (
+                SELECT key FROM suggestion_cache WHERE expires_at IS NOT NULL
+                ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute("DELETE FROM suggestion_cache WHERE key = ?", (key,))
+        conn.commit()
+
+    def clear(self, engine=None):
+        conn = self._conn()
+        if engine is None:
+            conn.execute("DELETE FROM suggestion_cache")
+        else:
+            conn.execute("DELETE FROM suggestion_cache WHERE engine = ?", (engine,))
+        conn.commit()
+
+    def prune(self, engine, is_stale):
+        conn = self._conn()
+        keys = [key for (key,) in conn.execute("SELECT key FROM suggestion_cache WHERE engine = ?", (engine,))]
+        conn.executemany("DELETE FROM suggestion_cache WHERE key = ?", [(key,) for key in keys if is_stale(key)])
+        conn.commit()
+        return True
+
+
+# ===============================
+# PostgreSQL (persistent, shared by every host using the app database)
+# ===============================
+class PostgresBackend:
+    # Only bump accessed_at when it is older than this, so reads stay reads
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+
+    def _engine(self):
+        # The app database is only reachable inside an application context;
+        # outside of one the memory tier is all we have.
+        from flask import has_app_context
+        if not has_app_context():
+            return None
+        from models import db
+        return db.engine
+
+    def get(self, key):
+        engine = self._engine()
+        if engine is None:
+            return None
+        from models import SuggestionCache
+        table = SuggestionCache.__table__
+        now = time.time()
+        with engine.begin() as conn:
+            row = conn.execute(
+                table.select().where(table.c.key == key)
+            ).mappings().first()
+            if row is None:
+                return None
+            if row["expires_at"] is not None and row["expires_at"] < now:
+                conn.execute(table.delete().where(table.c.key == key))
+                return None
+            if row["accessed_at"] < now - self.TOUCH_INTERVAL:
+                conn.execute(table.update().where(table.c.key == key).values(accessed_at=now))
+        return row["value"], row["expires_at"]
+
+    def put(self, key, value, engine=None, expires_at=None):
+        db_engine = self._engine()
+        if db_engine is None:
+            return
+        from sqlalchemy import select
+        from sqlalchemy.dialects import postgresql, sqlite
+        from models import SuggestionCache
+        table = SuggestionCache.__table__
+        now = time.time()
+        # Same ON CONFLICT upsert on the SQLite profile (config.py DB_PROFILE)
+        insert = sqlite.insert if db_engine.dialect.name == "sqlite" else postgresql.insert
+        stmt = insert(table).values(
+            key=key, engine=engine or key.split(":", 1)[0], value=value,
+            created_at=now, expires_at=expires_at, accessed_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={
+                "value": stmt.excluded.value,
+                "created_at": stmt.excluded.created_at,
+                "expires_at": stmt.excluded.expires_at,
+                "accessed_at": stmt.excluded.accessed_at,
+            }
+        )
+        keep = (
+            select(table.c.key)
+            .where(table.c.expires_at.isnot(None))
+            .order_by(table.c.accessed_at.desc())
+            .limit(self.max_entries)
+        )
+        with db_engine.begin() as conn:
+            conn.execute(stmt)
+            conn.execute(table.delete().where(table.c.expires_at < now))
+            conn.execute(
+                table.delete()
+                .where(table.c.expires_at.isnot(None))
+                .where(table.c.key.notin_(keep))
+            )
+
+    def delete(self, key):
+        engine = self._engine()
+        if engine is None:
+            return
+        from models import SuggestionCache
+        table = SuggestionCache.__table__
+        with engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key == key))
+
+    def clear(self, engine=None):
+        db_engine = self._engine()
+        if db_engine is None:
+            return
+        from models import SuggestionCache
+        table = SuggestionCache.__table__
+        stmt = table.delete()
+        if engine is not None:
+            stmt = stmt.where(table.c.engine == engine)
+        with db_engine.begin() as conn:
+            conn.execute(stmt)
+
+    def prune(self, engine, is_stale):
+        db_engine = self._engine()
+        if db_engine is None:
+            return False
+        from models import SuggestionCache
+        table = SuggestionCache.__table__
+        with db_engine.begin() as conn:
+            keys = conn.execute(table.select().with_only_columns(table.c.key).where(table.c.engine == engine))
+            stale = [key for (key,) in keys if is_stale(key)]
+            for start in range(0, len(stale), 1000):
+                conn.execute(table.delete().where(table.c.key.in_(stale[start:start + 1000])))
+        return True
+
+
+_memory = MemoryBackend()
+_persistent = {
+    "disk": DiskBackend,
+    "postgres": PostgresBackend,
+}.get(CACHE_BACKEND, lambda: None)()
+# (engine, prompt version) pairs whose older versions this process has pruned
+_pruned = set()
+
+
+# ===============================
+# Public API
+# ===============================
+def get(key):
+    """Return the cached value for key, or None."""
+    value = _memory.get(key)
+    if value is not None:
+        return value
+    if _persistent is None:
+        return None
+    found = _persistent.get(key)
+    if found is None:
+        return None
+    value, expires_at = found
+    _memory.put(key, value, expires_at=expires_at)
+    return value
+
+
+def put(key, value, engine=None, ttl=None):
+    """Store value under key. ttl=None uses CACHE_TTL, ttl=0 never expires."""
+    expires_at = _expiry(ttl)
+    _memory.put(key, value, engine=engine, expires_at=expires_at)
+    if _persistent is not None:
+        _persistent.put(key, value, engine=engine, expires_at=expires_at)
+    _prune_old_versions(key, engine)
+
+
+def _prune_old_versions(key, engine=None):
+    """
+    On the first put for an engine's prompt version in this process, drop
+    the engine's entries from older versions. Eviction never touches
+    pinned (ttl=0) entries, so without this a PROMPT_VERSION bump would
+    leave them behind for good.
+    """
+    engine = engine or key.split(":", 1)[0]
+    version = key.split(":", 2)[1]
+    if (engine, version) in _pruned:
+        return
+
+    def is_stale(other):
+        return _older_version(other, key)
+
+    _memory.prune(engine, is_stale)
+    # Outside an app context the PostgreSQL tier is unreachable: try again next time
+    if _persistent is None or _persistent.prune(engine, is_stale):
+        _pruned.add((engine, version))
+
+
+def delete(key):
+    _memory.delete(key)
+    if _persistent is not None:
+        _persistent.delete(key)
+
+
+def clear(engine=None):
+    """Drop every entry, or only the entries of one engine."""
+    _memory.clear(engine)
+    if _persistent is not None:
+        _persistent.clear(engine)
+
@@ -1,19 +1,13 @@
 # suggestion_engine2.py
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+from engine_registry import register_engine, generate, stream
 
-load_dotenv()
+# Bump whenever the prompt below changes so cached answers are regenerated
+PROMPT_VERSION = "1"
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-CUSTOM_BASE_URL = "https://aipipe.org/openai/v1"
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY, base_url=CUSTOM_BASE_URL)
-
-def generate_dynamic_suggestion_planning(score, max_score):
+def build_request(score, max_score):
     """
-    Generate personalized suggestions for Planning & Strategies level.
+    Chat completion arguments for the Planning & Strategies prompt.
     """
     prompt = f"""
     The user has scored {score} out of {max_score} in Planning & Strategies.
@@ -21,7 +15,7 @@ def generate_dynamic_suggestion_planning(score, max_score):
     that are practical, actionable, and motivating.
     """
 
-    response = client.chat.completions.create(
+    return dict(
         model="gpt-4o-mini",  # your AI Pipe model
         messages=[
             {"role": "system", "content": "You are a helpful sustainability advisor."},
@@ -31,4 +25,19 @@ def generate_dynamic_suggestion_planning(score, max_score):
         max_tokens=300
     )
 
-    return response.choices[0].message.content.strip()
+
+register_engine("planning_strategies", build_request, prompt_version=PROMPT_VERSION, timeout=30)
+
+
+def generate_dynamic_suggestion_planning(score, max_score):
+    """
+    Generate personalized suggestions for Planning & Strategies level.
+    """
+    return generate("planning_strategies", score, max_score)
+
+
+def stream_dynamic_suggestion_planning(score, max_score):
+    """
+    Stream the same suggestion chunk by chunk as the model writes it.
+    """
+    return stream("planning_strategies", score, max_score)
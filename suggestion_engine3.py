@@ -1,21 +1,13 @@
 # suggestion_engine3.py
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+from engine_registry import register_engine, generate, stream
 
-load_dotenv()
+# Bump whenever the prompt below changes so cached answers are regenerated
+PROMPT_VERSION = "1"
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-CUSTOM_BASE_URL = "https://aipipe.org/openai/v1"
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY, base_url=CUSTOM_BASE_URL)
-
-def generate_dynamic_suggestion_advanced(score, max_score):
+def build_request(score, max_score):
     """
-    Generate detailed sustainability improvement suggestions
-    based on energy usage, carbon tracking, EV usage, circular economy,
-    repair services, and resource reuse.
+    Chat completion arguments for the Energy, Resource Management & Circular Economy prompt.
     """
     
     prompt = f"""
@@ -47,7 +39,7 @@ def generate_dynamic_suggestion_advanced(score, max_score):
     Avoid generic sentences.
     """
 
-    response = client.chat.completions.create(
+    return dict(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are an expert sustainability and industrial strategy advisor for MSMEs."},
@@ -57,4 +49,21 @@ def generate_dynamic_suggestion_advanced(score, max_score):
         max_tokens=700
     )
 
-    return response.choices[0].message.content.strip()
+
+register_engine("action_strategies", build_request, prompt_version=PROMPT_VERSION, timeout=45)
+
+
+def generate_dynamic_suggestion_advanced(score, max_score):
+    """
+    Generate detailed sustainability improvement suggestions
+    based on energy usage, carbon tracking, EV usage, circular economy,
+    repair services, and resource reuse.
+    """
+    return generate("action_strategies", score, max_score)
+
+
+def stream_dynamic_suggestion_advanced(score, max_score):
+    """
+    Stream the same suggestion chunk by chunk as the model writes it.
+    """
+    return stream("action_strategies", score, max_score)
@@ -1,17 +1,14 @@
 # suggestion_engine4.py
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+from engine_registry import register_engine, generate, stream
 
-load_dotenv()
+# Bump whenever the prompt below changes so cached answers are regenerated
+PROMPT_VERSION = "1"
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-CUSTOM_BASE_URL = "https://aipipe.org/openai/v1"
-
-client = OpenAI(api_key=OPENAI_API_KEY, base_url=CUSTOM_BASE_URL)
-
-def generate_total_suggestion(total_score, max_total_score):
 
+def build_request(total_score, max_total_score):
+    """
+    Chat completion arguments for the total sustainability roadmap prompt.
+    """
     percentage = (total_score / max_total_score) * 100
 
     if percentage < 30:
@@ -43,7 +40,7 @@ def generate_total_suggestion(total_score, max_total_score):
     Write in bullet points and short paragraphs. Avoid generic motivation sentences.
     """
 
-    response = client.chat.completions.create(
+    return dict(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a sustainability and ESG strategy expert advising MSMEs."},
@@ -53,4 +50,16 @@ def generate_total_suggestion(total_score, max_total_score):
         max_tokens=1200
     )
 
-    return response.choices[0].message.content.strip()
+
+register_engine("total", build_request, prompt_version=PROMPT_VERSION, timeout=60)
+
+
+def generate_total_suggestion(total_score, max_total_score):
+    return generate("total", total_score, max_total_score)
+
+
+def stream_total_suggestion(total_score, max_total_score):
+    """
+    Stream the same suggestion chunk by chunk as the model writes it.
+    """
+    return stream("total", total_score, max_total_score)
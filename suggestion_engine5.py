@@ -1,33 +1,18 @@
 # suggestion_engine5.py
 
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+from engine_registry import register_engine, generate
 
-# ===============================
-# Environment Setup
-# ===============================
-
-load_dotenv()
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-CUSTOM_BASE_URL = "https://aipipe.org/openai/v1"
-
-client = OpenAI(
-    api_key=OPENAI_API_KEY,
-    base_url=CUSTOM_BASE_URL
-)
+# Bump whenever the prompt below changes so cached answers are regenerated
+PROMPT_VERSION = "1"
 
 # ===============================
 # Tips & Resources Generator
 # ===============================
 
-def generate_tips_and_resources(total_score, max_total_score):
+def maturity_profile(total_score, max_total_score):
     """
-    Generates maturity-based tips, government schemes,
-    tools, and learning resources for MSMEs.
+    (percentage, maturity, focus) used both in the prompt and in the result.
     """
-
     percentage = round((total_score / max_total_score) * 100, 1)
 
     # ---------- Maturity Mapping ----------
@@ -44,6 +29,15 @@ def generate_tips_and_resources(total_score, max_total_score):
         maturity = "Advanced"
         focus = "Net Zero alignment and leadership practices"
 
+    return percentage, maturity, focus
+
+
+def build_request(total_score, max_total_score):
+    """
+    Chat completion arguments for the Tips & Resources prompt.
+    """
+    percentage, maturity, focus = maturity_profile(total_score, max_total_score)
+
     # ---------- Prompt ----------
     prompt = f"""
 You are an expert advisor helping Indian MSMEs improve Net Zero readiness.
@@ -84,8 +78,8 @@ Rules:
 - India-focused
 """
 
-    # ---------- API Call ----------
-    response = client.chat.completions.create(
+    # ---------- Request ----------
+    return dict(
         model="gpt-4o-mini",
         messages=[
             {
@@ -101,10 +95,21 @@ Rules:
         max_tokens=900
     )
 
+
+register_engine("tips_resources", build_request, prompt_version=PROMPT_VERSION, timeout=60)
+
+
+def generate_tips_and_resources(total_score, max_total_score):
+    """
+    Generates maturity-based tips, government schemes,
+    tools, and learning resources for MSMEs.
+    """
+    percentage, maturity, focus = maturity_profile(total_score, max_total_score)
+
     # ---------- Return Structured Output ----------
     return {
         "percentage": percentage,
         "maturity_level": maturity,
         "tips_focus": focus,
-        "tips_and_resources": response.choices[0].message.content.strip()
+        "tips_and_resources": generate("tips_resources", total_score, max_total_score)
     }
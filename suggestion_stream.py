@@ -0,0 +1,91 @@
+# suggestion_stream.py
+import json
+import queue
+import threading
+import time
+
+import markdown
+
+import metrics
+import profiling
+
+# Re-render the partial Markdown at most this often unless a line ends
+MIN_EMIT_INTERVAL = 0.25
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def _render(text):
+    return markdown.markdown(text.strip(), extensions=["extra"])
+
+
+def _pump(chunks, out, app, route, profile):
+    """Read the model stream on a worker thread so the response can time out on it."""
+    try:
+        with metrics.route(route), profiling.bound(profile):
+            if app is None:
+                for chunk in chunks:
+                    out.put(("chunk", chunk))
+            else:
+                with app.app_context():
+                    for chunk in chunks:
+                        out.put(("chunk", chunk))
+        out.put(("end", None))
+    except Exception as e:
+        out.put(("error", e))
+
+
+def sse_markdown(chunks, fallback=None, budget=None, app=None):
+    """
+    Turn a stream of Markdown text chunks into Server-Sent Events.
+
+    Each "html" event carries the Markdown rendered so far; the client
+    swaps it in. A final "done" (or "failed") event ends the stream.
+
+    fallback() returns Markdown to show when no text has arrived within
+    budget seconds or when the stream fails; the model's text replaces it
+    if it arrives later. The model stream is read on a background thread
+    (inside app's context), so it still completes and gets cached if the
+    browser goes away.
+    """
+    out = queue.Queue()
+    threading.Thread(target=_pump, args=(chunks, out, app, metrics.current_route(), profiling.current()), daemon=True).start()
+
+    deadline = time.monotonic() + budget if budget is not None else None
+    text = ""
+    showing_fallback = False
+    last_emit = 0.0
+
+    # Comment line so proxies and the browser see the stream open at once
+    yield ": connected\n\n"
+    while True:
+        timeout = None
+        if fallback is not None and deadline is not None and not text and not showing_fallback:
+            timeout = max(0.0, deadline - time.monotonic())
+        try:
+            kind, value = out.get(timeout=timeout)
+        except queue.Empty:
+            showing_fallback = True
+            yield _event("html", _render(fallback()))
+            continue
+
+        if kind == "chunk":
+            text += value
+            now = time.monotonic()
+            if "\n" in value or now - last_emit >= MIN_EMIT_INTERVAL:
+                yield _event("html", _render(text))
+                last_emit = now
+        elif kind == "end" and text:
+            yield _event("html", _render(text))
+            yield _event("done", "")
+            return
+        else:
+            # Failed, or finished without any text
+            if fallback is None:
+                yield _event("failed", "Suggestions are unavailable right now. Please refresh in a moment.")
+                return
+            yield _event("html", _render(fallback()))
+            yield _event("done", "")
+            return
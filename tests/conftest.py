@@ -0,0 +1,137 @@
+# tests/conftest.py
+import os
+import sys
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+# Before the app (and config.py) is imported: an empty in-memory SQLite
+# database unless DB_PROFILE says otherwise. Tests that need PostgreSQL
+# (COPY imports) are skipped there; run them with DB_PROFILE=postgres and
+# DATABASE_URL pointing at a scratch database.
+os.environ.setdefault("DB_PROFILE", "sqlite-memory")
+os.environ.setdefault("SUGGESTION_CACHE_BACKEND", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from app import app as flask_app
+from models import db, User
+import engine_registry
+import page_cache
+import suggestion_cache
+import user_cache
+
+PASSWORD_HASH = generate_password_hash("secret")
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+    page_cache.clear()
+    user_cache.clear()
+    yield flask_app
+    page_cache.clear()
+    user_cache.clear()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create users (removed again after the test); -> their ids."""
+    created = []
+
+    def make(name="Test User", **fields):
+        with app.app_context():
+            user = User(email=f"{uuid.uuid4().hex}@tests.invalid", password_hash=PASSWORD_HASH,
+                        name=name, onboard_complete=True, **fields)
+            db.session.add(user)
+            db.session.commit()
+            created.append(user.id)
+            return user.id
+
+    yield make
+    with app.app_context():
+        User.query.filter(User.id.in_(created)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def login(client, user_id):
+    """Log a test client in as user_id (what Flask-Login keeps in the session)."""
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+@pytest.fixture
+def client_for(app):
+    """A fresh test client, logged in as user_id when one is given."""
+    def make(user_id=None):
+        client = app.test_client()
+        return login(client, user_id) if user_id is not None else client
+    return make
+
+
+class StubLLM:
+    """
+    Stands in for the OpenAI client: counts calls and replies with pieces
+    (streamed one by one when asked to), each after delay seconds. An
+    exception in failures is raised by the next call instead.
+    """
+
+    def __init__(self, pieces=("Use ", "solar ", "power."), delay=0.05):
+        self.pieces = pieces
+        self.delay = delay
+        self.failures = []
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, timeout=None, **request):
+        with self._lock:
+            self.calls += 1
+            failure = self.failures.pop(0) if self.failures else None
+        if failure is not None:
+            time.sleep(self.delay)
+            raise failure
+        usage = SimpleNamespace(prompt_tokens=11, completion_tokens=len(self.pieces))
+        if not request.get("stream"):
+            time.sleep(self.delay * len(self.pieces))
+            message = SimpleNamespace(content="".join(self.pieces))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+        def chunks():
+            for piece in self.pieces:
+                time.sleep(self.delay)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+        return chunks()
+
+
+@pytest.fixture
+def llm(monkeypatch, tmp_path):
+    """A StubLLM behind every engine, with empty caches and closed breakers."""
+    stub = StubLLM()
+    monkeypatch.setattr(engine_registry, "get_client", lambda base_url=None: stub)
+    monkeypatch.setattr("single_flight.LOCK_DIR", str(tmp_path))
+    engine_registry._breakers.clear()
+    suggestion_cache.clear()
+    yield stub
+    engine_registry._breakers.clear()
+    suggestion_cache.clear()
+
+
+@pytest.fixture
+def stub_engine(llm):
+    """A throwaway engine registered for the test, answered by the llm stub; -> its name."""
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    engine_registry.register_engine(
+        name, lambda topic: {"model": "stub", "messages": [{"role": "user", "content": topic}]},
+        max_concurrency=16
+    )
+    yield name
+    engine_registry.ENGINES.pop(name, None)
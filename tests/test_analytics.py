@@ -0,0 +1,135 @@
+# tests/test_analytics.py
+import time
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+import analytics
+from models import db, Response, User
+from question_bank import LEVEL_TABLES, score_level
+from score_summary import final_maturity_level
+
+
+def _top_answers(level):
+    table = LEVEL_TABLES[level]
+    return {f"q_{qid}": max(scores, key=scores.get) for qid, scores in zip(table.question_ids, table.option_scores)}
+
+
+def _submit(user_id, level, answers, attempt=1):
+    score, maturity, details = score_level(level, answers)
+    db.session.add(Response(user_id=user_id, level=level, score=score, maturity_level=maturity,
+                            details=details, attempt_number=attempt))
+
+
+def _breakdown(marker):
+    row = db.session.execute(
+        text("SELECT * FROM mv_onboarding_breakdown WHERE dimension = 'step1' AND value = :value"),
+        {"value": marker}
+    ).first()
+    return dict(row._mapping) if row else None
+
+
+@pytest.fixture
+def cohort(app, make_user):
+    """Three users from one organization: two assessed (one twice), one not; -> the organization."""
+    marker = uuid.uuid4().hex
+    full, partial = make_user(step1=marker), make_user(step1=marker)
+    make_user(step1=marker)
+    with app.app_context():
+        for level in LEVEL_TABLES:
+            _submit(full, level, {})
+            _submit(full, level, _top_answers(level), attempt=2)
+        _submit(partial, 1, _top_answers(1))
+        db.session.commit()
+    return marker
+
+
+def test_refresh_builds_every_view(app, cohort):
+    with app.app_context():
+        analytics.refresh_views()
+        assert analytics.views_exist()
+        data = analytics.load()
+        users = db.session.query(db.func.count(User.id)).scalar()
+        responses = db.session.query(db.func.count(Response.id)).scalar()
+
+    assert data["meta"]["users"] == users
+    assert data["meta"]["responses"] == responses
+    assert data["meta"]["refreshed_at"] is not None
+    assert sum(sum(by_level.values()) for by_level in data["maturity"].values()) == responses
+    assert sum(sum(buckets) for buckets in data["distribution"].values()) == responses
+
+
+def test_breakdown_per_onboarding_answer(app, cohort):
+    with app.app_context():
+        analytics.refresh_views()
+        row = _breakdown(cohort)
+
+    assert row["users"] == 3
+    assert row["assessed"] == 2
+    # Best totals: every level at its max (36), and level 1 only (7)
+    assert float(row["avg_best_total"]) == pytest.approx((36 + 7) / 2)
+    # Final levels 4 and 1; the unassessed user does not count
+    assert float(row["avg_final_level"]) == pytest.approx(2.5)
+
+
+@pytest.mark.parametrize("total, level", [(None, None), (0, 1), (9, 1), (9.5, 2), (18, 2), (27, 3), (27.5, 4), (36, 4)])
+def test_final_level_sql_matches_score_summary(app, total, level):
+    with app.app_context():
+        sql = "SELECT " + analytics.FINAL_LEVEL_SQL.format(total="CAST(:total AS FLOAT)")
+        assert db.session.execute(text(sql), {"total": total}).scalar() == level
+    if total is not None:
+        assert final_maturity_level(total) == level
+
+
+def test_attempt_improvement_counts_completed_attempts(app, cohort):
+    with app.app_context():
+        analytics.refresh_views()
+        attempts = {r["attempt_number"]: r for r in analytics.load()["attempts"]}
+    # At least our user completed attempt 2 after a completed attempt 1
+    assert attempts[2]["completed"] >= 1
+    assert attempts[2]["improved"] >= 1
+
+
+def test_refresh_picks_up_new_responses(app, make_user):
+    marker = uuid.uuid4().hex
+    user_id = make_user(step1=marker)
+    with app.app_context():
+        analytics.refresh_views()
+        assert _breakdown(marker)["assessed"] == 0
+
+        _submit(user_id, 1, _top_answers(1))
+        db.session.commit()
+        # Views show the last refresh until the next one
+        assert _breakdown(marker)["assessed"] == 0
+        analytics.refresh_views()
+        assert _breakdown(marker)["assessed"] == 1
+
+
+def test_admin_page_reads_the_views(app, client_for, cohort):
+    with app.app_context():
+        analytics.refresh_views()
+    client = client_for()
+    with client.session_transaction() as session:
+        session["is_admin"] = True
+    response = client.get("/admin/analytics")
+    assert response.status_code == 200
+    assert client.post("/admin/analytics/refresh").status_code == 302
+
+
+def test_admin_page_refreshes_stale_views_in_the_background(app, client_for, monkeypatch):
+    refreshes = []
+    monkeypatch.setattr(analytics, "refresh_in_background", refreshes.append)
+    with app.app_context():
+        analytics.refresh_views()
+    client = client_for()
+    with client.session_transaction() as session:
+        session["is_admin"] = True
+
+    monkeypatch.setitem(app.config, "ANALYTICS_MAX_AGE", 3600)
+    assert client.get("/admin/analytics").status_code == 200
+    assert refreshes == []
+    monkeypatch.setitem(app.config, "ANALYTICS_MAX_AGE", 0.001)
+    time.sleep(0.01)
+    assert client.get("/admin/analytics").status_code == 200
+    assert len(refreshes) == 1
@@ -0,0 +1,62 @@
+# tests/test_attempt_state.py
+from sqlalchemy import event
+
+from attempt_state import AttemptState, get_attempt_state, invalidate_attempt_state
+from models import db, Response
+
+
+def test_new_user_starts_attempt_one():
+    state = AttemptState({})
+    assert (state.last_attempt, state.current_attempt) == (0, 1)
+    assert state.completed_levels == set()
+    assert state.levels_unlocked == [1]
+    assert state.can_start_new
+    assert not state.previous_complete
+
+
+def test_levels_unlock_in_order_within_an_attempt():
+    state = AttemptState({1: {1, 2}})
+    assert state.current_attempt == 1
+    assert state.completed_levels == {1, 2}
+    assert state.levels_unlocked == [1, 2, 3]
+    assert not state.can_start_new
+
+
+def test_finished_attempt_moves_on_to_the_next():
+    state = AttemptState({1: {1, 2, 3, 4}})
+    assert (state.last_attempt, state.current_attempt) == (1, 2)
+    assert state.completed_levels == set()
+    assert state.levels_unlocked == [1]
+    assert state.can_start_new
+    assert state.previous_complete
+
+
+def test_state_is_queried_once_per_request_until_invalidated(app, make_user):
+    user_id = make_user()
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if "FROM responses" in statement:
+            statements.append(statement)
+
+    with app.test_request_context():
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            assert get_attempt_state(user_id).completed_levels == set()
+            assert get_attempt_state(user_id) is get_attempt_state(user_id)
+            assert len(statements) == 1
+
+            db.session.add(Response(user_id=user_id, level=1, score=1.0, maturity_level=1, attempt_number=1))
+            db.session.commit()
+            # Memoized for the request: the new response is not seen yet
+            assert get_attempt_state(user_id).completed_levels == set()
+            invalidate_attempt_state(user_id)
+            assert get_attempt_state(user_id).completed_levels == {1}
+            assert get_attempt_state(user_id).levels_unlocked == [1, 2]
+            assert len(statements) == 2
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+
+    # A new request queries again
+    with app.test_request_context():
+        assert get_attempt_state(user_id).completed_levels == {1}
@@ -0,0 +1,87 @@
+# tests/test_bulk_import.py
+import csv
+import uuid
+
+import pytest
+
+import bulk_import
+from models import db, User, UserScoreSummary
+from question_bank import LEVEL_TABLES
+from score_summary import backfill
+
+
+@pytest.fixture
+def pg_app(app):
+    with app.app_context():
+        if db.engine.dialect.name != "postgresql":
+            pytest.skip("import-data needs PostgreSQL (COPY); run with DB_PROFILE=postgres")
+    return app
+
+
+@pytest.fixture
+def assessments(tmp_path, pg_app):
+    """A CSV of three users' assessments, answered with each question's first option."""
+    emails = [f"{uuid.uuid4().hex}@tests.invalid" for _ in range(3)]
+    question_ids = [qid for table in LEVEL_TABLES.values() for qid in table.question_ids]
+    first_option = {
+        qid: next(iter(scores), "")
+        for table in LEVEL_TABLES.values() for qid, scores in zip(table.question_ids, table.option_scores)
+    }
+    path = tmp_path / "assessments.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["email"] + [str(qid) for qid in question_ids])
+        for email in emails:
+            writer.writerow([email] + [first_option[qid] for qid in question_ids])
+    yield str(path), emails
+    with pg_app.app_context():
+        User.query.filter(User.email.in_(emails)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _import(path):
+    invalid = []
+    users, responses = bulk_import.assessment_source(path, "csv", invalid)
+    stats = bulk_import.import_rows(users, responses, log=lambda *args: None)
+    assert invalid == []
+    return stats
+
+
+def test_reimport_changes_nothing(pg_app, assessments):
+    path, emails = assessments
+    with pg_app.app_context():
+        first = _import(path)
+        assert first["users_inserted"] == 3
+        assert first["responses_inserted"] == 3 * len(LEVEL_TABLES)
+        user_ids = [u.id for u in User.query.filter(User.email.in_(emails))]
+        backfill()
+
+        second = _import(path)
+        assert second["users_inserted"] == second["users_updated"] == 0
+        assert second["responses_inserted"] == second["responses_updated"] == 0
+        # Nothing changed, so the users' score summaries are kept
+        assert UserScoreSummary.query.filter(UserScoreSummary.user_id.in_(user_ids)).count() == 3
+
+
+def test_reimport_counts_a_changed_answer(pg_app, assessments, tmp_path):
+    path, emails = assessments
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    table = LEVEL_TABLES[1]
+    column = rows[0].index(str(table.question_ids[0]))
+    options = list(table.option_scores[0])
+    rows[1][column] = options[-1] if rows[1][column] != options[-1] else options[0]
+    changed = tmp_path / "changed.csv"
+    with open(changed, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+    with pg_app.app_context():
+        _import(path)
+        user_ids = {u.email: u.id for u in User.query.filter(User.email.in_(emails))}
+        backfill()
+
+        stats = _import(str(changed))
+        assert stats["responses_inserted"] == 0
+        assert stats["responses_updated"] == 1
+        kept = {s.user_id for s in UserScoreSummary.query.filter(UserScoreSummary.user_id.in_(user_ids.values()))}
+        assert kept == {user_ids[emails[1]], user_ids[emails[2]]}
@@ -0,0 +1,111 @@
+# tests/test_bulk_scoring.py
+import random
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+import bulk_scoring
+from models import db, Response, User
+from question_bank import LEVEL_TABLES, score_level
+
+
+def _submissions(table, rng):
+    """The first k questions answered with their top option, for every k
+    (exact 25/50/75% totals where the level allows), then random answers."""
+    keys = [list(scores) for scores in table.option_scores]
+    top = [max(scores, key=scores.get) for scores in table.option_scores]
+    low = [min(scores, key=scores.get) for scores in table.option_scores]
+    submissions = [
+        {f"q_{qid}": top[i] if i < k else low[i] for i, qid in enumerate(table.question_ids)}
+        for k in range(len(table.question_ids) + 1)
+    ]
+    submissions += [
+        {f"q_{qid}": rng.choice(keys[i] + [""]) for i, qid in enumerate(table.question_ids)}
+        for _ in range(200)
+    ]
+    # Every record has to answer something to be scored by the batch
+    return [s for s in submissions if any(s.values())]
+
+
+@pytest.mark.parametrize("level", sorted(LEVEL_TABLES))
+def test_batch_scores_match_score_level(level):
+    table = LEVEL_TABLES[level]
+    submissions = _submissions(table, random.Random(level))
+    columns = {name: [s[name] for s in submissions] for name in submissions[0]}
+
+    rows, results, unknown = bulk_scoring.score_level_batch(level, columns)
+
+    assert rows == list(range(len(submissions)))
+    assert unknown == []
+    for j, answers in enumerate(submissions):
+        score, maturity, details = score_level(level, answers)
+        assert results["score_total"][j] == score
+        assert results["maturity_level"][j] == maturity
+        assert results["percent_of_level"][j] == details["_summary"]["percent_of_level"]
+        assert results["fulfilled_attributes"][j] == details["_summary"]["fulfilled_attributes"]
+    assert set(results["maturity_level"]) == {1, 2, 3, 4}
+
+
+@pytest.fixture
+def batch(app):
+    """Ten records answering levels 1 and 2 for new users; users removed afterwards."""
+    rng = random.Random(7)
+    emails = [f"{uuid.uuid4().hex}@tests.invalid" for _ in range(10)]
+    columns = {"email": emails}
+    for level in (1, 2):
+        table = LEVEL_TABLES[level]
+        for qid, scores in zip(table.question_ids, table.option_scores):
+            columns[f"q_{qid}"] = [rng.choice(list(scores)) for _ in emails]
+    yield columns
+    with app.app_context():
+        User.query.filter(User.email.in_(emails)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def test_score_batch_saves_what_score_level_would(app, batch):
+    with app.app_context():
+        summary = bulk_scoring.score_batch(batch, create_users=True, log=lambda message: None)
+        saved = {(r.user.email, r.level): r for r in
+                 Response.query.join(User).filter(User.email.in_(batch["email"]))}
+        assert summary["responses"] == len(saved) == 20
+        for j, email in enumerate(batch["email"]):
+            for level in (1, 2):
+                answers = {name: values[j] for name, values in batch.items() if name.startswith("q_")}
+                score, maturity, details = score_level(level, answers)
+                response = saved[(email, level)]
+                assert (response.score, response.maturity_level) == (score, maturity)
+                assert response.details["_summary"]["parameter_summary"] == details["_summary"]["parameter_summary"]
+
+
+def test_score_batch_writes_each_chunk_as_it_fills(app, batch, monkeypatch):
+    monkeypatch.setattr(bulk_scoring, "INSERT_CHUNK", 3)
+    serialized = bulk_scoring.DetailsWriter.row
+    pending, most_pending = [0], [0]
+
+    def row(self, j):
+        pending[0] += 1
+        most_pending[0] = max(most_pending[0], pending[0])
+        return serialized(self, j)
+
+    def insert(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO responses"):
+            pending[0] = 0
+
+    monkeypatch.setattr(bulk_scoring.DetailsWriter, "row", row)
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", insert)
+        try:
+            assert bulk_scoring.score_batch(batch, create_users=True, log=lambda message: None)["responses"] == 20
+        finally:
+            event.remove(db.engine, "before_cursor_execute", insert)
+    assert most_pending[0] == 3
+
+
+def test_dry_run_saves_nothing(app):
+    email = f"{uuid.uuid4().hex}@tests.invalid"
+    with app.app_context():
+        summary = bulk_scoring.score_batch({"email": [email], "q_1": ["aware"]}, create_users=True,
+                                           dry_run=True, log=lambda message: None)
+        assert summary["results"][0]["score"] == 1.0
+        assert User.query.filter_by(email=email).count() == 0
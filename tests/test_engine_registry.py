@@ -0,0 +1,87 @@
+# tests/test_engine_registry.py
+import time
+
+import httpx
+import openai
+import pytest
+
+import engine_registry
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://stub/v1/chat/completions"))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(engine_registry, "LLM_BACKOFF_BASE", 0)
+
+
+def test_retryable_errors_are_retried(stub_engine, llm):
+    llm.failures += [connection_error(), connection_error()]
+    assert engine_registry.generate(stub_engine, "a") == "Use solar power."
+    assert llm.calls == 3
+
+
+def test_retries_are_bounded(stub_engine, llm):
+    llm.failures += [connection_error()] * 10
+    with pytest.raises(openai.APIConnectionError):
+        engine_registry.generate(stub_engine, "a")
+    assert llm.calls == engine_registry.LLM_MAX_RETRIES + 1
+
+
+def test_other_errors_are_not_retried(stub_engine, llm):
+    llm.failures.append(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        engine_registry.generate(stub_engine, "a")
+    assert llm.calls == 1
+
+
+def test_breaker_opens_after_consecutive_failures(stub_engine, llm, monkeypatch):
+    monkeypatch.setattr(engine_registry, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(engine_registry, "LLM_BREAKER_THRESHOLD", 2)
+    monkeypatch.setattr(engine_registry, "LLM_BREAKER_COOLDOWN", 0.2)
+    llm.failures += [connection_error(), connection_error()]
+    for topic in ("a", "b"):
+        with pytest.raises(openai.APIConnectionError):
+            engine_registry.generate(stub_engine, topic)
+    assert engine_registry.breaker_open(stub_engine)
+
+    # Open: fail fast without calling the upstream
+    with pytest.raises(engine_registry.CircuitOpen):
+        engine_registry.generate(stub_engine, "c")
+    assert llm.calls == 2
+
+    # After the cooldown one probe goes through and closes it again
+    time.sleep(0.25)
+    assert not engine_registry.breaker_open(stub_engine)
+    assert engine_registry.generate(stub_engine, "c") == "Use solar power."
+    assert llm.calls == 3
+    assert not engine_registry.breaker_open(stub_engine)
+
+
+def test_a_failed_probe_reopens_the_breaker(stub_engine, llm, monkeypatch):
+    monkeypatch.setattr(engine_registry, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(engine_registry, "LLM_BREAKER_THRESHOLD", 1)
+    monkeypatch.setattr(engine_registry, "LLM_BREAKER_COOLDOWN", 0.2)
+    llm.failures += [connection_error(), connection_error()]
+    with pytest.raises(openai.APIConnectionError):
+        engine_registry.generate(stub_engine, "a")
+    time.sleep(0.25)
+    with pytest.raises(openai.APIConnectionError):
+        engine_registry.generate(stub_engine, "b")
+    assert engine_registry.breaker_open(stub_engine)
+    assert llm.calls == 2
+
+
+def test_engine_busy_when_no_slot_frees_up(llm):
+    engine = engine_registry.register_engine(
+        "test_busy", lambda topic: {"model": "stub", "messages": []}, timeout=0.05, max_concurrency=1
+    )
+    try:
+        with engine_registry._slot(engine):
+            with pytest.raises(engine_registry.EngineBusy):
+                engine_registry.complete("test_busy", "a")
+    finally:
+        engine_registry.ENGINES.pop("test_busy", None)
+    assert llm.calls == 0
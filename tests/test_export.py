@@ -0,0 +1,92 @@
+# tests/test_export.py
+import csv
+import io
+
+import pytest
+
+import export
+from models import db, Response, User
+from question_bank import LEVEL_TABLES, score_level
+
+
+@pytest.fixture
+def exported_users(app, make_user):
+    """One user with two level 1 responses, one with none; -> their emails."""
+    assessed, new = make_user(name="Asha"), make_user(name="Ravi")
+    table = LEVEL_TABLES[1]
+    answers = {f"q_{qid}": max(scores, key=scores.get) for qid, scores in zip(table.question_ids, table.option_scores)}
+    with app.app_context():
+        for attempt, given in ((1, {}), (2, answers)):
+            score, maturity, details = score_level(1, given)
+            db.session.add(Response(user_id=assessed, level=1, score=score, maturity_level=maturity,
+                                    details=details, attempt_number=attempt))
+        db.session.commit()
+        return tuple(db.session.get(User, user_id).email for user_id in (assessed, new))
+
+
+def _csv_rows(app, columns, **kwargs):
+    with app.app_context():
+        chunks = list(export.stream_csv(db.engine, columns, **kwargs))
+    return chunks, list(csv.DictReader(io.StringIO("".join(chunks))))
+
+
+def test_csv_has_a_row_per_response_and_per_user_without_any(app, exported_users):
+    assessed, new = exported_users
+    columns = ["email", "name", "level", "attempt_number", "score", "score_max", "percent_of_level"]
+    _, rows = _csv_rows(app, columns)
+    ours = [r for r in rows if r["email"] in exported_users]
+    assert [(r["email"], r["attempt_number"]) for r in ours] == [(assessed, "1"), (assessed, "2"), (new, "")]
+    assert ours[1]["score_max"] == "7.0"
+    assert float(ours[1]["percent_of_level"]) == 100
+    assert ours[2]["level"] == ours[2]["score"] == ""
+
+
+def test_csv_streams_one_chunk_per_batch(app, exported_users):
+    chunks, rows = _csv_rows(app, ["email"], batch_size=1)
+    assert chunks[0].startswith("email\r\n")
+    assert len(chunks) == len(rows)
+
+
+def test_question_columns_come_from_the_stored_details(app, exported_users):
+    qid = LEVEL_TABLES[1].question_ids[0]
+    _, rows = _csv_rows(app, ["email", "attempt_number", f"q_{qid}", f"q_{qid}_score", "q_8"])
+    ours = [r for r in rows if r["email"] == exported_users[0]]
+    assert [(r[f"q_{qid}"], r[f"q_{qid}_score"]) for r in ours] == [("", "0.0"), ("aware", "1.0")]
+    # Another level's question is empty on level 1 rows
+    assert {r["q_8"] for r in ours} == {""}
+
+
+def test_parse_columns():
+    assert export.parse_columns("") == export.DEFAULT_COLUMNS
+    assert export.parse_columns(" email, level ") == ["email", "level"]
+    with pytest.raises(ValueError, match="password_hash"):
+        export.parse_columns("email,password_hash")
+
+
+def test_parquet_round_trip(app, exported_users):
+    pq = pytest.importorskip("pyarrow.parquet")
+    columns = ["email", "registered_at", "onboard_complete", "level", "score"]
+    with app.app_context():
+        data = b"".join(export.stream_parquet(db.engine, columns, batch_size=1))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column_names == columns
+    assert str(table.schema.field("level").type) == "int64"
+    assert str(table.schema.field("registered_at").type) == "timestamp[us]"
+    # One row group per batch
+    assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == table.num_rows
+    ours = [r for r in table.to_pylist() if r["email"] in exported_users]
+    assert [r["level"] for r in ours] == [1, 1, None]
+    assert all(r["onboard_complete"] is True for r in ours)
+
+
+def test_export_endpoint(app, client_for, exported_users):
+    client = client_for()
+    with client.session_transaction() as session:
+        session["is_admin"] = True
+    response = client.get("/admin/export?format=csv&columns=email,level")
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"].startswith("attachment; filename=msme_nze_export_")
+    assert response.get_data(as_text=True).startswith("email,level\r\n")
+    assert client.get("/admin/export?format=csv&columns=password_hash").status_code == 400
+    assert client.get("/admin/export?format=xml").status_code == 400
+    assert client.get("/admin/export").status_code == 200
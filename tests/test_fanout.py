@@ -0,0 +1,68 @@
+# tests/test_fanout.py
+import time
+
+import pytest
+
+import engine_registry
+
+
+@pytest.fixture
+def broken_engine(llm):
+    def build_request(topic):
+        raise ValueError(f"no prompt for {topic}")
+    engine_registry.register_engine("test_broken", build_request)
+    yield "test_broken"
+    engine_registry.ENGINES.pop("test_broken", None)
+
+
+def test_sections_run_in_parallel(stub_engine, llm):
+    started = time.monotonic()
+    results, errors = engine_registry.generate_many(
+        {section: (stub_engine, (section,)) for section in ("a", "b", "c", "d")}, timeout=5
+    )
+    # Each call takes 0.15 s on the stub
+    assert time.monotonic() - started < 0.45
+    assert results == {section: "Use solar power." for section in ("a", "b", "c", "d")}
+    assert errors == {}
+    assert llm.calls == 4
+
+
+def test_a_failed_section_degrades_alone(stub_engine, broken_engine):
+    results, errors = engine_registry.generate_many(
+        {"level": (stub_engine, ("a",)), "total": (broken_engine, ("b",))}, timeout=5
+    )
+    assert results == {"level": "Use solar power.", "total": None}
+    assert list(errors) == ["total"]
+    assert isinstance(errors["total"], ValueError)
+
+
+def test_a_slow_section_is_cut_off_at_the_timeout(stub_engine, llm):
+    llm.delay = 0.2
+    started = time.monotonic()
+    results, errors = engine_registry.generate_many({"level": (stub_engine, ("slow",))}, timeout=0.1)
+    assert time.monotonic() - started < 0.4
+    assert results == {"level": None}
+    assert "level" in errors
+    # The call still finishes on its worker and fills the cache for the next visit
+    deadline = time.monotonic() + 5
+    while engine_registry.cached(stub_engine, "slow") is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert engine_registry.cached(stub_engine, "slow") == "Use solar power."
+
+
+def test_sections_run_inside_the_app_context(app, llm):
+    seen = []
+
+    def build_request(topic):
+        from flask import current_app
+        seen.append(current_app.name)
+        return {"model": "stub", "messages": [{"role": "user", "content": topic}]}
+
+    engine_registry.register_engine("test_context", build_request)
+    try:
+        with app.app_context():
+            results, errors = engine_registry.generate_many({"a": ("test_context", ("a",))}, timeout=5)
+    finally:
+        engine_registry.ENGINES.pop("test_context", None)
+    assert errors == {}
+    assert seen == [app.name]
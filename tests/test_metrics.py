@@ -0,0 +1,84 @@
+# tests/test_metrics.py
+import uuid
+
+import engine_registry
+import metrics
+
+
+def sample(text, line_start):
+    """Value of the one exposition line starting with line_start."""
+    values = [line.rsplit(" ", 1)[1] for line in text.splitlines() if line.startswith(line_start + " ")]
+    assert len(values) == 1, (line_start, values)
+    return float(values[0])
+
+
+def test_render_counters_and_histograms():
+    engine = f"test_{uuid.uuid4().hex[:8]}"
+    metrics.inc("llm_retries_total", engine=engine, route="r")
+    metrics.inc("llm_retries_total", 2, engine=engine, route="r")
+    for seconds in (0.05, 0.3, 100):
+        metrics.observe("llm_request_duration_seconds", seconds, engine=engine, route="r")
+
+    text = metrics.render()
+    labels = f'engine="{engine}",route="r"'
+    assert "# TYPE llm_request_duration_seconds histogram" in text
+    assert sample(text, f"llm_retries_total{{{labels}}}") == 3
+    # Buckets are cumulative; 100 s only lands in +Inf
+    assert sample(text, f'llm_request_duration_seconds_bucket{{{labels},le="0.1"}}') == 1
+    assert sample(text, f'llm_request_duration_seconds_bucket{{{labels},le="0.5"}}') == 2
+    assert sample(text, f'llm_request_duration_seconds_bucket{{{labels},le="60"}}') == 2
+    assert sample(text, f'llm_request_duration_seconds_bucket{{{labels},le="+Inf"}}') == 3
+    assert sample(text, f"llm_request_duration_seconds_count{{{labels}}}") == 3
+    assert sample(text, f"llm_request_duration_seconds_sum{{{labels}}}") == 100.35
+
+
+def test_label_values_are_escaped():
+    metrics.inc("llm_errors_total", engine='say "hi"\n', route="r", error="E")
+    assert 'llm_errors_total{engine="say \\"hi\\"\\n",error="E",route="r"} 1' in metrics.render()
+
+
+def test_llm_calls_are_counted(stub_engine):
+    with metrics.route("tests"):
+        engine_registry.generate(stub_engine, "a")
+        engine_registry.generate(stub_engine, "a")
+        "".join(engine_registry.stream(stub_engine, "b"))
+
+    text = metrics.render()
+    labels = f'engine="{stub_engine}",route="tests"'
+    assert sample(text, f"llm_requests_total{{{labels}}}") == 2
+    assert sample(text, f"llm_request_duration_seconds_count{{{labels}}}") == 2
+    assert sample(text, f'llm_tokens_total{{{labels},type="prompt"}}') == 22
+    assert sample(text, f'llm_tokens_total{{{labels},type="completion"}}') == 6
+    # Labels are written in name order
+    cache = 'suggestion_cache_requests_total{engine="%s",result="%s",route="tests"}'
+    assert sample(text, cache % (stub_engine, "miss")) == 2
+    assert sample(text, cache % (stub_engine, "hit")) == 1
+
+
+def test_streams_record_time_to_first_token(stub_engine, llm):
+    with metrics.route("tests"):
+        "".join(engine_registry.stream(stub_engine, "a"))
+
+    text = metrics.render()
+    labels = f'engine="{stub_engine}",route="tests"'
+    assert sample(text, f"llm_stream_first_token_seconds_count{{{labels}}}") == 1
+    first_token = sample(text, f"llm_stream_first_token_seconds_sum{{{labels}}}")
+    duration = sample(text, f"llm_request_duration_seconds_sum{{{labels}}}")
+    # The stub sends its three pieces llm.delay apart
+    assert first_token < duration - llm.delay
+
+
+def test_metrics_endpoint_is_open_without_a_token(app, client_for, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", None)
+    response = client_for().get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# HELP llm_requests_total" in response.get_data(as_text=True)
+
+
+def test_metrics_endpoint_checks_the_token(app, client_for, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+    client = client_for()
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
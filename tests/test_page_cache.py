@@ -0,0 +1,44 @@
+# tests/test_page_cache.py
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/tips-resources", "/suggestions"])
+def test_page_is_not_shared_between_users(client_for, make_user, path):
+    alice = make_user(name="Alice Secret")
+    bob = make_user(name="Bob Visible")
+
+    first = client_for(alice).get(path)
+    assert first.status_code == 200
+    assert "Alice Secret" in first.get_data(as_text=True)
+
+    second = client_for(bob).get(path)
+    assert second.status_code == 200
+    body = second.get_data(as_text=True)
+    assert "Bob Visible" in body
+    assert "Alice Secret" not in body
+
+
+def test_anonymous_visitor_does_not_get_a_users_page(client_for, make_user):
+    alice = make_user(name="Alice Secret")
+    assert "Alice Secret" in client_for(alice).get("/tips-resources").get_data(as_text=True)
+
+    response = client_for().get("/tips-resources")
+    assert response.status_code == 200
+    assert "Alice Secret" not in response.get_data(as_text=True)
+
+
+def test_renamed_user_gets_a_fresh_page(app, client_for, make_user):
+    from models import db, User
+    import user_cache
+
+    alice = make_user(name="Alice Before")
+    client = client_for(alice)
+    assert "Alice Before" in client.get("/tips-resources").get_data(as_text=True)
+
+    with app.app_context():
+        db.session.get(User, alice).name = "Alice After"
+        db.session.commit()
+    user_cache.invalidate(alice)
+    body = client.get("/tips-resources").get_data(as_text=True)
+    assert "Alice After" in body
+    assert "Alice Before" not in body
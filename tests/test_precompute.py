@@ -0,0 +1,16 @@
+# tests/test_precompute.py
+import precompute
+
+
+def test_default_space_skips_engines_no_route_reads():
+    engines = {job[0] for job in precompute.suggestion_space()}
+    assert "total" in engines
+    assert "tips_resources" not in engines
+
+
+def test_opt_in_engine_is_precomputed_when_named(app):
+    logged = []
+    result = precompute.precompute_suggestions(app, engines=["tips_resources"], dry_run=True, log=logged.append)
+    assert result["total"] > 0
+    assert result["total"] == sum(1 for job in precompute.suggestion_space(total_engines=["tips_resources"])
+                                  if job[0] == "tips_resources")
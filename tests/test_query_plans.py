@@ -0,0 +1,45 @@
+# tests/test_query_plans.py
+import pytest
+
+from models import db, Response, User
+from query_plans import SEED_EMAIL_DOMAIN, check_query_plans
+
+# Enough rows for PostgreSQL's planner to prefer an index; `flask
+# check-query-plans` seeds far more for a production-sized check
+USERS, ATTEMPTS = 3000, 2
+
+
+def _check(app):
+    with app.app_context():
+        return check_query_plans(users=USERS, attempts=ATTEMPTS, log=lambda message: None)
+
+
+def test_route_queries_use_indexes(app):
+    results = _check(app)
+    assert results
+    assert {name: result["seq_scans"] for name, result in results.items() if result["seq_scans"]} == {}
+
+
+def test_seed_data_is_rolled_back(app):
+    _check(app)
+    with app.app_context():
+        assert User.query.filter(User.email.like(f"%@{SEED_EMAIL_DOMAIN}")).count() == 0
+
+
+@pytest.fixture
+def without_response_indexes(app):
+    """Drop the per-user responses indexes for one test."""
+    indexes = [index for index in Response.__table__.indexes if index.name in
+               ("ix_responses_user_attempt_level", "ix_responses_user_level_score")]
+    with app.app_context():
+        for index in indexes:
+            index.drop(db.engine)
+    yield
+    with app.app_context():
+        for index in indexes:
+            index.create(db.engine)
+
+
+def test_a_dropped_index_is_reported(app, without_response_indexes):
+    results = _check(app)
+    assert "responses" in results["performance_insights: all responses"]["seq_scans"]
@@ -0,0 +1,67 @@
+# tests/test_single_flight.py
+import threading
+
+import engine_registry
+
+
+def _run_concurrently(n, fn):
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def run(i):
+        barrier.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_streams_share_one_upstream_call(stub_engine, llm):
+    results = _run_concurrently(8, lambda i: "".join(engine_registry.stream(stub_engine, "energy")))
+    assert llm.calls == 1
+    assert results == ["Use solar power."] * 8
+
+
+def test_concurrent_generates_share_one_upstream_call(stub_engine, llm):
+    results = _run_concurrently(8, lambda i: engine_registry.generate(stub_engine, "energy"))
+    assert llm.calls == 1
+    assert results == ["Use solar power."] * 8
+
+
+def test_stream_joins_an_in_flight_generate(stub_engine, llm):
+    calls = [lambda: engine_registry.generate(stub_engine, "energy"), lambda: "".join(engine_registry.stream(stub_engine, "energy"))]
+    results = _run_concurrently(2, lambda i: calls[i]())
+    assert llm.calls == 1
+    assert results == ["Use solar power."] * 2
+
+
+def test_followers_get_the_leaders_error(stub_engine, llm):
+    llm.delay = 0.2
+    llm.failures.append(ValueError("bad request"))
+
+    def consume(i):
+        try:
+            return "".join(engine_registry.stream(stub_engine, "energy"))
+        except ValueError as e:
+            return str(e)
+
+    assert _run_concurrently(4, consume) == ["bad request"] * 4
+    assert llm.calls == 1
+
+
+def test_process_lock_is_exclusive(monkeypatch, tmp_path):
+    import single_flight
+    monkeypatch.setattr(single_flight, "LOCK_DIR", str(tmp_path))
+    with single_flight.process_lock("k", timeout=1) as first:
+        assert first
+        # The lock is per open file, so a second holder in this process is kept out too
+        with single_flight.process_lock("k", timeout=0.1) as second:
+            assert not second
+        with single_flight.process_lock("other", timeout=0.1) as other:
+            assert other
+    with single_flight.process_lock("k", timeout=0.1) as again:
+        assert again
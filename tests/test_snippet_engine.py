@@ -0,0 +1,34 @@
+# tests/test_snippet_engine.py
+from question_bank import LEVEL_TABLES, QUESTIONS, score_level
+from snippet_engine import _label, compose_total_suggestion
+
+
+def _text(qid):
+    return _label(QUESTIONS[str(qid)].get("text"), "en")
+
+
+def test_total_suggestion_lists_the_largest_gaps_first(llm):
+    first, second, third = LEVEL_TABLES[1].question_ids[:3]
+    _, _, details = score_level(1, {
+        f"q_{first}": "somewhat aware",     # 0.34 below the best option
+        f"q_{second}": "not at all aware",  # 1.0 below
+        f"q_{third}": "aware",              # the best option
+    })
+    summary = details["_summary"]
+    # Option scores stored with the answer do not count: the bank's do
+    for parameter in summary["parameter_summary"].values():
+        for q in parameter["questions"]:
+            q["options"] = {key: 0 for key in q["options"]}
+
+    text = compose_total_suggestion([summary], budget=0)
+    lines = [line for line in text.splitlines() if line.startswith("- ")]
+    assert [line.split("**")[1] for line in lines[:2]] == [_text(second), _text(first)]
+    assert _text(third) not in text
+    assert llm.calls == 0
+
+
+def test_total_suggestion_is_none_when_every_answer_is_best():
+    table = LEVEL_TABLES[3]
+    best = {f"q_{qid}": max(scores, key=scores.get) for qid, scores in zip(table.question_ids, table.option_scores)}
+    _, _, details = score_level(3, best)
+    assert compose_total_suggestion([details["_summary"]], budget=0) is None
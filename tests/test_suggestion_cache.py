@@ -0,0 +1,120 @@
+# tests/test_suggestion_cache.py
+import pytest
+
+import suggestion_cache
+from suggestion_cache import DiskBackend, MemoryBackend, PostgresBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """suggestion_cache's time.time(), moved forward by hand."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(suggestion_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "disk", "postgres"])
+def backend(request, app, tmp_path):
+    """Each backend, holding at most 3 evictable entries."""
+    if request.param == "memory":
+        yield MemoryBackend(max_entries=3)
+    elif request.param == "disk":
+        yield DiskBackend(path=str(tmp_path / "cache.sqlite3"), max_entries=3)
+    else:
+        # The app database: PostgreSQL, or SQLite under the test profile
+        with app.app_context():
+            backend = PostgresBackend(max_entries=3)
+            backend.clear()
+            yield backend
+            backend.clear()
+
+
+def _get(backend, key):
+    found = backend.get(key)
+    # The persistent tiers also return the expiry
+    return found[0] if isinstance(found, tuple) else found
+
+
+def test_entry_expires_after_its_ttl(backend, clock):
+    backend.put("total:v1:a", "tip", expires_at=clock[0] + 10)
+    assert _get(backend, "total:v1:a") == "tip"
+    clock[0] += 11
+    assert _get(backend, "total:v1:a") is None
+
+
+def test_least_recently_used_entry_is_evicted(backend, clock):
+    for key in ("a", "b", "c"):
+        clock[0] += 1
+        backend.put(f"total:v1:{key}", key, expires_at=clock[0] + 3600)
+    # Long enough for the database tier to record the read
+    clock[0] += 100
+    assert _get(backend, "total:v1:a") == "a"
+
+    clock[0] += 1
+    backend.put("total:v1:d", "d", expires_at=clock[0] + 3600)
+    assert _get(backend, "total:v1:b") is None
+    assert [_get(backend, f"total:v1:{key}") for key in ("a", "c", "d")] == ["a", "c", "d"]
+
+
+def test_pinned_entries_are_never_evicted(backend, clock):
+    if isinstance(backend, MemoryBackend):
+        pytest.skip("the in-process tier is a plain LRU; pinning is for the persistent tiers")
+    backend.put("total:v1:pinned", "kept", expires_at=None)
+    for n in range(5):
+        clock[0] += 1
+        backend.put(f"total:v1:{n}", n, expires_at=clock[0] + 3600)
+    assert _get(backend, "total:v1:pinned") == "kept"
+    assert [_get(backend, f"total:v1:{n}") for n in range(5)] == [None, None, 2, 3, 4]
+
+
+def test_clear_one_engine(backend):
+    backend.put("total:v1:a", "a")
+    backend.put("tips_resources:v1:a", "b")
+    backend.clear("total")
+    assert _get(backend, "total:v1:a") is None
+    assert _get(backend, "tips_resources:v1:a") == "b"
+
+
+def test_prune_drops_older_versions_pinned_ones_too(backend, clock):
+    backend.put("total:v1:pinned", "old", expires_at=None)
+    backend.put("total:v1:a", "old", expires_at=clock[0] + 3600)
+    backend.put("total:v3:a", "newer", expires_at=None)
+    backend.put("tips_resources:v1:a", "other engine", expires_at=None)
+
+    assert backend.prune("total", lambda key: suggestion_cache._older_version(key, "total:v2:a"))
+    assert _get(backend, "total:v1:pinned") is None
+    assert _get(backend, "total:v1:a") is None
+    # A newer version (a worker already running the next deploy) is kept
+    assert _get(backend, "total:v3:a") == "newer"
+    assert _get(backend, "tips_resources:v1:a") == "other engine"
+
+
+def test_older_version():
+    assert suggestion_cache._older_version("total:v9:x", "total:v10:y")
+    assert not suggestion_cache._older_version("total:v10:x", "total:v9:y")
+    assert not suggestion_cache._older_version("total:v2", "total:v2:y")
+    assert suggestion_cache._older_version("total:vbeta:x", "total:v2:y")
+
+
+def test_first_put_of_a_new_version_prunes_the_old_one(monkeypatch, tmp_path):
+    disk = DiskBackend(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(suggestion_cache, "_memory", MemoryBackend())
+    monkeypatch.setattr(suggestion_cache, "_persistent", disk)
+    monkeypatch.setattr(suggestion_cache, "_pruned", set())
+    suggestion_cache.put("total:v1:a", "old", engine="total", ttl=0)
+    suggestion_cache.put("total:v1:b", "old", engine="total")
+
+    suggestion_cache.put("total:v2:a", "new", engine="total", ttl=0)
+    assert suggestion_cache.get("total:v1:a") is None
+    assert disk.get("total:v1:a") is None and disk.get("total:v1:b") is None
+    assert suggestion_cache.get("total:v2:a") == "new"
+
+    # Only once per version: an old entry written later (another worker) stays
+    disk.put("total:v1:c", "old", expires_at=None)
+    suggestion_cache.put("total:v2:b", "new", engine="total")
+    assert disk.get("total:v1:c") == ("old", None)
+
+
+def test_make_key_normalises_numbers():
+    assert suggestion_cache.make_key("total", "2", 3.3200000000000003, 7) == "total:v2:3.3200:7.0000"
+    assert suggestion_cache.make_key("total", "2", 3.32, 7.0) == suggestion_cache.make_key("total", "2", 3.3200000000000003, 7)
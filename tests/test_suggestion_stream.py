@@ -0,0 +1,83 @@
+# tests/test_suggestion_stream.py
+import json
+import time
+
+import engine_registry
+from suggestion_stream import sse_markdown
+
+
+def events(body):
+    """(event name, data) pairs of a Server-Sent Events body."""
+    parsed = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+def test_chunks_become_html_events_then_done():
+    body = "".join(sse_markdown(iter(["# Plan\n", "Use **solar**", " power."])))
+    assert body.startswith(": connected\n\n")
+    parsed = events(body)
+    assert parsed[-1] == ("done", "")
+    # Every html event is the whole text so far; the last one is all of it
+    assert parsed[-2] == ("html", "<h1>Plan</h1>\n<p>Use <strong>solar</strong> power.</p>")
+
+
+def test_failed_stream_without_fallback_says_so():
+    def chunks():
+        yield "Use "
+        raise RuntimeError("upstream went away")
+
+    name, message = events("".join(sse_markdown(chunks())))[-1]
+    assert name == "failed"
+    assert "unavailable" in message
+
+
+def test_stream_endpoint_streams_the_engine_reply(client_for, make_user, llm):
+    response = client_for(make_user()).get("/suggestions/stream/awareness_engagement")
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    parsed = events(response.get_data(as_text=True))
+    assert parsed[-2] == ("html", "<p>Use solar power.</p>")
+    assert parsed[-1] == ("done", "")
+    assert llm.calls == 1
+
+
+def test_stream_endpoint_needs_a_known_engine(client_for, make_user):
+    assert client_for(make_user()).get("/suggestions/stream/nope").status_code == 404
+
+
+def test_fallback_shown_when_budget_runs_out_then_replaced():
+    def slow():
+        time.sleep(0.3)
+        yield "From the model."
+
+    parsed = events("".join(sse_markdown(slow(), fallback=lambda: "Quick tips.", budget=0.05)))
+    assert parsed[0] == ("html", "<p>Quick tips.</p>")
+    assert parsed[-2:] == [("html", "<p>From the model.</p>"), ("done", "")]
+
+
+def test_fallback_not_shown_when_text_arrives_in_time():
+    parsed = events("".join(sse_markdown(iter(["From the model."]), fallback=lambda: "Quick tips.", budget=5)))
+    assert ("html", "<p>Quick tips.</p>") not in parsed
+    assert parsed[-2:] == [("html", "<p>From the model.</p>"), ("done", "")]
+
+
+def test_failed_stream_ends_on_the_fallback():
+    def chunks():
+        raise RuntimeError("upstream went away")
+        yield
+
+    parsed = events("".join(sse_markdown(chunks(), fallback=lambda: "Quick tips.", budget=5)))
+    assert parsed == [("html", "<p>Quick tips.</p>"), ("done", "")]
+
+
+def test_stream_endpoint_serves_the_fallback_while_the_breaker_is_open(client_for, make_user, llm):
+    engine_registry._breaker(engine_registry.ENGINES["awareness_engagement"]["base_url"])["opened_at"] = time.monotonic()
+    response = client_for(make_user()).get("/suggestions/stream/awareness_engagement")
+    name, html = events(response.get_data(as_text=True))[0]
+    assert name == "html"
+    assert "You scored" in html
+    assert llm.calls == 0
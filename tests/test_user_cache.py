@@ -0,0 +1,73 @@
+# tests/test_user_cache.py
+from sqlalchemy import event
+
+import user_cache
+from models import db, User
+
+
+def _user_selects(app, fn):
+    """Run fn() in a fresh app context; -> (its result, SELECTs it sent to users)."""
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            result = fn()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+    return result, len(statements)
+
+
+def test_cached_user_needs_no_query(app, make_user):
+    user_id = make_user(name="Asha")
+    name, selects = _user_selects(app, lambda: user_cache.load_user(user_id).name)
+    assert (name, selects) == ("Asha", 1)
+    name, selects = _user_selects(app, lambda: user_cache.load_user(str(user_id)).name)
+    assert (name, selects) == ("Asha", 0)
+
+
+def test_ttl_zero_always_queries(app, make_user, monkeypatch):
+    monkeypatch.setattr(user_cache, "USER_CACHE_TTL", 0)
+    user_id = make_user()
+    for _ in range(2):
+        assert _user_selects(app, lambda: user_cache.load_user(user_id).id)[1] == 1
+
+
+def test_invalidate_drops_the_stale_copy(app, make_user):
+    user_id = make_user(name="Asha")
+    _user_selects(app, lambda: user_cache.load_user(user_id))
+    with app.app_context():
+        db.session.get(User, user_id).name = "Ravi"
+        db.session.commit()
+
+    # Still the cached copy until it is invalidated
+    assert _user_selects(app, lambda: user_cache.load_user(user_id).name)[0] == "Asha"
+    user_cache.invalidate(user_id)
+    assert _user_selects(app, lambda: user_cache.load_user(user_id).name) == ("Ravi", 1)
+
+
+def test_cached_user_can_be_changed_and_saved(app, make_user):
+    user_id = make_user()
+    _user_selects(app, lambda: user_cache.load_user(user_id))
+    with app.app_context():
+        user = user_cache.load_user(user_id)
+        user.step1 = "Acme"
+        db.session.commit()
+    with app.app_context():
+        assert db.session.get(User, user_id).step1 == "Acme"
+
+
+def test_routes_invalidate_after_changing_the_user(app, make_user, client_for):
+    user_id = make_user()
+    client = client_for(user_id)
+    assert client.get("/home").status_code == 200
+    client.get("/set_language/hi")
+    assert _user_selects(app, lambda: user_cache.load_user(user_id).language) == ("hi", 1)
+
+
+def test_unknown_user_is_none(app):
+    assert _user_selects(app, lambda: user_cache.load_user(10 ** 9))[0] is None
@@ -0,0 +1,65 @@
+# user_cache.py
+import os
+import threading
+import time
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+# ===============================
+# Cached user loader
+# ===============================
+# Flask-Login resolves the user id from the signed session cookie on every
+# authenticated request (and memoizes the result for the request). Instead
+# of a SELECT each time, the user's column values are kept here for
+# USER_CACHE_TTL seconds and the User is rebuilt from that snapshot and
+# attached to the session with merge(load=False), which issues no query.
+# Routes that change the users row call invalidate() after committing;
+# other workers pick the change up when their entry expires.
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))  # seconds, 0 = always query
+
+_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
+_cache = {}
+_lock = threading.Lock()
+
+
+def _snapshot(user):
+    return {key: getattr(user, key) for key in _COLUMNS}
+
+
+def load_user(user_id):
+    """The User for a session's user id, or None; from the cache while fresh."""
+    user_id = int(user_id)
+    if USER_CACHE_TTL <= 0:
+        return db.session.get(User, user_id)
+
+    with _lock:
+        entry = _cache.get(user_id)
+    if entry is not None and entry[1] > time.monotonic():
+        # Already in this session's identity map (e.g. loaded by a query)
+        user = db.session.identity_map.get(inspect(User).identity_key_from_primary_key((user_id,)))
+        if user is not None:
+            return user
+        user = User(**entry[0])
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        with _lock:
+            _cache[user_id] = (_snapshot(user), time.monotonic() + USER_CACHE_TTL)
+    return user
+
+
+def invalidate(user_id):
+    """Forget a user after their row changed (call once the change is committed)."""
+    with _lock:
+        _cache.pop(int(user_id), None)
+
+
+def clear():
+    with _lock:
+        _cache.clear()